@@ -0,0 +1,171 @@
+"""
+    How hard a fleet of consumers hits the Data API when it's switched on
+    together and then loses the Data API for a while, with the refresh
+    timing from before fetch backoff (every consumer refreshes on the same
+    schedule, and a failed fetch is retried a minute later) against
+    consumers/shared/backoff.py (a random start offset, spread out slot
+    refreshes, and jittered exponential backoff with a circuit breaker).
+
+    Every consumer has the same calendar (a team's), is switched on at the
+    same instant, and follows the refresh policy (refreshpolicy.py). The
+    Data API is down for a while after the first meeting. No event loop or
+    network is involved, only the consumers' decisions.
+
+    Reports, per setup:
+        peakPerSecond       the most requests in any one second, overall,
+                            during the outage, and in the first minute
+                            after it's over
+        outageRequests      requests made while the Data API was down, per
+                            consumer
+        recoverySeconds     how long after the outage every consumer had
+                            fetched the schedule again
+        callsPerConsumer    requests per consumer over the whole run
+
+        python bench/bench_backoff.py --consumers 1000 --outage-minutes 45
+"""
+
+import argparse
+import heapq
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "consumers", "shared"))
+
+import backoff                                                    # noqa: E402
+from backoff import Backoff                                       # noqa: E402
+from refreshpolicy import RefreshPolicy                           # noqa: E402
+
+Day = 24 * 3600
+MinRefreshSeconds = 60
+MaxRefreshSeconds = 15 * 60
+NotifyAheadSeconds = 300
+FleetSpreadSeconds = 30
+
+# Switched on at 8:50 on a Monday morning (local time, which is UTC here).
+SwitchOnSeconds = 4 * Day + 8 * 3600 + 50 * 60
+MeetingOffsets = (10 * 60, 100 * 60, 190 * 60, 280 * 60)
+
+
+# .............................................................................
+class FixedRetry():
+    """
+        The retry timing from before: a failed fetch is retried after a
+        minute, however long the Data API has been down.
+    """
+
+    failures = 0
+    is_open = False
+
+    # .........................................................................
+    def failed(self):
+        return MinRefreshSeconds
+
+    # .........................................................................
+    def succeeded(self):
+        pass
+
+
+# .............................................................................
+def simulate(consumers, spread, outage, hours, seed):
+    """
+        Every request (time, ok) the fleet makes, and when each consumer
+        first fetched the schedule after the outage.
+    """
+    backoff.random.seed(seed)
+    meetings = [SwitchOnSeconds + offset for offset in MeetingOffsets]
+    down_from, down_until = outage
+    end = SwitchOnSeconds + hours * 3600
+
+    fleet = []
+    queue = []
+
+    for i in range(consumers):
+        if spread:
+            policy = RefreshPolicy(MinRefreshSeconds, MaxRefreshSeconds, NotifyAheadSeconds,
+                                   spread_seconds=FleetSpreadSeconds)
+            retry = Backoff(MinRefreshSeconds)
+            start = backoff.jitter(FleetSpreadSeconds)
+        else:
+            policy = RefreshPolicy(MinRefreshSeconds, MaxRefreshSeconds, NotifyAheadSeconds)
+            retry = FixedRetry()
+            start = 0
+
+        fleet.append((policy, retry))
+        heapq.heappush(queue, (SwitchOnSeconds + start, i))
+
+    requests = []
+    recovered = {}
+
+    while queue:
+        now, i = heapq.heappop(queue)
+
+        if now >= end:
+            break
+
+        policy, retry = fleet[i]
+        ok = not down_from <= now < down_until
+        requests.append((now, ok))
+
+        if ok:
+            retry.succeeded()
+
+            if now >= down_until:
+                recovered.setdefault(i, now)
+
+            upcoming = [start for start in meetings if start > now]
+            delay = policy.delay(now, upcoming[0] if upcoming else None, now)
+        else:
+            delay = retry.failed()
+
+        heapq.heappush(queue, (now + delay, i))
+
+    return requests, recovered
+
+
+# .............................................................................
+def peak_per_second(requests, since=None, until=None):
+    counts = {}
+
+    for when, _ in requests:
+        if (since is None or when >= since) and (until is None or when < until):
+            counts[int(when)] = counts.get(int(when), 0) + 1
+
+    return max(counts.values()) if counts else 0
+
+
+# .............................................................................
+def report(consumers, spread, outage, hours, seed):
+    requests, recovered = simulate(consumers, spread, outage, hours, seed)
+    down_from, down_until = outage
+
+    return {
+        "peakPerSecond": {
+            "overall": peak_per_second(requests),
+            "outage": peak_per_second(requests, down_from, down_until),
+            "afterOutage": peak_per_second(requests, down_until, down_until + 60),
+        },
+        "outageRequests": round(sum(1 for _, ok in requests if not ok) / consumers, 1),
+        "recoverySeconds": round(max(recovered.values()) - down_until) if len(recovered) == consumers else None,
+        "callsPerConsumer": round(len(requests) / consumers, 1),
+    }
+
+
+# .............................................................................
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--consumers", type=int, default=1000)
+    parser.add_argument("--outage-minutes", type=int, default=45)
+    parser.add_argument("--hours", type=float, default=6)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    # The Data API goes down just after the first meeting starts.
+    down_from = SwitchOnSeconds + MeetingOffsets[0] + 30
+    outage = (down_from, down_from + args.outage_minutes * 60)
+
+    results = {
+        "before": report(args.consumers, False, outage, args.hours, args.seed),
+        "backoff": report(args.consumers, True, outage, args.hours, args.seed),
+    }
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,173 @@
+"""
+    Startup and per-refresh cost of the desktop consumer (consumers/desktop/py).
+
+    Each measurement runs in a fresh Python process, so module imports are
+    counted. With --baseline, the same measurements are also run against the
+    desktop consumer as it was at that git revision, e.g.
+
+        python bench/bench_desktop.py --baseline HEAD~1 --events 50
+
+    Startup is the time from interpreter start (before importing app) until
+    MeetingMinder has loaded its cached schedule; per-refresh is fetching
+    from a local stand-in for the Data API, parsing, and applying the
+    schedule.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BenchDir = os.path.dirname(os.path.abspath(__file__))
+RepoDir = os.path.dirname(BenchDir)
+DesktopDir = os.path.join("consumers", "desktop", "py")
+
+
+# .............................................................................
+def probe(sourceDir, events, refreshes):
+    """
+        Runs in the child process. Prints the results as JSON.
+    """
+    started = time.perf_counter()
+    sys.path.insert(0, sourceDir)
+    sys.path.insert(0, BenchDir)
+
+    import asyncio
+    import app
+    from speech import FileBackend
+    from fake_data_api import FakeDataApi, make_documents
+
+    # Don't go looking for a USB notifier.
+    if hasattr(app, "UsbNotifierEnabled"):
+        app.UsbNotifierEnabled = False
+
+    workDir = tempfile.mkdtemp()
+    storePath = os.path.join(workDir, "schedule.db")
+    documents = make_documents(events)
+
+    # Seed the schedule cache, as a previous run would have.
+    import sqlite3
+    from schedulestore import ScheduleStore
+    store = ScheduleStore(storePath)
+
+    try:
+        store.save([(d["title"], d["startTicks"], d["eventId"]) for d in documents], b"seed")
+    except sqlite3.ProgrammingError:
+        # Revisions from before events had an eventId.
+        store.save([(d["title"], d["startTicks"]) for d in documents], b"seed")
+
+    store.close()
+
+    imported = time.perf_counter()
+    minder = app.MeetingMinder(FileBackend(workDir), storePath=storePath)
+    ready = time.perf_counter()
+
+    heavyModules = sorted(m for m in ("pendulum", "httpx", "win32com") if m in sys.modules)
+
+    with FakeDataApi(documents) as api:
+        minder.dataApi.baseUrl = api.url
+        minder.dataApi.client = None
+
+        async def refresh():
+            # Make every refresh parse and apply the full schedule.
+            minder.scheduleDigest = None
+
+            if hasattr(minder, "window"):
+                minder.window.digest = None
+                minder.window.pages = {}
+            minder.updateEvents(await minder.getEvents())
+
+        async def run():
+            await refresh()                 # Warm up: connect, first imports
+            timings = []
+
+            for _ in range(refreshes):
+                start = time.perf_counter()
+                await refresh()
+                timings.append(time.perf_counter() - start)
+
+            await minder.dataApi.close()
+            return timings
+
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, "w")
+
+        try:
+            timings = asyncio.run(run())
+        finally:
+            sys.stdout = stdout
+
+    minder.speech.close()
+
+    print(json.dumps({
+        "importMs": (imported - started) * 1000,
+        "startupMs": (ready - started) * 1000,
+        "refreshMs": sorted(timings)[len(timings) // 2] * 1000,
+        "heavyModulesAtStartup": heavyModules,
+    }))
+
+
+# .............................................................................
+def measure(sourceDir, events, refreshes, runs):
+    results = []
+
+    for _ in range(runs):
+        started = time.perf_counter()
+        out = subprocess.run(
+            [sys.executable, __file__, "--probe", sourceDir, "--events", str(events), "--refreshes", str(refreshes)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        result["processMs"] = (time.perf_counter() - started) * 1000
+        results.append(result)
+
+    # Medians across runs
+    summary = {}
+
+    for key in ("importMs", "startupMs", "refreshMs", "processMs"):
+        values = sorted(r[key] for r in results)
+        summary[key] = round(values[len(values) // 2], 2)
+
+    summary["heavyModulesAtStartup"] = results[0]["heavyModulesAtStartup"]
+    return summary
+
+
+# .............................................................................
+def checkout(revision, directory):
+    """
+        Extract the desktop consumer as it was at a git revision.
+    """
+    archive = subprocess.run(
+        ["git", "-C", RepoDir, "archive", revision, DesktopDir], check=True, capture_output=True
+    ).stdout
+    subprocess.run(["tar", "-x", "-C", directory], input=archive, check=True)
+
+    return os.path.join(directory, DesktopDir)
+
+
+# .............................................................................
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", help="git revision to compare against")
+    parser.add_argument("--events", type=int, default=50)
+    parser.add_argument("--refreshes", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--probe", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        probe(args.probe, args.events, args.refreshes)
+        sys.exit()
+
+    trees = [("current", os.path.join(RepoDir, DesktopDir))]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.baseline:
+            trees.insert(0, (args.baseline, checkout(args.baseline, tmp)))
+
+        for name, sourceDir in trees:
+            result = measure(sourceDir, args.events, args.refreshes, args.runs)
+            print(f"{name:>12}: " + ", ".join(f"{k} {v}" for k, v in result.items()))
@@ -0,0 +1,106 @@
+"""
+    Compare the MicroPython consumer's old fetch path (a new connection, TLS
+    handshake and "Connection: close" request per poll, with the whole
+    response read and json.loads'ed) with the persistent HttpSession +
+    streaming parser, against a local TLS stand-in for the Data API.
+
+    Runs the device code under CPython, so absolute numbers are much smaller
+    than on a board; the ratio and the per-fetch heap peak (tracemalloc) are
+    what to look at.
+
+        python bench/bench_device_fetch.py --iterations 50
+"""
+
+import argparse
+import asyncio
+import json
+import ssl
+import statistics
+import time
+import tracemalloc
+
+import mpsim
+from fake_data_api import FakeDataApi, make_documents
+
+
+# .............................................................................
+async def old_fetch(host, port, path, query):
+    """
+        The fetch path as it was: new session, new connection and TLS
+        handshake every poll.
+    """
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+
+    reader, writer = await asyncio.open_connection(host, port, ssl=context)
+    body = query.encode('utf-8')
+    writer.write((
+        "POST %saggregate HTTP/1.1\r\nHost: %s\r\nContent-Type: application/json\r\n"
+        "api-key: bench\r\nConnection: close\r\nContent-Length: %d\r\n\r\n" % (path, host, len(body))
+    ).encode('utf-8') + body)
+    await writer.drain()
+
+    response = await reader.read()
+    writer.close()
+
+    return json.loads(response.split(b"\r\n\r\n", 1)[1])["documents"]
+
+
+# .............................................................................
+async def measure(name, fetch, iterations):
+    await fetch()                       # Warm up (and connect, for the new path)
+    times = []
+    peaks = []
+
+    for _ in range(iterations):
+        tracemalloc.start()
+        started = time.perf_counter()
+        await fetch()
+        times.append(time.perf_counter() - started)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    print("%-28s mean %7.2f ms   median %7.2f ms   heap peak %7.1f KB" % (
+        name, statistics.mean(times) * 1000, statistics.median(times) * 1000, max(peaks) / 1024))
+
+    return statistics.mean(times), max(peaks)
+
+
+# .............................................................................
+async def run(api, iterations):
+    mpsim.install(api.url)
+    from meetingminder import MeetingMinder
+    from eventquery import page_body
+
+    minder = MeetingMinder(mpsim.FakeLeds())
+    session = minder.session
+
+    async def new_fetch():
+        minder.schedule_hash = None     # Make every fetch do the full parse and stage
+        if not await minder.fetch_events():
+            raise RuntimeError("fetch failed")
+        minder.events.commit_update()
+
+    query = b''.join(page_body(minder.query_parts, int(time.time()))).decode('utf-8')
+
+    async def old():
+        return await old_fetch(session.host, session.port, session.base_path, query)
+
+    old_time, old_peak = await measure("old (handshake per poll)", old, iterations)
+    connections = api.connections
+    new_time, new_peak = await measure("new (persistent session)", new_fetch, iterations)
+
+    print("\nnew/old wall time %.2f, heap peak %.2f; %d new connections for %d fetches" % (
+        new_time / old_time, new_peak / old_peak, api.connections - connections, iterations + 1))
+
+
+# .............................................................................
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--events", type=int, default=5)
+    args = parser.parse_args()
+
+    with FakeDataApi(make_documents(args.events), tls=True) as api:
+        asyncio.run(run(api, args.iterations))
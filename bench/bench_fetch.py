@@ -0,0 +1,107 @@
+"""
+    Compare the desktop consumer's old fetch path (a new httpx.Client and a
+    "Connection: close" request per poll) with the pooled DataApiClient,
+    against a local TLS stand-in for the Data API.
+
+        python bench/bench_fetch.py --iterations 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "consumers", "desktop", "py"))
+
+from dataapi import DataApiClient                                 # noqa: E402
+from fake_data_api import FakeDataApi, make_documents             # noqa: E402
+
+Query = {"dataSource": "ClusterOne", "database": "notifications", "collection": "events", "pipeline": []}
+
+
+# .............................................................................
+def old_fetch(url):
+    """
+        The fetch path as it was: new client, new connection, every poll.
+    """
+    headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Request-Headers': '*',
+        'api-key': 'bench',
+        'Connection': 'close'
+    }
+
+    with httpx.Client(verify=False) as client:
+        resp = client.post(url + "aggregate", data=json.dumps(Query), headers=headers)
+        return json.loads(resp.text)
+
+
+# .............................................................................
+async def new_fetch(api, body):
+    resp = await api.post("aggregate", body)
+    return json.loads(resp.content)
+
+
+# .............................................................................
+def summarize(name, samples, cpu):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print("%-22s mean %7.2f ms   median %7.2f ms   p95 %7.2f ms   cpu/fetch %6.2f ms" % (
+        name, statistics.mean(samples) * 1000, statistics.median(samples) * 1000, p95 * 1000, cpu * 1000))
+
+    return statistics.mean(samples)
+
+
+# .............................................................................
+async def run(iterations, events, tls):
+    with FakeDataApi(make_documents(events), tls=tls) as server:
+        # Old path.
+        samples = []
+        cpuStart = time.process_time()
+
+        for _ in range(iterations):
+            start = time.perf_counter()
+            old_fetch(server.url)
+            samples.append(time.perf_counter() - start)
+
+        oldCpu = (time.process_time() - cpuStart) / iterations
+        oldConnections = server.connections
+        oldMean = summarize("new client per poll", samples, oldCpu)
+
+        # Pooled path.
+        api = DataApiClient(server.url, "bench", verify=False)
+        body = DataApiClient.serialize(Query)
+        await new_fetch(api, body)    # Warm the pool, as the app does on its first refresh.
+
+        samples = []
+        cpuStart = time.process_time()
+
+        for _ in range(iterations):
+            start = time.perf_counter()
+            await new_fetch(api, body)
+            samples.append(time.perf_counter() - start)
+
+        newCpu = (time.process_time() - cpuStart) / iterations
+        await api.close()
+        newMean = summarize("pooled DataApiClient", samples, newCpu)
+
+        print()
+        print("connections opened: old %d, pooled %d" % (oldConnections, server.connections - oldConnections))
+        print("latency ratio (pooled / old): %.2f" % (newMean / oldMean))
+        print("cpu ratio     (pooled / old): %.2f" % (newCpu / oldCpu))
+
+
+# .............................................................................
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--events", type=int, default=5)
+    parser.add_argument("--no-tls", dest="tls", action="store_false")
+    args = parser.parse_args()
+
+    asyncio.run(run(args.iterations, args.events, args.tls))
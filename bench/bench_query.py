@@ -0,0 +1,207 @@
+"""
+    Compare the consumers' event queries on a large events collection:
+
+        legacy          $addFields/$dateDiff against $$NOW on every document,
+                        then $match/$sort/$limit (the original pipeline)
+        range           consumers/shared/eventquery.py, all sources
+        range/sources   consumers/shared/eventquery.py, with the list of
+                        sources (one index range scan each)
+
+    The range pipelines are run with and without the { source: 1,
+    startTimestamp: 1 } index. Most of the collection is in the past, as it
+    would be if old events were kept around.
+
+    By default the queries run on minimongo.py, an in-memory stand-in that
+    counts keys and documents examined the way explain() does; its timings
+    are pure Python, so the counts are what to look at. With --mongo, they
+    run on a real MongoDB (or compatible) server instead, in a scratch
+    "meetingminder_bench" database, using pymongo:
+
+        python bench/bench_query.py --documents 10000 100000 --sources 4
+        python bench/bench_query.py --mongo mongodb://localhost:27017/
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+from minimongo import Collection
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "consumers", "shared"))
+
+import eventquery                                                  # noqa: E402
+
+LegacyPipeline = [
+    {"$addFields": {"timeDiff": {"$dateDiff": {"startDate": "$$NOW", "endDate": "$startTime", "unit": "second"}}}},
+    {"$match": {"$expr": {"$gt": ["$timeDiff", 0]}}},
+    {"$sort": {"startTime": 1}},
+    {"$limit": 5},
+    {"$project": {"_id": 0, "title": 1, "startTime": 1, "startTicks": "$startTimestamp"}},
+]
+
+
+# .............................................................................
+def make_collection(count, sources, now, history_days, future_days, seed=1):
+    """
+        count events from the given number of sources, spread evenly (at
+        random) from history_days ago to future_days ahead.
+    """
+    rng = random.Random(seed)
+    first = now - history_days * 86400
+    last = now + future_days * 86400
+    docs = []
+
+    for i in range(count):
+        ticks = rng.randrange(first, last) // 300 * 300
+        docs.append({
+            "eventId": "evt%07d" % i,
+            "source": "Calendar %d" % (i % sources),
+            "title": "Meeting number %d" % i,
+            "startTime": datetime.fromtimestamp(ticks, timezone.utc),
+            "startTimestamp": ticks,
+        })
+
+    return docs
+
+
+# .............................................................................
+def pipelines(now, per_source, sources):
+    names = ["Calendar %d" % i for i in range(sources)]
+
+    return [
+        ("legacy", LegacyPipeline, True),
+        ("range, no index", json.loads(eventquery.pipeline(per_source, after=now)), False),
+        ("range", json.loads(eventquery.pipeline(per_source, after=now)), True),
+        ("range/sources", json.loads(eventquery.pipeline(per_source, names, after=now)), True),
+    ]
+
+
+# .............................................................................
+def report(name, keys, docs, returned, samples):
+    print("  %-18s keys %9s   docs %9d   returned %4d   median %9.3f ms" % (
+        name, "%d" % keys if keys else "-", docs, returned, statistics.median(samples) * 1000))
+
+
+# .............................................................................
+def run_standin(docs, now, per_source, sources, iterations):
+    collection = Collection(docs)
+    collection.create_index()
+    results = {}
+
+    for name, pipeline, indexed in pipelines(now, per_source, sources):
+        index = collection.index
+
+        if not indexed:
+            collection.drop_index()
+
+        samples = []
+
+        for _ in range(iterations):
+            collection.reset_stats()
+            start = time.perf_counter()
+            result = collection.aggregate(pipeline, datetime.fromtimestamp(now, timezone.utc))
+            samples.append(time.perf_counter() - start)
+
+        collection.index = index
+        results[name] = result
+        report(name, collection.keys_examined, collection.docs_examined, len(result), samples)
+
+    check(results)
+
+
+# .............................................................................
+def run_mongo(uri, docs, now, per_source, sources, iterations):
+    import pymongo
+
+    client = pymongo.MongoClient(uri)
+    db = client["meetingminder_bench"]
+    db.events.drop()
+
+    for i in range(0, len(docs), 10000):
+        db.events.insert_many([dict(d) for d in docs[i:i + 10000]])
+
+    results = {}
+
+    try:
+        for name, pipeline, indexed in pipelines(now, per_source, sources):
+            if indexed:
+                db.events.create_index(list(eventquery.INDEX_KEYS), name=eventquery.INDEX_NAME)
+            else:
+                db.events.drop_indexes()
+
+            samples = []
+
+            for _ in range(iterations):
+                start = time.perf_counter()
+                result = list(db.events.aggregate(pipeline))
+                samples.append(time.perf_counter() - start)
+
+            explain = db.command(
+                "explain", {"aggregate": "events", "pipeline": pipeline, "cursor": {}}, verbosity="executionStats"
+            )
+
+            results[name] = result
+            report(name, total(explain, "totalKeysExamined"), total(explain, "totalDocsExamined"), len(result), samples)
+    finally:
+        client.drop_database("meetingminder_bench")
+        client.close()
+
+    check(results)
+
+
+# .............................................................................
+def total(explain, key):
+    """
+        Sum of every "key" in the explain output (there is one per
+        $unionWith sub-pipeline).
+    """
+    if isinstance(explain, dict):
+        return sum(v if k == key else total(v, key) for k, v in explain.items())
+
+    if isinstance(explain, list):
+        return sum(total(v, key) for v in explain)
+
+    return 0
+
+
+# .............................................................................
+def check(results):
+    """
+        The range pipelines must agree, whichever way they ran.
+    """
+    events = [
+        sorted((d["source"], d["startTicks"], d["eventId"]) for d in result)
+        for name, result in results.items() if name != "legacy"
+    ]
+
+    if any(e != events[0] for e in events[1:]):
+        raise AssertionError("the range pipelines returned different events")
+
+
+# .............................................................................
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--sources", type=int, default=4)
+    parser.add_argument("--per-source", type=int, default=10)
+    parser.add_argument("--history-days", type=int, default=365)
+    parser.add_argument("--future-days", type=int, default=14)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--mongo", help="run on this MongoDB server instead of the stand-in")
+    args = parser.parse_args()
+
+    now = int(time.time())
+
+    for count in args.documents:
+        docs = make_collection(count, args.sources, now, args.history_days, args.future_days)
+        print("%d documents, %d sources, %d per source:" % (count, args.sources, args.per_source))
+
+        if args.mongo:
+            run_mongo(args.mongo, docs, now, args.per_source, args.sources, args.iterations)
+        else:
+            run_standin(docs, now, args.per_source, args.sources, args.iterations)
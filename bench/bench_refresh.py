@@ -0,0 +1,151 @@
+"""
+    How many Data API calls a day of refreshes takes, and how soon changes
+    show up, with a fixed refresh interval against the adaptive refresh
+    policy (consumers/shared/refreshpolicy.py).
+
+    Simulates a few weeks of a calendar: a few meetings every weekday on the
+    half hour between 9 AM and 5 PM, known well in advance, plus a few that
+    are added at short notice (5 to 60 minutes before they start), and some
+    of those off the half hour (at :05, :10, ... :25). No event loop or
+    network is involved, only the policy's decisions.
+
+    Reports, per policy:
+        callsPerDay     refreshes per day, averaged over the weeks
+        lateAdditions   of the meetings added at short notice: how many were
+                        fetched before their notifications were due to
+                        start (inTime), how many only after that but before
+                        they started (late), and how many not until after
+                        they started (missed), by how much notice was given
+
+        python bench/bench_refresh.py --meetings 6 --late 3 --weeks 20
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "consumers", "shared"))
+
+from refreshpolicy import RefreshPolicy                           # noqa: E402
+
+Day = 24 * 3600
+NotifyAheadSeconds = 300
+NightsAndWeekends = (((0, 1, 2, 3, 4), 19, 7), ((5, 6), 0, 24))
+NoticeBuckets = (10, 20, 30, 60)
+
+# The share of meetings added at short notice that don't start on the hour
+# or half hour.
+OffSlotShare = 0.25
+
+
+# .............................................................................
+def make_calendar(monday, weeks, meetings, late, seed=1):
+    """
+        (created, start, notice) for a few weeks of meetings, with notice
+        None for those known in advance. Times are local, starting on a
+        Monday at midnight.
+    """
+    rng = random.Random(seed)
+    events = []
+
+    for day in (week * 7 + weekday for week in range(weeks) for weekday in range(5)):
+        slots = [monday + day * Day + 9 * 3600 + i * 1800 for i in range(16)]
+
+        for start in rng.sample(slots, meetings):
+            events.append((start - 7 * Day, start, None))
+
+        for start in rng.sample(slots, late):
+            notice = rng.randrange(5, 61) * 60
+
+            if rng.random() < OffSlotShare:
+                start += rng.randrange(1, 6) * 300
+
+            events.append((start - notice, start, notice))
+
+    return sorted(events)
+
+
+# .............................................................................
+def simulate(policy, events, monday, days):
+    """
+        The refresh times over the days, and when each meeting was first
+        fetched.
+    """
+    refreshes = []
+    seen = {}
+    now = monday
+
+    while now < monday + days * Day:
+        quiet = policy.quiet_for(now)
+
+        if quiet:
+            now += quiet
+            continue
+
+        refreshes.append(now)
+        known = [start for created, start, _ in events if created <= now]
+
+        for created, start, _ in events:
+            if created <= now and (created, start) not in seen:
+                seen[(created, start)] = now
+
+        upcoming = [start for start in known if start > now]
+        now += policy.delay(now, min(upcoming) if upcoming else None, now)
+
+    return refreshes, seen
+
+
+# .............................................................................
+def report(policy, events, monday, weeks):
+    refreshes, seen = simulate(policy, events, monday, 7 * weeks)
+    buckets = {}
+
+    for created, start, notice in events:
+        if notice is None:
+            continue
+
+        bucket = buckets.setdefault(
+            "<=%d min" % next(b for b in NoticeBuckets if notice <= b * 60), {"inTime": 0, "late": 0, "missed": 0}
+        )
+        fetched = seen.get((created, start))
+
+        if fetched is not None and fetched <= start - NotifyAheadSeconds:
+            bucket["inTime"] += 1
+        elif fetched is not None and fetched < start:
+            bucket["late"] += 1
+        else:
+            bucket["missed"] += 1
+
+    return {
+        "callsPerDay": round(len(refreshes) / (7 * weeks), 1),
+        "lateAdditions": dict(sorted(buckets.items(), key=lambda b: int(b[0][2:].split()[0]))),
+    }
+
+
+# .............................................................................
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--meetings", type=int, default=6, help="meetings known in advance, per weekday")
+    parser.add_argument("--late", type=int, default=3, help="meetings added at short notice, per weekday")
+    parser.add_argument("--weeks", type=int, default=20)
+    parser.add_argument("--max-refresh", type=int, default=15 * 60)
+    args = parser.parse_args()
+
+    days = int(time.time()) // Day
+    monday = (days + (7 - (days + 3) % 7) % 7) * Day
+    events = make_calendar(monday, args.weeks, args.meetings, args.late)
+
+    policies = {
+        "fixed 60 s": RefreshPolicy(60, 60, NotifyAheadSeconds),
+        "adaptive, without slots": RefreshPolicy(60, args.max_refresh, NotifyAheadSeconds, slot_seconds=0),
+        "adaptive": RefreshPolicy(60, args.max_refresh, NotifyAheadSeconds),
+        "adaptive, nights and weekends off": RefreshPolicy(
+            60, args.max_refresh, NotifyAheadSeconds, do_not_disturb=NightsAndWeekends
+        ),
+    }
+
+    results = {name: report(policy, events, monday, args.weeks) for name, policy in policies.items()}
+    print(json.dumps(results, indent=2))
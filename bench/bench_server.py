@@ -0,0 +1,256 @@
+"""
+    Load test for the multi-tenant reminder server (consumers/desktop/py
+    server.py).
+
+    Every tenant has a calendar of their own and shares one of a few team
+    calendars. The events (10,000 by default) start on the quarter hour, as
+    meetings do, so thousands of notifications fall due at the same
+    instants. The server runs for a few simulated hours on a simulated clock
+    (simclock.py) against a local stand-in for the Data API in its own
+    process.
+
+    Reports:
+        wakeupsPerSecond        event loop and scheduler wakeups, per
+                                simulated second
+        notificationLatenessMs  how long after its due instant each tenant's
+                                notification went out. The clock skips
+                                straight to each deadline, so this is the
+                                time spent working through everything else
+                                that was due at the same instant.
+        notifications           sent, and due but never sent (missed)
+        heapEntries, tasks      the most there were at any one time
+        fetches                 Data API requests, and per minute
+        bytesPerEvent           heap per scheduled event (tracemalloc, on a
+                                separate schedule, so the tracing doesn't
+                                slow down the timed run)
+
+        python bench/bench_server.py --events 10000 --tenants 1000 --hours 2
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+BenchDir = os.path.dirname(os.path.abspath(__file__))
+DesktopDir = os.path.join(BenchDir, "..", "consumers", "desktop", "py")
+
+SlotSeconds = 15 * 60
+
+
+# .............................................................................
+def summarize(values, digits=2):
+    if not values:
+        return {"count": 0}
+
+    values = sorted(values)
+
+    return {
+        "count": len(values),
+        "mean": round(statistics.mean(values), digits),
+        "median": round(values[len(values) // 2], digits),
+        "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))], digits),
+        "p99": round(values[min(len(values) - 1, int(len(values) * 0.99))], digits),
+        "max": round(values[-1], digits),
+    }
+
+
+# .............................................................................
+def make_tenants(count, teams):
+    return [{"id": "tenant%05d" % i, "sources": ["User %d" % i, "Team %d" % (i % teams)]} for i in range(count)]
+
+
+# .............................................................................
+def make_documents(count, tenants, teams, hours, team_share=0.2, seed=1):
+    """
+        count events on the quarter hour over the next few hours, most of
+        them on the tenants' own calendars, team_share of them on the team
+        calendars. The first ones are at least 15 minutes away, so every
+        batch has been fetched before anything is due.
+    """
+    rng = random.Random(seed)
+    first = (int(time.time()) // SlotSeconds + 2) * SlotSeconds
+    slots = max(1, int(hours * 3600 // SlotSeconds))
+    docs = []
+
+    for i in range(count):
+        ticks = first + rng.randrange(slots) * SlotSeconds
+
+        if rng.random() < team_share:
+            source = "Team %d" % rng.randrange(teams)
+        else:
+            source = "User %d" % rng.randrange(tenants)
+
+        docs.append({
+            "eventId": "evt%06d" % i,
+            "source": source,
+            "title": "Meeting number %d" % i,
+            "startTime": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(ticks)),
+            "startTicks": ticks
+        })
+
+    return docs
+
+
+# .............................................................................
+def serve_fake_api(documents, per_source, shared, connection):
+    from simclock import SimulatedClock
+    from fake_data_api import FakeDataApi
+
+    SimulatedClock(shared).install()
+    api = FakeDataApi(documents, limit=per_source)
+    connection.send(api.url)
+    api.server.serve_forever()
+
+
+# .............................................................................
+def bytes_per_event(tenants, documents):
+    """
+        Heap taken by the schedule, per event: every event applied straight
+        to a server's sources, as one refresh would.
+    """
+    import server
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    reminders = server.ReminderServer(tenants, None, notify=lambda *args: None)
+    by_source = {}
+
+    for d in documents:
+        by_source.setdefault(d["source"], []).append(d)
+
+    for name, source in reminders.sources.items():
+        reminders.updateSource(source, by_source.get(name, []))
+
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    return round(used / len(documents))
+
+
+# .............................................................................
+def run(args):
+    sys.path.insert(0, BenchDir)
+    sys.path.insert(0, DesktopDir)
+
+    from simclock import SimulatedClock
+
+    # The clock has to be in place before the server is imported.
+    clock = SimulatedClock()
+    clock.install()
+
+    import server
+    import config
+    from dataapi import DataApiClient
+
+    tenants = make_tenants(args.tenants, args.teams)
+    documents = make_documents(args.events, args.tenants, args.teams, args.hours)
+    memory = bytes_per_event(tenants, documents)
+
+    parent, child = multiprocessing.Pipe()
+    api = multiprocessing.Process(
+        target=serve_fake_api, args=(documents, server.ServerEventsPerSource, clock.shared, child), daemon=True
+    )
+    api.start()
+    url = parent.recv()
+
+    lateness = []
+    peaks = {"heap": 0, "tasks": 0}
+    fetches = []
+
+    def notify(tenant, event, seconds_before):
+        lateness.append((time.time() - (event["start"] - seconds_before)) * 1000)
+
+    reminders = server.ReminderServer(
+        tenants, DataApiClient(url, "bench", maxConnections=server.MaxConcurrentFetches), notify=notify,
+        batchSources=args.batch
+    )
+
+    post = reminders.dataApi.post
+
+    async def measured_post(action, body):
+        with clock.busy():
+            fetches.append(time.time())
+            return await post(action, body)
+
+    reminders.dataApi.post = measured_post
+
+    async def sample():
+        while True:
+            peaks["heap"] = max(peaks["heap"], len(reminders.scheduler.heap))
+            peaks["tasks"] = max(peaks["tasks"], len(asyncio.all_tasks()))
+            await asyncio.sleep(60)
+
+    async def session():
+        await reminders.run()
+        sampler = asyncio.create_task(sample())
+        await asyncio.sleep(args.hours * 3600 + 2 * SlotSeconds)
+        sampler.cancel()
+        await reminders.stop()
+
+    loop = clock.newEventLoop()
+    started = time.time()
+    clock.wakeups = 0
+    wall = time.perf_counter()
+    loop.run_until_complete(session())
+    wall = time.perf_counter() - wall
+    end = time.time()
+    loop.close()
+    api.terminate()
+
+    fanout = {}
+
+    for tenant in tenants:
+        for name in tenant["sources"]:
+            fanout[name] = fanout.get(name, 0) + 1
+
+    expected = sum(
+        fanout.get(d["source"], 0) for d in documents for before in server.CueSeconds
+        if started + 60 <= d["startTicks"] - before <= end
+    )
+    duration = end - started
+    sent = reminders.notifications
+
+    return {
+        "config": {
+            "events": args.events, "tenants": args.tenants, "teams": args.teams, "hours": args.hours,
+            "batchSources": args.batch, "batches": len(reminders.batches),
+        },
+        "wakeupsPerSecond": {
+            "loop": round(clock.wakeups / duration, 3),
+            "scheduler": round(reminders.scheduler.wakeups / duration, 3),
+        },
+        "notificationLatenessMs": summarize(lateness),
+        "notifications": {"sent": sent, "missed": max(0, expected - sent)},
+        "heapEntries": peaks["heap"],
+        "tasks": peaks["tasks"],
+        "fetches": {"count": len(fetches), "perMinute": round(len(fetches) / (duration / 60), 1)},
+        "bytesPerEvent": memory,
+        "wallSeconds": round(wall, 1),
+        "refreshIntervalSeconds": config.RefreshIntervalSeconds,
+    }
+
+
+# .............................................................................
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--tenants", type=int, default=1000)
+    parser.add_argument("--teams", type=int, default=20, help="number of shared team calendars")
+    parser.add_argument("--hours", type=float, default=2, help="simulated hours of events")
+    parser.add_argument("--batch", type=int, default=100, help="sources per Data API request")
+    parser.add_argument("--output", help="write the results (JSON) here")
+    args = parser.parse_args()
+
+    results = run(args)
+    print(json.dumps(results, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
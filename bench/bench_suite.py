@@ -0,0 +1,463 @@
+"""
+    Benchmark suite for both consumers.
+
+    Runs the desktop app (consumers/desktop/py) and the MicroPython consumer
+    (consumers/micropython) under CPython for a few simulated hours, against
+    a local stand-in for the Data API "aggregate" endpoint, on a simulated
+    clock (simclock.py). SAPI is replaced by the speech FileBackend and a USB
+    notifier recorder; machine, neopixel and network by the mpsim stubs.
+
+    For each consumer it reports:
+        timingErrorMs   how late (or early) each notification (announcement,
+                        light change) happened, against when it was due,
+                        in simulated time
+        wakeupsPerHour  how often the event loop woke up, per simulated hour
+        fetchMs         real time per fetch
+        refreshAllocKB  heap allocated by each refresh (tracemalloc peak)
+        peakKB          heap peak over the whole run (tracemalloc)
+
+    Memory tracing slows everything down, so fetchMs is only good for
+    comparing runs of this suite. Each consumer runs in a fresh process.
+    Save the results of one commit and compare another against them:
+
+        python bench/bench_suite.py --output before.json
+        git checkout my-branch
+        python bench/bench_suite.py --compare before.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BenchDir = os.path.dirname(os.path.abspath(__file__))
+RepoDir = os.path.dirname(BenchDir)
+DesktopDir = os.path.join(RepoDir, "consumers", "desktop", "py")
+
+Scenarios = ("desktop", "device", "device-lowpower")
+
+# Notifications more than this far from when they were due don't count as
+# the same notification.
+MatchWindowSeconds = 30
+
+
+# .............................................................................
+def summarize(values, digits=2):
+    if not values:
+        return {"count": 0}
+
+    values = sorted(values)
+
+    return {
+        "count": len(values),
+        "mean": round(statistics.mean(values), digits),
+        "median": round(values[len(values) // 2], digits),
+        "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))], digits),
+        "max": round(values[-1], digits),
+    }
+
+
+# .............................................................................
+def timingErrors(expected, actual, end):
+    """
+        Match each (when, label) notification that was due before "end" with
+        the nearest actual one with the same label. Returns the summary of
+        the errors in ms, with the number of notifications that never came.
+    """
+    unmatched = list(actual)
+    errors = []
+    missed = 0
+
+    for when, label in sorted(expected):
+        if when > end:
+            continue
+
+        candidates = [a for a in unmatched if a[1] == label and abs(a[0] - when) <= MatchWindowSeconds]
+
+        if not candidates:
+            missed += 1
+            continue
+
+        match = min(candidates, key=lambda a: abs(a[0] - when))
+        unmatched.remove(match)
+        errors.append((match[0] - when) * 1000)
+
+    summary = summarize(errors)
+    summary["missed"] = missed
+
+    return summary
+
+
+# .............................................................................
+class MemoryProbe():
+    """
+        Heap peak per refresh, and over the whole run.
+    """
+
+    # .........................................................................
+    def __init__(self):
+        self.refreshes = []
+        self.peak = 0
+        self.base = None
+        tracemalloc.start()
+
+    # .........................................................................
+    def beginRefresh(self):
+        current, peak = tracemalloc.get_traced_memory()
+        self.peak = max(self.peak, peak)
+        tracemalloc.reset_peak()
+        self.base = current
+
+    # .........................................................................
+    def endRefresh(self):
+        if self.base is None:
+            return
+
+        peak = tracemalloc.get_traced_memory()[1]
+        self.peak = max(self.peak, peak)
+        self.refreshes.append((peak - self.base) / 1024)
+        self.base = None
+
+    # .........................................................................
+    def stop(self):
+        self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+        return {
+            "refreshAllocKB": summarize(self.refreshes, 1),
+            "peakKB": round(self.peak / 1024, 1),
+        }
+
+
+# .............................................................................
+class LightRecorder():
+    """
+        Stands in for the desktop app's UsbNotifier.
+    """
+
+    def __init__(self):
+        self.changes = []
+
+    def show(self, state):
+        if not self.changes or self.changes[-1][1] != state:
+            self.changes.append((time.time(), state))
+
+    def close(self):
+        pass
+
+
+# .............................................................................
+def runDesktop(clock, hours, documents, url):
+    sys.path.insert(0, DesktopDir)
+
+    import app
+    from speech import FileBackend
+
+    class Backend(FileBackend):
+        played = 0
+
+        def play(self, clip):
+            super().play(clip)
+            self.played += 1
+
+    app.MongoUrl = url
+    workDir = tempfile.mkdtemp()
+    backend = Backend(workDir)
+    lights = LightRecorder()
+    memory = MemoryProbe()
+    minder = app.MeetingMinder(backend, storePath=os.path.join(workDir, "schedule.db"), usbNotifier=lights)
+
+    # Don't skip ahead while the speech thread has something to play, so
+    # playback is logged at the right (simulated) time.
+    said = [0]
+    say = minder.speech.say
+
+    def countedSay(phrase):
+        said[0] += 1
+        say(phrase)
+
+    minder.speech.say = countedSay
+    clock.holdWhile(lambda: said[0] > backend.played)
+
+    fetches = []
+    getEvents = minder.getEvents
+    updateEvents = minder.updateEvents
+
+    async def measuredGetEvents():
+        memory.beginRefresh()
+        started = time.perf_counter()
+
+        with clock.busy():
+            events = await getEvents()
+
+        fetches.append((time.perf_counter() - started) * 1000)
+
+        if events is None:
+            memory.endRefresh()
+
+        return events
+
+    def measuredUpdateEvents(events):
+        updateEvents(events)
+        memory.endRefresh()
+
+    minder.getEvents = measuredGetEvents
+    minder.updateEvents = measuredUpdateEvents
+
+    async def session():
+        await minder.run()
+        await asyncio.sleep(hours * 3600)
+        await minder.stop()
+
+    started = time.time()
+    loop = clock.newEventLoop()
+    clock.wakeups = 0
+    loop.run_until_complete(session())
+    loop.close()
+    end = time.time()
+
+    expectedSpeech = []
+    expectedLights = []
+
+    for document in documents:
+        start = document["startTicks"]
+        event = {"title": document["title"], "start": start}
+        expectedSpeech += [(start - before, phrase) for before, phrase in minder.announcements(event)]
+        expectedLights += [(start - before, state) for before, state in minder.lightCues()]
+        expectedLights.append((start + app.EventEndSeconds, "off"))
+
+    with open(backend.logPath, encoding="utf-8") as f:
+        played = [(float(when), phrase) for when, phrase in (line.rstrip("\n").split("\t", 1) for line in f)]
+
+    return dict({
+        "timingErrorMs": {
+            "speech": timingErrors(expectedSpeech, played, end),
+            "lights": timingErrors(expectedLights, lights.changes, end),
+        },
+        "wakeupsPerHour": round(clock.wakeups / ((end - started) / 3600), 1),
+        "fetchMs": summarize(fetches),
+    }, **memory.stop())
+
+
+# .............................................................................
+def runDevice(clock, hours, documents, url, lowPower=False):
+    import mpsim
+    mpsim.install(url)
+    sys.modules["machine"].lightsleep = lambda ms: clock.skip(ms / 1000)
+
+    import meetingminder
+    from leds_neopixel import LedFlasher
+
+    meetingminder.LowPower = lowPower
+    leds = LedFlasher(0)
+    changes = []
+
+    def record(label):
+        if not changes or changes[-1][1] != label:
+            changes.append((time.time(), label))
+
+    # Record each change of notification, then pass it on.
+    names = {leds.Green: "green", leds.Yellow: "yellow", leds.Red: "red"}
+    on, off, flash = leds.on, leds.off, leds.flash
+
+    def recordedOn(color):
+        record(names.get(color))
+        on(color)
+
+    def recordedOff():
+        record("off")
+        off()
+
+    def recordedFlash(color, on_ms, off_ms=None):
+        record(names.get(color))
+        flash(color, on_ms, off_ms)
+
+    leds.on, leds.off, leds.flash = recordedOn, recordedOff, recordedFlash
+
+    memory = MemoryProbe()
+    minder = meetingminder.MeetingMinder(leds)
+    fetches = []
+    fetchEvents = minder.fetch_events
+
+    async def measuredFetchEvents():
+        memory.beginRefresh()
+        started = time.perf_counter()
+
+        with clock.busy():
+            changed = await fetchEvents()
+
+        fetches.append((time.perf_counter() - started) * 1000)
+        memory.endRefresh()
+
+        return changed
+
+    minder.fetch_events = measuredFetchEvents
+
+    async def session():
+        await minder.run()
+        await asyncio.sleep(hours * 3600)
+        minder.session.close()
+
+    started = time.time()
+    loop = clock.newEventLoop()
+    clock.wakeups = 0
+    loop.run_until_complete(session())
+    end = time.time()
+
+    for task in asyncio.all_tasks(loop):
+        task.cancel()
+
+    loop.run_until_complete(asyncio.sleep(0))
+    loop.close()
+
+    expected = []
+
+    for document in documents:
+        start = document["startTicks"]
+        expected += [(start - 300, "green"), (start - 60, "yellow"), (start - 10, "red"), (start + 120, "off")]
+
+    result = dict({
+        "timingErrorMs": {"leds": timingErrors(expected, changes, end)},
+        "wakeupsPerHour": round(clock.wakeups / ((end - started) / 3600), 1),
+        "fetchMs": summarize(fetches),
+        "ledWrites": leds.pixels.writes,
+    }, **memory.stop())
+
+    if minder.power:
+        result["dutyCycle"] = round(minder.power.duty_cycle(), 4)
+
+    return result
+
+
+# .............................................................................
+def serveFakeApi(documents, shared, connection):
+    """
+        Runs the fake Data API in its own process, so its allocations don't
+        count towards the consumer's, on the same simulated clock.
+    """
+    from simclock import SimulatedClock
+    from fake_data_api import FakeDataApi
+
+    SimulatedClock(shared).install()
+    api = FakeDataApi(documents, limit=5)
+    connection.send(api.url)
+    api.server.serve_forever()
+
+
+# .............................................................................
+def probe(scenario, hours, events, spacing):
+    """
+        Runs in the child process. Prints the results as JSON.
+    """
+    sys.path.insert(0, BenchDir)
+
+    from simclock import SimulatedClock
+    from fake_data_api import make_documents
+
+    # The clock has to be in place before the consumers are imported.
+    clock = SimulatedClock()
+    clock.install()
+
+    documents = make_documents(events, spacing=spacing)
+    parent, child = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=serveFakeApi, args=(documents, clock.shared, child), daemon=True)
+    server.start()
+    url = parent.recv()
+
+    try:
+        with contextlib.redirect_stdout(open(os.devnull, "w")):
+            if scenario == "desktop":
+                result = runDesktop(clock, hours, documents, url)
+            else:
+                result = runDevice(clock, hours, documents, url, lowPower=scenario == "device-lowpower")
+    finally:
+        server.terminate()
+
+    print(json.dumps(result))
+
+
+# .............................................................................
+def revision():
+    def git(*args):
+        return subprocess.run(["git", "-C", RepoDir] + list(args), capture_output=True, text=True).stdout.strip()
+
+    return {"commit": git("rev-parse", "--short", "HEAD"), "dirty": bool(git("status", "--porcelain", "--", "consumers"))}
+
+
+# .............................................................................
+def flatten(results, prefix=""):
+    for key, value in results.items():
+        if isinstance(value, dict):
+            yield from flatten(value, prefix + key + ".")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield prefix + key, value
+
+
+# .............................................................................
+def compare(baseline, results):
+    old = dict(flatten(baseline["scenarios"]))
+    new = dict(flatten(results["scenarios"]))
+
+    print("%-52s %12s %12s %9s" % ("", baseline["revision"]["commit"], results["revision"]["commit"], "change"))
+
+    for key, value in new.items():
+        before = old.get(key)
+
+        if before is None:
+            print("%-52s %12s %12s" % (key, "-", value))
+        else:
+            change = "%+.0f%%" % ((value - before) / abs(before) * 100) if before else ""
+            print("%-52s %12s %12s %9s" % (key, before, value, change))
+
+
+# .............................................................................
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=3, help="simulated hours per scenario")
+    parser.add_argument("--events", type=int, default=8)
+    parser.add_argument("--spacing", type=int, default=25 * 60, help="seconds between events")
+    parser.add_argument("--scenario", action="append", choices=Scenarios, help="default: all of them")
+    parser.add_argument("--output", help="write the results (JSON) here")
+    parser.add_argument("--compare", help="results (JSON) from an earlier run to compare against")
+    parser.add_argument("--probe", choices=Scenarios, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        probe(args.probe, args.hours, args.events, args.spacing)
+        sys.exit()
+
+    results = {
+        "revision": revision(),
+        "python": platform.python_version(),
+        "config": {"hours": args.hours, "events": args.events, "spacing": args.spacing},
+        "scenarios": {},
+    }
+
+    for scenario in args.scenario or Scenarios:
+        started = time.perf_counter()
+        out = subprocess.run(
+            [sys.executable, __file__, "--probe", scenario,
+             "--hours", str(args.hours), "--events", str(args.events), "--spacing", str(args.spacing)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        results["scenarios"][scenario] = json.loads(out.strip().splitlines()[-1])
+        print("%s: %.1f s" % (scenario, time.perf_counter() - started), file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+    elif not args.output:
+        print(json.dumps(results, indent=2))
@@ -0,0 +1,256 @@
+"""
+    Local stand-in for the MongoDB Atlas Data API.
+
+    Serves the "aggregate" and "find" actions with a canned list of upcoming
+    events, speaking HTTP/1.1 keep-alive and (optionally) TLS with a throwaway
+    self-signed certificate, so the consumers' fetch paths can be measured
+    without touching the real service.
+
+    Run standalone:
+        python fake_data_api.py --port 8443 --tls --events 5
+"""
+
+import argparse
+import gzip
+import json
+import os
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from bisect import bisect_right
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# .............................................................................
+def make_documents(count, start=None, spacing=30 * 60, sources=("Work Calendar",)):
+    """
+        Build a sorted list of event documents in the shape the consumers'
+        aggregation pipeline projects.
+    """
+    start = int(start if start is not None else time.time()) + 10 * 60
+    docs = []
+
+    for i in range(count):
+        ticks = start + i * spacing
+        docs.append({
+            "eventId": "evt%05d" % i,
+            "source": sources[i % len(sources)],
+            "title": "Meeting number %d" % i,
+            "startTime": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(ticks)),
+            "startTicks": ticks
+        })
+
+    return docs
+
+
+# .............................................................................
+def page_of(request):
+    """
+        The page an aggregate request asks for, from its pipeline: (after,
+        per_source, sources, until), from {"$match": {"startTimestamp":
+        {"$gt": after, "$lt": until}}}, {"$match": {"rank": {"$lte":
+        per_source}}} or {"$limit": per_source}, and the "source" of each
+        per-source $match (including those in $unionWith pipelines) or a
+        {"source": {"$in": sources}}. None for any that's missing.
+    """
+    page = {"after": None, "per_source": None, "sources": None, "until": None}
+
+    def scan(pipeline):
+        for stage in pipeline:
+            match = stage.get("$match", {})
+
+            if isinstance(match.get("startTimestamp"), dict):
+                page["after"] = match["startTimestamp"].get("$gt", page["after"])
+                page["until"] = match["startTimestamp"].get("$lt", page["until"])
+
+            if isinstance(match.get("rank"), dict):
+                page["per_source"] = match["rank"].get("$lte", page["per_source"])
+
+            if isinstance(match.get("source"), dict):
+                page["sources"] = (page["sources"] or []) + match["source"].get("$in", [])
+            elif "source" in match:
+                page["sources"] = (page["sources"] or []) + [match["source"]]
+
+            if "$limit" in stage:
+                page["per_source"] = stage["$limit"]
+
+            if "$unionWith" in stage:
+                scan(stage["$unionWith"].get("pipeline", []))
+
+    try:
+        scan(json.loads(request).get("pipeline", []))
+    except ValueError:
+        pass
+
+    return page["after"], page["per_source"], page["sources"], page["until"]
+
+
+# .............................................................................
+def make_self_signed_cert(directory):
+    """
+        Create a throwaway self-signed certificate with the openssl CLI.
+    """
+    cert = os.path.join(directory, "cert.pem")
+    key = os.path.join(directory, "key.pem")
+
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+         "-keyout", key, "-out", cert, "-days", "1", "-subj", "/CN=localhost"],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    return cert, key
+
+
+# .............................................................................
+class FakeDataApi():
+
+    # .........................................................................
+    def __init__(self, documents=None, host="127.0.0.1", port=0, tls=False, latency=0.0, limit=None):
+        """
+            With a limit, only that many upcoming events (startTicks after
+            time.time()) per source are returned, sorted by source and then
+            time, like the consumers' pipeline does. Otherwise every document
+            is returned as is.
+        """
+        self.documents = documents if documents is not None else make_documents(5)
+        self.latency = latency
+        self.limit = limit
+        self.byTime = None
+        self.requests = 0
+        self.connections = 0
+        self.tls = tls
+        self.certDir = None
+
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                api.connections += 1
+                super().setup()
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = self.rfile.read(length)
+                api.requests += 1
+
+                if api.latency:
+                    time.sleep(api.latency)
+
+                body = json.dumps({"documents": api.upcoming(*page_of(request))}).encode("utf-8")
+                gzipped = "gzip" in self.headers.get("Accept-Encoding", "")
+
+                if gzipped:
+                    body = gzip.compress(body)
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+
+                if gzipped:
+                    self.send_header("Content-Encoding", "gzip")
+
+                if self.headers.get("Connection", "").lower() == "close":
+                    self.send_header("Connection", "close")
+                    self.close_connection = True
+
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+
+        if tls:
+            self.certDir = tempfile.TemporaryDirectory()
+            cert, key = make_self_signed_cert(self.certDir.name)
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(cert, key)
+            self.server.socket = context.wrap_socket(self.server.socket, server_side=True)
+
+        self.thread = None
+
+    # .........................................................................
+    def upcoming(self, after=None, per_source=None, sources=None, until=None):
+        """
+            Events after "after" (default: now) and before "until" (default:
+            any time), at most per_source (default: the limit) per source,
+            from the given sources (default: all).
+        """
+        if self.limit is None:
+            return self.documents
+
+        after = time.time() if after is None else after
+        per_source = per_source or self.limit
+        sources = None if sources is None else set(sources)
+        bySource = {}
+
+        if self.byTime is None:
+            self.byTime = sorted(self.documents, key=lambda d: d["startTicks"])
+
+        for d in self.byTime[bisect_right(self.byTime, after, key=lambda d: d["startTicks"]):]:
+            if until is not None and d["startTicks"] >= until:
+                break
+
+            if sources is not None and d["source"] not in sources:
+                continue
+
+            events = bySource.setdefault(d["source"], [])
+
+            if len(events) < per_source:
+                events.append(d)
+
+        return [d for source in sorted(bySource) for d in bySource[source]]
+
+    # .........................................................................
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        scheme = "https" if self.tls else "http"
+        return "%s://%s:%d/action/" % (scheme, host, port)
+
+    # .........................................................................
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    # .........................................................................
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+        if self.certDir is not None:
+            self.certDir.cleanup()
+
+    # .........................................................................
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# .............................................................................
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8443)
+    parser.add_argument("--tls", action="store_true")
+    parser.add_argument("--events", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0, help="artificial server latency in seconds")
+    args = parser.parse_args()
+
+    api = FakeDataApi(make_documents(args.events), port=args.port, tls=args.tls, latency=args.latency)
+    print("Fake Data API listening on", api.url)
+
+    try:
+        api.server.serve_forever()
+    except KeyboardInterrupt:
+        api.stop()
@@ -0,0 +1,241 @@
+"""
+    A tiny in-memory stand-in for a MongoDB collection, with just enough of
+    the aggregation pipeline to run the consumers' event queries, old and
+    new, and an index on (source, startTimestamp).
+
+    Like MongoDB, a pipeline that starts with a $match on indexed fields
+    reads its documents off the index: an index range scan per source, in
+    index order, so a following $sort on the index keys costs nothing and a
+    following $limit stops the scan early. Anything else (e.g. a pipeline
+    that starts with $addFields) reads every document in the collection.
+    keys_examined and docs_examined count the work, the way MongoDB's
+    explain() does.
+
+    Supported: $addFields ($dateDiff only), $match (equality, $gt, $gte,
+    $lt, $lte, $in, and $expr with one comparison), $sort, $limit,
+    $setWindowFields ($documentNumber only), $project and $unionWith (on
+    the same collection).
+"""
+
+import operator
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+
+IndexFields = ("source", "startTimestamp")
+
+Comparisons = {
+    "$gt": operator.gt, "$gte": operator.ge, "$lt": operator.lt, "$lte": operator.le,
+    "$eq": operator.eq, "$ne": operator.ne,
+}
+
+
+# .............................................................................
+class Collection():
+
+    # .........................................................................
+    def __init__(self, documents):
+        self.documents = documents
+        self.index = None       # source -> (sorted startTimestamps, documents in that order)
+        self.keys_examined = 0
+        self.docs_examined = 0
+
+    # .........................................................................
+    def create_index(self):
+        index = {}
+
+        for d in sorted(self.documents, key=lambda d: (d["source"], d["startTimestamp"])):
+            keys, docs = index.setdefault(d["source"], ([], []))
+            keys.append(d["startTimestamp"])
+            docs.append(d)
+
+        self.index = index
+
+    # .........................................................................
+    def drop_index(self):
+        self.index = None
+
+    # .........................................................................
+    def reset_stats(self):
+        self.keys_examined = 0
+        self.docs_examined = 0
+
+    # .........................................................................
+    def aggregate(self, pipeline, now=None):
+        now = now or datetime.now(timezone.utc)
+        docs, pipeline = self._plan(pipeline)
+
+        for stage in pipeline:
+            (name, spec), = stage.items()
+            docs = getattr(self, "_" + name[1:])(docs, spec, now)
+
+        return list(docs)
+
+    # .........................................................................
+    def _plan(self, pipeline):
+        """
+            The documents the pipeline starts from, and the stages that are
+            left to run on them.
+        """
+        match = pipeline[0].get("$match") if pipeline else None
+
+        if self.index is None or match is None or not match or not set(match) <= set(IndexFields):
+            self.docs_examined += len(self.documents)
+            return self.documents, pipeline
+
+        source = match.get("source")
+
+        if source is None:
+            sources = sorted(self.index)
+        elif isinstance(source, dict):
+            sources = sorted(source.get("$in", ()))
+        else:
+            sources = [source]
+
+        bounds = match.get("startTimestamp", {})
+
+        if not isinstance(bounds, dict):
+            bounds = {"$gte": bounds, "$lte": bounds}
+
+        rest = pipeline[1:]
+        limit = None
+
+        # A $sort in index order is answered by the scan itself, and a
+        # $limit right after it stops the scan early.
+        if rest and "$sort" in rest[0] and self._index_order(rest[0]["$sort"], sources):
+            rest = rest[1:]
+
+            if rest and "$limit" in rest[0]:
+                limit = rest[0]["$limit"]
+                rest = rest[1:]
+
+        docs = []
+
+        for source in sources:
+            keys, source_docs = self.index.get(source, ((), ()))
+            low, high = 0, len(keys)
+
+            if "$gt" in bounds:
+                low = bisect_right(keys, bounds["$gt"])
+            if "$gte" in bounds:
+                low = bisect_left(keys, bounds["$gte"])
+            if "$lt" in bounds:
+                high = bisect_left(keys, bounds["$lt"])
+            if "$lte" in bounds:
+                high = bisect_right(keys, bounds["$lte"])
+
+            if limit is not None:
+                high = min(high, low + max(0, limit - len(docs)))
+
+            self.keys_examined += high - low + 1
+            docs.extend(source_docs[low:high])
+
+        self.docs_examined += len(docs)
+        return docs, rest
+
+    # .........................................................................
+    def _index_order(self, sort, sources):
+        fields = list(sort.items())
+
+        if any(order != 1 for _, order in fields):
+            return False
+
+        fields = [field for field, _ in fields]
+        return fields == list(IndexFields) or (len(sources) <= 1 and fields == ["startTimestamp"])
+
+    # .........................................................................
+    def _addFields(self, docs, spec, now):
+        for d in docs:
+            d = dict(d)
+
+            for field, expression in spec.items():
+                d[field] = _evaluate(expression, d, now)
+
+            yield d
+
+    # .........................................................................
+    def _match(self, docs, spec, now):
+        return (d for d in docs if _matches(d, spec, now))
+
+    # .........................................................................
+    def _sort(self, docs, spec, now):
+        docs = list(docs)
+
+        for field, order in reversed(list(spec.items())):
+            docs.sort(key=lambda d: d.get(field), reverse=order < 0)
+
+        return docs
+
+    # .........................................................................
+    def _limit(self, docs, spec, now):
+        return list(docs)[:spec]
+
+    # .........................................................................
+    def _setWindowFields(self, docs, spec, now):
+        partition = spec["partitionBy"].lstrip("$")
+        docs = self._sort(self._sort(docs, spec["sortBy"], now), {partition: 1}, now)
+        output, = spec["output"]
+        counts = {}
+
+        for d in docs:
+            counts[d.get(partition)] = counts.get(d.get(partition), 0) + 1
+            yield dict(d, **{output: counts[d.get(partition)]})
+
+    # .........................................................................
+    def _project(self, docs, spec, now):
+        for d in docs:
+            yield {
+                field: d[value[1:]] if isinstance(value, str) else d[field]
+                for field, value in spec.items()
+                if value and (d.get(field) is not None or isinstance(value, str))
+            }
+
+    # .........................................................................
+    def _unionWith(self, docs, spec, now):
+        yield from docs
+        yield from self.aggregate(spec["pipeline"], now)
+
+
+# .............................................................................
+def _evaluate(expression, d, now):
+    if isinstance(expression, str) and expression == "$$NOW":
+        return now
+
+    if isinstance(expression, str) and expression.startswith("$"):
+        return d.get(expression[1:])
+
+    if isinstance(expression, dict) and "$dateDiff" in expression:
+        spec = expression["$dateDiff"]
+        start = _evaluate(spec["startDate"], d, now)
+        end = _evaluate(spec["endDate"], d, now)
+        return int((end - start).total_seconds())
+
+    return expression
+
+
+# .............................................................................
+def _matches(d, spec, now):
+    for field, condition in spec.items():
+        if field == "$expr":
+            (name, (left, right)), = condition.items()
+
+            if not Comparisons[name](_evaluate(left, d, now), _evaluate(right, d, now)):
+                return False
+
+            continue
+
+        value = d.get(field)
+
+        if not isinstance(condition, dict):
+            if value != condition:
+                return False
+
+            continue
+
+        for name, operand in condition.items():
+            if name == "$in":
+                if value not in operand:
+                    return False
+            elif value is None or not Comparisons[name](value, operand):
+                return False
+
+    return True
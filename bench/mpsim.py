@@ -0,0 +1,136 @@
+"""
+    Just enough of a MicroPython environment to import and drive the
+    MicroPython consumer (consumers/micropython) under CPython.
+
+    Only the hardware modules the consumer imports are stubbed out; anything
+    already importable (e.g. a test's own fake "machine") is left alone.
+"""
+
+import asyncio
+import os
+import sys
+import time
+import types
+
+MicroPythonDir = os.path.join(os.path.dirname(__file__), "..", "consumers", "micropython")
+SharedDir = os.path.join(os.path.dirname(__file__), "..", "consumers", "shared")
+
+
+# .............................................................................
+def install(mongo_url, mongo_api_key="bench", relay_url=None):
+    """
+        Put a fake "secrets" module in place, and the MicroPython consumer on
+        the import path.
+    """
+    secrets = types.ModuleType("secrets")
+    secrets.mongo_url = mongo_url
+    secrets.mongo_api_key = mongo_api_key
+    secrets.mongo_cluster_name = "ClusterOne"
+
+    if relay_url:
+        secrets.relay_url = relay_url
+
+    sys.modules["secrets"] = secrets
+
+    if "machine" not in sys.modules:
+        machine = types.ModuleType("machine")
+        machine.lightsleep = lambda ms: None
+        machine.Pin = FakePin
+        machine.PWM = FakePwm
+        sys.modules["machine"] = machine
+
+    if "neopixel" not in sys.modules:
+        neopixel = types.ModuleType("neopixel")
+        neopixel.NeoPixel = FakeNeoPixel
+        sys.modules["neopixel"] = neopixel
+
+    if "network" not in sys.modules:
+        network = types.ModuleType("network")
+        network.STA_IF = 0
+        network.AP_IF = 1
+        network.WLAN = FakeWlan
+        sys.modules["network"] = network
+
+    # MicroPython's extra time and asyncio functions.
+    if not hasattr(time, "ticks_ms"):
+        time.ticks_ms = lambda: int(time.monotonic() * 1000)
+        time.ticks_diff = lambda a, b: a - b
+        time.sleep_ms = lambda ms: time.sleep(ms / 1000)
+
+    if not hasattr(asyncio, "sleep_ms"):
+        asyncio.sleep_ms = lambda ms: asyncio.sleep(ms / 1000)
+
+    # CPython's asyncio receives into a 256 KB buffer, which would swamp
+    # the consumer's own allocations in heap measurements. MicroPython's
+    # streams only read what was asked for.
+    asyncio.selector_events._SelectorSocketTransport.max_size = 4096
+
+    for directory in (SharedDir, MicroPythonDir):
+        if directory not in sys.path:
+            sys.path.insert(0, directory)
+
+
+# .............................................................................
+class FakeWlan():
+    PM_PERFORMANCE = 1
+    PM_POWERSAVE = 2
+
+    def __init__(self, interface=0):
+        self.pm = self.PM_PERFORMANCE
+
+    def config(self, pm=None):
+        if pm is not None:
+            self.pm = pm
+
+
+# .............................................................................
+class FakePin():
+    OUT = 1
+
+    def __init__(self, pin, mode=None):
+        self.pin = pin
+
+
+# .............................................................................
+class FakePwm():
+
+    def __init__(self, pin, freq=1000):
+        self.pin = pin
+        self.duty = 0
+
+    def duty_u16(self, duty):
+        self.duty = duty
+
+
+# .............................................................................
+class FakeNeoPixel():
+    """
+        Keeps the pixels, and counts how often they're written out.
+    """
+
+    def __init__(self, pin, n):
+        self.n = n
+        self.pixels = [(0, 0, 0)] * n
+        self.writes = 0
+
+    def __setitem__(self, index, value):
+        self.pixels[index] = value
+
+    def __getitem__(self, index):
+        return self.pixels[index]
+
+    def write(self):
+        self.writes += 1
+
+
+# .............................................................................
+class FakeLeds():
+    Red = (255, 0, 0)
+    Green = (0, 255, 0)
+    Yellow = (255, 255, 0)
+
+    def on(self, color):
+        pass
+
+    def off(self):
+        pass
@@ -0,0 +1,125 @@
+"""
+    Simulated clock for running the consumers faster than real time.
+
+    Virtual time is real time plus however much time has been skipped.
+    Whenever the asyncio loop would go idle waiting for its next timer, the
+    clock skips straight to that timer instead, so an hour of schedule runs
+    in a few seconds. While a fetch is in flight (see busy()), the loop
+    waits on real I/O as usual, so network timeouts still mean something,
+    and while a hold predicate is true (see holdWhile(), e.g. a background
+    thread has work queued) it polls in real time instead of skipping.
+
+    install() patches time.time() and time.monotonic(), so it must be called
+    before importing modules that bind those at import time (e.g. default
+    arguments like clock=time.time).
+
+    The skipped time lives in shared memory, so a helper process (e.g. the
+    fake Data API) can follow the same clock: pass it clock.shared and call
+    install() on its own SimulatedClock there.
+"""
+
+import asyncio
+import contextlib
+import multiprocessing
+import selectors
+import time
+
+HoldPollSeconds = 0.001
+
+_realTime = time.time
+_realMonotonic = time.monotonic
+
+
+# .............................................................................
+class SimulatedClock():
+
+    # .........................................................................
+    def __init__(self, shared=None):
+        self.shared = shared if shared is not None else multiprocessing.RawValue('d', 0.0)
+        self.busyCount = 0
+        self.holds = []
+        self.wakeups = 0
+
+    # .........................................................................
+    def time(self):
+        return _realTime() + self.shared.value
+
+    # .........................................................................
+    def monotonic(self):
+        return _realMonotonic() + self.shared.value
+
+    # .........................................................................
+    def skip(self, seconds):
+        self.shared.value += seconds
+
+    # .........................................................................
+    @contextlib.contextmanager
+    def busy(self):
+        """
+            Don't skip time while this is active (e.g. during a fetch).
+        """
+        self.busyCount += 1
+
+        try:
+            yield
+        finally:
+            self.busyCount -= 1
+
+    # .........................................................................
+    def holdWhile(self, predicate):
+        """
+            Don't skip time while predicate() is true.
+        """
+        self.holds.append(predicate)
+
+    # .........................................................................
+    def held(self):
+        return any(predicate() for predicate in self.holds)
+
+    # .........................................................................
+    def install(self):
+        time.time = self.time
+        time.monotonic = self.monotonic
+
+    # .........................................................................
+    def uninstall(self):
+        time.time = _realTime
+        time.monotonic = _realMonotonic
+
+    # .........................................................................
+    def newEventLoop(self):
+        return asyncio.SelectorEventLoop(_SimulatedSelector(self))
+
+
+# .............................................................................
+class _SimulatedSelector(selectors.DefaultSelector):
+    """
+        Counts every time the loop wakes up from an idle wait, and skips the
+        wait instead of sleeping through it.
+    """
+
+    # .........................................................................
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+
+    # .........................................................................
+    def select(self, timeout=None):
+        if timeout is not None and timeout <= 0:
+            return super().select(timeout)
+
+        if self.clock.busyCount:
+            events = super().select(timeout)
+        elif self.clock.held():
+            events = super().select(HoldPollSeconds if timeout is None else min(timeout, HoldPollSeconds))
+        else:
+            events = super().select(0)
+
+            if not events:
+                if timeout is None:
+                    events = super().select(None)
+                else:
+                    self.clock.skip(timeout)
+
+        self.clock.wakeups += 1
+        return events
@@ -1,11 +1,136 @@
 import json
-import httpx
-import pendulum
-from win32com.client import Dispatch as ComDispatch
 import asyncio
+import hashlib
+import heapq
+import os
+import time
+from datetime import datetime
+from operator import itemgetter
+from zoneinfo import ZoneInfo
+from dataapi import DataApiClient, DataApiError
+from metrics import Metrics, MetricsServer
+from scheduler import DeadlineScheduler
+from schedulestore import ScheduleStore
+from schedulewindow import ScheduleWindow, eventStart, pageQuery
+from speech import SpeechEngine, SapiBackend
+from usbnotifier import UsbNotifier
+
+from config import (
+    MongoUrl, MongoApiKey, RefreshIntervalSeconds, FetchRetryMaxSeconds, FetchFailuresToOpen,
+    FetchOpenSeconds, FleetSpreadSeconds, AnnouncementGraceSeconds, EventEndSeconds, EventsPerSource,
+    ScheduleLookaheadSeconds, ScheduleTailRefreshSeconds, SchedulePages, MetricsHost, EventQuery
+)
+
+# The refresh policy and fetch backoff are shared with the MicroPython
+# consumer (config puts consumers/shared on sys.path).
+from backoff import Backoff, jitter
+from refreshpolicy import RefreshPolicy
+
+
+# The schedule is refreshed every RefreshIntervalSeconds from the moment the
+# next meeting's announcements start, every MaxRefreshSeconds when it's far
+# off (or there's none), and in between as it gets closer (see
+# consumers/shared/refreshpolicy.py). Nothing is fetched during the
+# DoNotDisturb windows: (weekdays, start hour, end hour) in local time, with
+# Monday as 0. A window that ends before it starts runs overnight, e.g.
+# DoNotDisturb = (((0, 1, 2, 3, 4), 19, 7), ((5, 6), 0, 24)) for nights and
+# weekends. Failed refreshes back off (see FetchRetryMaxSeconds in config.py).
+MaxRefreshSeconds = 15 * 60
+DoNotDisturb = ()
+
+# Set this to the URL of a schedule relay (see relay.py), e.g.
+# 'http://192.168.1.10:8765/', to get the schedule from the relay instead of
+# polling the Data API directly.
+RelayUrl = None
+RelayWaitSeconds = 50
+TimeZone = 'America/New_York'
+
+# The last fetched schedule is kept here, so we can start announcing straight
+# away on the next launch, even if the Data API can't be reached.
+ScheduleDbPath = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schedule.db')
+
+# An event's announcements are rendered to audio this many seconds before the
+# first one is due, rather than as soon as the event is fetched. A day's
+# worth of meetings would push the next ones' clips out of the speech cache
+# (SpeechEngine's cacheSize); an hour's worth fits easily.
+PrerenderSeconds = 3600
+
+# Set UsbNotifierEnabled to drive a CircuitPython USB notifier (see
+# usbnotifier.py) as well as speaking. With no port set, the device is found
+# by its USB VID:PID.
+UsbNotifierEnabled = False
+UsbNotifierPort = None
+
+# Metrics (Prometheus text format) and a health check are served on
+# http://<MetricsHost>:<MetricsPort>/metrics and /health. Set the port to
+# None to turn this off. The schedule counts as stale (and /health fails)
+# if a refresh is more than MetricsStaleSeconds overdue.
+MetricsPort = 9464
+MetricsStaleSeconds = 5 * RefreshIntervalSeconds
+
+# -----------------------------------------------------------------------------
+def mergeSources(documents):
+    """
+        Event documents come back as one run per source, each sorted by
+        start time. Merge the runs into a single timeline (a k-way merge,
+        O(n log k) for n events from k sources), keeping only the first of
+        any events with the same eventId, e.g. a meeting that's on both the
+        work and the team calendar.
+    """
+    runs = []
+    run = None
+    source = None
+
+    for document in documents:
+        event = {
+            "eventId": document.get("eventId"),
+            "title": document["title"],
+            "start": eventStart(document),
+            "status": "pending"
+        }
+
+        # A new source, or a run that isn't sorted, starts a new run.
+        if run is None or document.get("source") != source or event["start"] < run[-1]["start"]:
+            run = []
+            runs.append(run)
+            source = document.get("source")
+
+        run.append(event)
+
+    seen = set()
+    merged = []
+
+    for event in heapq.merge(*runs, key=itemgetter("start")):
+        eventId = event["eventId"]
+
+        if eventId:
+            if eventId in seen:
+                continue
+
+            seen.add(eventId)
+
+        merged.append(event)
+
+    return merged
+
+
+# -----------------------------------------------------------------------------
+def localTicks(ticks):
+    """
+        Epoch seconds, shifted to the local wall clock (for the do-not-disturb
+        windows).
+    """
+    return ticks + datetime.fromtimestamp(ticks, ZoneInfo(TimeZone)).utcoffset().total_seconds()
 
 
-MongoUrl = 'https://data.mongodb-api.com/app/data-pvtrm/endpoint/data/beta/action/'
+# -----------------------------------------------------------------------------
+def formatTime(ticks):
+    """
+        Epoch seconds as local wall clock time, e.g. "9:05 AM".
+    """
+    t = datetime.fromtimestamp(ticks, ZoneInfo(TimeZone))
+    return f"{t.hour % 12 or 12}:{t.minute:02d} {'AM' if t.hour < 12 else 'PM'}"
+
 
 """
     What to do:
@@ -30,214 +155,526 @@ MongoUrl = 'https://data.mongodb-api.com/app/data-pvtrm/endpoint/data/beta/actio
 class MeetingMinder():
 
     # -------------------------------------------------------------------------
-    def __init__(self):
-        self.speaker = ComDispatch("SAPI.SpVoice")
+    def __init__(self, speechBackend=None, storePath=ScheduleDbPath, usbNotifier=None):
+        self.speech = SpeechEngine(speechBackend or SapiBackend())
+
+        if usbNotifier is None and UsbNotifierEnabled:
+            usbNotifier = UsbNotifier(port=UsbNotifierPort)
+
+        self.usb = usbNotifier
+        self.lightsKey = None
+        self.metrics = Metrics(staleSeconds=MetricsStaleSeconds)
+        self.scheduler = DeadlineScheduler(onLateness=self.metrics.lateness.observe)
         self.events = []
+        self.nextEventKey = None
+        self.scheduleDigest = None
+
+        # One pooled, keep-alive client for the life of the app. The query
+        # never changes, so it is serialized once here rather than per poll.
+        self.dataApi = DataApiClient(MongoUrl, MongoApiKey)
+        self.eventQuery = DataApiClient.serialize(json.loads(EventQuery))
+        self.window = ScheduleWindow(
+            self.fetchPage, EventsPerSource, lookaheadSeconds=ScheduleLookaheadSeconds,
+            tailRefreshSeconds=ScheduleTailRefreshSeconds, maxPages=SchedulePages
+        )
+        # Notifications for a meeting start with its first light cue (and
+        # announcement).
+        self.refreshPolicy = RefreshPolicy(
+            RefreshIntervalSeconds, MaxRefreshSeconds, notify_ahead=max(s for s, _ in self.lightCues()),
+            do_not_disturb=DoNotDisturb, spread_seconds=FleetSpreadSeconds
+        )
+        self.backoff = Backoff(RefreshIntervalSeconds, FetchRetryMaxSeconds, FetchFailuresToOpen, FetchOpenSeconds)
+        self.tasks = set()
+
+        # In relay mode we long-poll the relay, which only answers when the
+        # schedule version changes.
+        self.relay = DataApiClient(RelayUrl, None) if RelayUrl else None
+        self.relayVersion = -1
+
+        self.store = ScheduleStore(storePath)
+        self.lastRefresh = self.store.savedAt
+        self.loadSchedule()
+
+        self.registerMetrics()
+        self.metricsServer = MetricsServer(self.metrics, self.scheduleAge, self.healthDetails) if MetricsPort else None
+
+    # -------------------------------------------------------------------------
+    def loadSchedule(self):
+        """
+            Compile the schedule saved by the last successful refresh, so
+            notifications are live before the first fetch completes.
+        """
+        rows = self.store.load(since=time.time() - EventEndSeconds)
+        self.scheduleDigest = self.window.digest = self.store.digest
+
+        if rows:
+            print(f"Loaded {len(rows)} events from the schedule cache")
+
+        self.updateEvents([
+            {"eventId": eventId, "title": title, "start": int(start), "status": "pending"}
+            for title, start, eventId in rows
+        ])
+
+    # -------------------------------------------------------------------------
+    def registerMetrics(self):
+        """
+            Metrics that are read off the current state when they're scraped.
+        """
+        self.metrics.counter(
+            "scheduler_wakeups", "Times the deadline scheduler woke up.", lambda: self.scheduler.wakeups
+        )
+        self.metrics.gauge(
+            "schedule_age_seconds", "Seconds since the schedule was last refreshed.", self.scheduleAge
+        )
+        self.metrics.gauge("schedule_events", "Events in the current schedule.", lambda: len(self.events))
+        self.metrics.gauge(
+            "next_event_timestamp_seconds", "Start time of the next event (Unix time).", self.nextEventMetric
+        )
+        self.metrics.gauge(
+            "fetch_consecutive_failures", "Refreshes that have failed in a row.", lambda: self.backoff.failures
+        )
+        self.metrics.gauge(
+            "fetch_circuit_open", "1 while refreshes keep failing and are backed off.",
+            lambda: int(self.backoff.is_open)
+        )
+
+    # -------------------------------------------------------------------------
+    def scheduleAge(self):
+        """
+            Seconds since the last successful refresh (or since the cached
+            schedule was saved, before the first one). None if there has
+            never been one.
+        """
+        if self.lastRefresh is None:
+            return None
+
+        return time.time() - self.lastRefresh
+
+    # -------------------------------------------------------------------------
+    def nextEvent(self):
+        now = time.time()
+        upcoming = [e for e in self.events if e['start'] > now]
+
+        return upcoming[0] if upcoming else None
+
+    # -------------------------------------------------------------------------
+    def nextEventMetric(self):
+        # Only the start time: a title label would be a new series for every
+        # meeting. The title is on /health (healthDetails) instead.
+        event = self.nextEvent()
+
+        return event['start'] if event else None
+
+    # -------------------------------------------------------------------------
+    def healthDetails(self):
+        event = self.nextEvent()
+
+        return {"nextEvent": {"title": event['title'], "start": event['start']} if event else None}
 
-    
     # -------------------------------------------------------------------------
     async def run(self):
         """
             Start background tasks
         """
 
-        asyncio.create_task(self.eventRefresherTask())
-        asyncio.create_task(self.eventSchedulerTask())
+        self.startTask(self.eventRefresherTask())
+        self.startTask(self.scheduler.run())
+
+        if self.metricsServer:
+            try:
+                await self.metricsServer.start(MetricsHost, MetricsPort)
+            except OSError as e:
+                print("Metrics endpoint not available:", e)
+
+    # -------------------------------------------------------------------------
+    def startTask(self, coroutine):
+        """
+            Start a background task and keep a reference to it so that it
+            can't be garbage collected mid-flight, and can be cancelled on
+            shutdown.
+        """
+        task = asyncio.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+        return task
+
+    # -------------------------------------------------------------------------
+    async def stop(self):
+        """
+            Cancel all background tasks (including any in-flight fetch) and
+            close the Data API connection pool.
+        """
+        for task in list(self.tasks):
+            task.cancel()
+
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        await self.dataApi.close()
+
+        if self.metricsServer:
+            await self.metricsServer.stop()
+
+        if self.relay:
+            await self.relay.close()
+
+        self.speech.close()
+        self.store.close()
+
+        if self.usb:
+            self.usb.close()
 
     # -------------------------------------------------------------------------
     async def eventRefresherTask(self):
+        """
+            Periodically fetch events, as often as the refresh policy says.
+            The fetch is fully async and bounded by the Data API client's
+            deadline, so a slow network only delays the next refresh. The
+            scheduler and any announcements keep running on the current
+            schedule in the meantime, and for as long as fetches fail, which
+            are retried with backoff.
+        """
+        # The cached schedule is already live, so there's no hurry.
+        await self.sleepUntilRefresh(jitter(FleetSpreadSeconds))
+
         while True:
+            quiet = self.refreshPolicy.quiet_for(localTicks(time.time()))
+
+            if quiet:
+                print("Do not disturb. Not refreshing for", round(quiet / 60), "minutes")
+                await self.sleepUntilRefresh(quiet)
+                continue
+
             print("Refreshing events...")
+            started = time.perf_counter()
+
+            try:
+                events = await self.getEvents()
+            except (DataApiError, ValueError) as e:
+                self.metrics.observeFetch(time.perf_counter() - started, failed=True)
+                retry = self.backoff.failed()
+                print("Failed to refresh events. Keeping the current schedule.", e)
+                print(f"Retrying in {round(retry)} seconds" + (" (circuit open)" if self.backoff.is_open else ""))
+
+                # Not sleepUntilRefresh(): the schedule does go stale.
+                await asyncio.sleep(retry)
+                continue
 
-            events = await self.getEvents()
-            nextEvent = [e for e in self.events if e['status'] == 'scheduled']
-            
-            if nextEvent:
-                nextEvent = nextEvent[0]
-            else:
-                nextEvent = events[0]
+            self.metrics.observeFetch(time.perf_counter() - started)
+            self.backoff.succeeded()
+            self.lastRefresh = time.time()
 
-            events = [e for e in events if not (nextEvent and e['time'] != nextEvent['time'])]
-            self.events = [nextEvent, *events]
+            if events is not None:
+                self.updateEvents(events)
+                self.store.save(
+                    [(e['title'], e['start'], e['eventId']) for e in events], self.scheduleDigest
+                )
 
-            if len(self.events) and self.events[0]['status'] == 'pending':
-                nextEvent = self.events[0]
-                nextEvent['status'] = 'scheduled'
-                asyncio.create_task(self.announce(nextEvent))
+            # A relay long-poll already waits for the schedule to change, once
+            # there's a version to wait on.
+            if not self.relay or self.relayVersion < 0:
+                await self.sleepUntilRefresh(self.refreshDelay())
 
-            await asyncio.sleep(60)
+    # -------------------------------------------------------------------------
+    def refreshDelay(self):
+        """
+            Seconds until the next refresh, from how soon the next meeting is.
+        """
+        now = time.time()
+        nextStart = min((e['start'] for e in self.events if e['start'] > now), default=None)
+
+        return self.refreshPolicy.delay(now, nextStart, localTicks(now))
 
     # -------------------------------------------------------------------------
-    async def eventSchedulerTask(self):
-        while True:
-            if not self.events:
-                print("Waiting...")
-                await asyncio.sleep(1)
-                continue
+    async def sleepUntilRefresh(self, seconds):
+        """
+            Sleep until the next refresh. The schedule only counts as stale
+            (see /health) once that refresh is overdue.
+        """
+        self.metrics.staleSeconds = (self.scheduleAge() or 0) + seconds + MetricsStaleSeconds
+        await asyncio.sleep(seconds)
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def eventKey(event):
+        """
+            Events are identified by their calendar eventId. Events without
+            one (from an older publisher) fall back to title and start time.
+        """
+        return event.get('eventId') or (event['title'], event['start'])
+
+    # -------------------------------------------------------------------------
+    def updateEvents(self, events):
+        """
+            Apply a freshly fetched event list as a minimal diff against the
+            current schedule:
+            - events that are unchanged keep their pending deadlines untouched,
+            - events whose eventId (or, without one, title) matches but whose
+              time or title changed are moved,
+            - new events are compiled into deadlines, and
+            - events that disappeared have their deadlines cancelled.
+            Events that have already started are no longer returned by the
+            Data API, so they are kept (along with their pending end-of-event
+            deadline) until they finish.
+        """
+        now = time.time()
+        inProgress = [e for e in self.events if e['start'] <= now]
+        unmatched = {}
+
+        for e in self.events:
+            if e not in inProgress:
+                unmatched.setdefault(self.eventKey(e), e)
+
+        inProgressKeys = {self.eventKey(e) for e in inProgress}
+        events = [e for e in events if self.eventKey(e) not in inProgressKeys]
+
+        # First pass: events that haven't changed at all.
+        kept = [unmatched.pop(self.eventKey(e), None) for e in events]
+
+        # Second pass: pair the rest up by title, so a rescheduled meeting is
+        # moved rather than removed and re-added.
+        byTitle = {}
+
+        for e in unmatched.values():
+            byTitle.setdefault(e['title'], []).append(e)
+
+        changed = []
+        schedule = []
+
+        for e, existing in zip(events, kept):
+            if existing is not None and (existing['start'], existing['title']) != (e['start'], e['title']):
+                # Same eventId, new time or title.
+                self.cancelEvent(existing)
+                existing['start'] = e['start']
+                existing['title'] = e['title']
+                print(f"Moved: {existing['title']} to {formatTime(existing['start'])}")
+                changed.append(existing)
+            elif existing is None:
+                candidates = byTitle.get(e['title'])
+
+                if candidates:
+                    existing = candidates.pop(0)
+                    del unmatched[self.eventKey(existing)]
+                    self.cancelEvent(existing)
+                    existing['start'] = e['start']
+                    existing['eventId'] = e.get('eventId')
+                    print(f"Moved: {existing['title']} to {formatTime(existing['start'])}")
+                else:
+                    existing = e
+                    print(f"Added: {e['title']} at {formatTime(e['start'])}")
+
+                changed.append(existing)
 
-            nextEvent = self.events[0]
-            
-            print(f"Next event is {nextEvent['title']} at {nextEvent['time'].format('h:mm A')}")
+            schedule.append(existing)
 
-            if nextEvent['status'] == 'pending':
-                nextEvent['status'] = 'scheduled'
-                asyncio.create_task(self.announce(nextEvent))
+        for e in unmatched.values():
+            print(f"Removed: {e['title']}")
+            self.cancelEvent(e)
 
-            await asyncio.sleep(10)
+        self.events = inProgress + schedule
+
+        for e in changed:
+            self.scheduleEvent(e)
+
+        self.announceNextEvent()
 
     # -------------------------------------------------------------------------
-    async def announce(self, event):
+    def scheduleEvent(self, event):
         """
-            Wait for the configured time before the event starts, then start
-            announcing the event.
-            Exit when the event is done.
+            Compile an event into the exact instants it needs attention:
+            rendering its announcements (PrerenderSeconds ahead, so they can
+            be played back instantly), each announcement, and the point where
+            it's over.
         """
-        eventTime = event["time"]
-        eventTitle = event["title"]
+        key = self.eventKey(event)
+        start = event['start']
+        now = time.time()
+        announcements = self.announcements(event)
+        phrases = []
 
-        timeUntilEvent = pendulum.now().diff(eventTime)
-        self.speaker.speak(f"Your next meeting is {eventTitle} in {timeUntilEvent.in_words()} at {eventTime.format('h:mm A')}")
+        for secondsBefore, phrase in announcements:
+            when = start - secondsBefore
 
-        while True:
-            """
-                We don't need to spin our wheels fast if the event is a relatively long
-                time in the future. We can go to sleep for a long time, and wake up to
-                check every now and then.
-                When the meeting is 5 minutes out, we can start the announcement cyvle.
-            """
+            if when >= now - AnnouncementGraceSeconds:
+                self.scheduler.schedule(when, self.speech.say, phrase, key=key)
+                phrases.append(phrase)
 
-            sleepTime = await self.timeToWait(eventTime)
+        if phrases:
+            renderAt = start - announcements[0][0] - PrerenderSeconds
+            self.scheduler.schedule(max(renderAt, now), self.speech.prepare, phrases, key=key, measure=False)
 
-            if sleepTime:
-                await asyncio.sleep(sleepTime)
-                continue
+        if self.usb:
+            cues = self.lightCues()
 
+            # Only the latest cue that's already due is shown (straight away).
+            for i, (secondsBefore, state) in enumerate(cues):
+                nextCue = start - cues[i + 1][0] if i + 1 < len(cues) else start + EventEndSeconds
 
-            timeUntilEvent = pendulum.now().diff(eventTime)
+                if nextCue > now:
+                    self.scheduler.schedule(max(start - secondsBefore, now), self.setLights, key, state, key=key)
 
-            sleepTime = 1
+        self.scheduler.schedule(start + EventEndSeconds, self.endEvent, event, key=key, measure=False)
+        event['status'] = 'scheduled'
 
-            if timeUntilEvent.in_minutes() <= -1:
-                print("Meeting started. I'm going away.")
-                self.events.pop(0)
-                break
-            elif timeUntilEvent.in_seconds() <= 10 and timeUntilEvent.in_seconds() >= 0:
-                self.speaker.speak(f"Your meeting is starting. Please be prepared.")
-                await asyncio.sleep(10)    
-            elif timeUntilEvent.in_minutes() <= 1:
-                self.speaker.speak(f"Your meeting starts in {timeUntilEvent.in_words()}")
-            elif timeUntilEvent.in_minutes() <= 3:
-                self.speaker.speak(f"Your meeting starts in {timeUntilEvent.in_words()}")
-            elif timeUntilEvent.in_minutes() <= 5:
-                self.speaker.speak(f"Your next meeting, {eventTitle}, is at {eventTime.format('h:mm A')}")
-            elif timeUntilEvent.in_minutes() > 6:
-                sleepTime = 10
-
-            await asyncio.sleep(sleepTime)
+    # -------------------------------------------------------------------------
+    def cancelEvent(self, event):
+        key = self.eventKey(event)
+        self.scheduler.cancel(key)
+
+        if key == self.lightsKey:
+            self.setLights(None, "off")
 
     # -------------------------------------------------------------------------
-    async def timeToWait(self, eventTime):
-        timeUntilEvent = pendulum.now().diff(eventTime)
-
-        if timeUntilEvent.in_minutes() <= 5:
-            if timeUntilEvent.in_hours() > 0:
-                # The meeting is more than an hour away. Sleep for an hour.
-                sleepTime = 60 * 60
-            elif timeUntilEvent.in_minutes() > 10:
-                # The meeting is less than an hour away, but more than 10 minutes.
-                sleepTime = 10 * 60
-            elif timeUntilEvent.in_minutes() > 6:
-                sleepTime = 10
-            else:
-                sleepTime = 0
-
-            return sleepTime
+    def setLights(self, key, state):
+        """
+            Show a state on the USB notifier, on behalf of the event with the
+            given key. The notifier only sends actual changes to the device.
+        """
+        self.lightsKey = key if state != "off" else None
+        self.usb.show(state)
 
     # -------------------------------------------------------------------------
-    async def getEvents(self):
-        req = '''{
-            "dataSource": "ClusterOne",
-            "database": "notifications",
-            "collection": "events",
-            "pipeline": [
-                {
-                    "$addFields": {
-                        "timeDiff": {
-                            "$dateDiff": {
-                                "startDate": "$$NOW",
-                                "endDate": "$startTime",
-                                "unit": "second"
-                            }
-                        }
-                    }
-                },
-                {
-                    "$match": { "$expr": { "$gt": [ "$timeDiff", 0 ] } }
-                },
-                {
-                    "$sort": { "startTime": 1 }
-                },
-                {
-                    "$limit": 5
-                },
-                {
-                    "$project": {
-                        "_id": 0,
-                        "title": 1,
-                        "startTime": 1,
-                        "startTicks": "$startTimestamp"
-                    }
-                }
-            ]
-        }'''
-
-        headers = {
-            'Content-Type': 'application/json',
-            'Access-Control-Request-Headers': '*',
-            'api-key': '<my API key>',
-            'Connection': 'close'
-        }
+    def endEvent(self, event):
+        print("Meeting started. I'm going away.")
 
-        with httpx.Client() as client:
-            resp = client.post(MongoUrl + "aggregate", data=req, headers=headers)
-
-            eventList = []
-            nextEvent = {}
-
-            if resp.status_code == 200:
-                if len(resp.text) > 0:
-                    doc = json.loads(resp.text)
-
-                    if doc.get("documents"):
-                        events = doc["documents"]
-
-                        if len(events):
-                            for event in events:
-                                eventList.append({
-                                    "title": event["title"],
-                                    "time": pendulum.parse(event["startTime"]).in_tz('America/New_York'),
-                                    "status": "pending"
-                                })
-                        else:
-                            print("No events today")
-                    elif doc.get("document"):
-                        event = doc["document"]
-                        eventList.append({
-                            "title": event["title"],
-                            "time": pendulum.parse(event["startTime"]).in_tz('America/New_York'),
-                            "status": "pending"
-                        })
-
-                        eventList.append(nextEvent)
-                else:
-                    self.speaker.Speak("No more meetings today! WOO HOO!")
-            else:
-                print("Error: ", resp.status_code, " :: ", resp.text)
+        if self.usb and self.lightsKey == self.eventKey(event):
+            self.setLights(None, "off")
 
-            for e in eventList:
-                print(e)
+        if event in self.events:
+            self.events.remove(event)
 
-            return [e for e in eventList if e["time"] > pendulum.now()]
+        self.announceNextEvent()
+
+    # -------------------------------------------------------------------------
+    def announceNextEvent(self):
+        """
+            Announce the next meeting whenever it changes.
+        """
+        now = time.time()
+        upcoming = [e for e in self.events if e['start'] > now]
+
+        if not upcoming:
+            self.nextEventKey = None
+            print("Waiting...")
+            return
+
+        nextEvent = upcoming[0]
+        key = self.eventKey(nextEvent)
+
+        if key == self.nextEventKey:
+            return
+
+        self.nextEventKey = key
+        title = nextEvent['title']
+        start = nextEvent['start']
+        print(f"Next event is {title} at {formatTime(start)}")
+
+        # Worded on the speech thread, right before it's spoken.
+        self.speech.say(lambda: self.nextEventPhrase(title, start))
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def nextEventPhrase(title, start):
+        # pendulum is only needed for "in 2 hours" style wording, so it's only
+        # imported the first time this is spoken.
+        import pendulum
+
+        timeUntilEvent = pendulum.now().diff(pendulum.from_timestamp(start))
+        return f"Your next meeting is {title} in {timeUntilEvent.in_words()} at {formatTime(start)}"
+
+    # -------------------------------------------------------------------------
+    def announcements(self, event):
+        """
+            The phrases announced for an event, with how many seconds before
+            the event each one is due. These don't depend on the current time,
+            so they can be rendered to audio and cached ahead of time.
+        """
+        eventTime = formatTime(event["start"])
+
+        return [
+            (300, f"Your next meeting, {event['title']}, is at {eventTime}"),
+            (180, "Your meeting starts in 3 minutes"),
+            (60, "Your meeting starts in 1 minute"),
+            (10, "Your meeting is starting. Please be prepared."),
+        ]
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def lightCues():
+        """
+            The USB notifier states for an event, with how many seconds before
+            the event each one starts (the same tiers as the Go client).
+        """
+        return [
+            (300, "green"),
+            (60, "yellow"),
+            (10, "red"),
+        ]
+
+    # -------------------------------------------------------------------------
+    async def getEvents(self):
+        """
+            Fetch upcoming events from the Data API (or the relay).
+            Returns None if the schedule is byte-for-byte the same as last
+            time, so an unchanged schedule isn't parsed or rebuilt.
+            Raises DataApiError if the fetch fails or times out, or
+            ValueError if the response can't be parsed. Either way the
+            current schedule is left as it was.
+        """
+        if self.relay:
+            resp = await self.relay.get(
+                "schedule",
+                params={"version": self.relayVersion, "wait": RelayWaitSeconds},
+                deadline=RelayWaitSeconds + 10
+            )
+
+            # A relay that has no schedule yet answers 503, which raises
+            # DataApiError like any other failed fetch.
+            if resp.status_code == 304:
+                return None
+
+            # Take the relay's version before comparing digests: the
+            # schedule may be the one we already have (e.g. the cached one,
+            # after a restart), and the next long-poll has to wait on it. A
+            # response without one (an empty body) leaves it at -1, and the
+            # refresher sleeps between polls instead. The digest is only
+            # remembered once the response has parsed, so a garbled one is
+            # fetched again.
+            doc = json.loads(resp.content) if resp.content else {}
+            self.relayVersion = doc.get("version", -1)
+            digest = hashlib.blake2b(resp.content, digest_size=16).digest()
+
+            if digest == self.scheduleDigest:
+                return None
+
+            self.scheduleDigest = digest
+
+            if not doc:
+                self.speech.say("No more meetings today! WOO HOO!")
+                return []
+
+            documents = doc.get("documents") or ([doc["document"]] if doc.get("document") else [])
+        else:
+            if not await self.window.refresh():
+                return None
+
+            self.scheduleDigest = self.window.digest
+            documents = self.window.documents
+
+        eventList = mergeSources(documents)
+
+        for e in eventList:
+            print(e)
+
+        now = time.time()
+        return [e for e in eventList if e["start"] > now]
+
+    # -------------------------------------------------------------------------
+    async def fetchPage(self, after):
+        """
+            One page of the schedule (see schedulewindow.py).
+        """
+        resp = await self.dataApi.post("aggregate", pageQuery(self.eventQuery, after))
+        return resp.content
 
 
 # -----------------------------------------------------------------------------
@@ -247,13 +684,16 @@ async def main():
         start background tasks.
     """
     meetingMinder = MeetingMinder()
-    asyncio.create_task(meetingMinder.run())
-    
-    while True:
-        await asyncio.sleep(1)
+    await meetingMinder.run()
+
+    try:
+        while True:
+            await asyncio.sleep(1)
 
-        if asyncio.get_event_loop().is_closed():
-            break
+            if asyncio.get_event_loop().is_closed():
+                break
+    finally:
+        await meetingMinder.stop()
 
 
 # -----------------------------------------------------------------------------
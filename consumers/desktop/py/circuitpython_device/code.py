@@ -1,60 +1,212 @@
+"""
+    CircuitPython NeoPixel notifier
+
+    Everything runs off one loop at a fixed frame rate: each frame reads
+    whatever serial bytes have arrived (without blocking), and works out the
+    LEDs from the time since the current effect started. A new command shows
+    up within one frame.
+
+    Commands are lines. Framed commands (sent by the desktop app's
+    usbnotifier.py) look like:
+
+        ~E<RRGGBB><rise><hold><fall><gap><checksum>     effect
+        ~B<brightness><checksum>                        brightness
+
+    where every field is 2 hex digits, the color is 3 of them, rise/hold/
+    fall/gap are in units of 10 ms (rise to full brightness, stay there,
+    fall back to off, stay off, repeat; all zero means solid), and the
+    checksum is the sum of the bytes between "~" and the checksum, mod 256.
+    Frames with a bad checksum are ignored.
+    The old plain words ("red", "green", "yellow", "blue", "off") still work,
+    with the same fade in/out animations as before.
+"""
+
+import sys
 import time
 import board
 import neopixel
 import supervisor
 
-led = neopixel.NeoPixel(board.NEOPIXEL, 4)
-color = None
-ledsOn = False
-maxBrightness = 100
-countdown = 600
+FrameMs = 20
 
-while True:
-    if supervisor.runtime.serial_bytes_available:
-        color = input().strip()
+# Times are supervisor.ticks_ms(), which stays a small int and wraps around
+# every 2**29 ms (about 6 days). SAMD21 boards (e.g. the Neo Trinkey) run
+# CircuitPython without long ints, so time.monotonic_ns() isn't there, and an
+# ever growing millisecond count would overflow. Differences between times
+# go through ticksDiff().
+TicksPeriod = 1 << 29
+TicksMax = TicksPeriod - 1
+TicksHalfPeriod = TicksPeriod // 2
+
+# Legacy words: (color, (rise, hold, fall, gap) in ms).
+Words = {
+    "red": ((255, 0, 0), (100, 1000, 100, 250)),
+    "green": ((0, 255, 0), (200, 500, 1000, 250)),
+    "blue": ((0, 0, 255), (0, 0, 0, 0)),
+    "yellow": ((255, 255, 0), (100, 250, 250, 250)),
+    "off": ((0, 0, 0), (0, 0, 0, 0)),
+}
+
+
+# .............................................................................
+def nowMs():
+    return supervisor.ticks_ms()
+
+
+# .............................................................................
+def ticksAdd(ticks, ms):
+    return (ticks + ms) % TicksPeriod
+
+
+# .............................................................................
+def ticksDiff(a, b):
+    """
+        a - b in ms, right across a wrap around, for times less than half a
+        period (about 3 days) apart.
+    """
+    return ((((a - b) & TicksMax) + TicksHalfPeriod) & TicksMax) - TicksHalfPeriod
+
+
+# .............................................................................
+def parseFrame(line):
+    """
+        Returns (kind, values) for a valid frame, or None.
+    """
+    if len(line) < 4:
+        return None
+
+    body, checksum = line[1:-2], line[-2:]
+
+    try:
+        if int(checksum, 16) != sum(body.encode()) & 0xff:
+            return None
+
+        values = [int(body[i:i + 2], 16) for i in range(1, len(body), 2)]
+    except ValueError:
+        return None
+
+    return body[0], values
+
+
+# .............................................................................
+def handleLine(line):
+    global color, envelope, effectStart, maxBrightness
+
+    line = line.strip()
 
-    if color == "red":
-        ledsOn = True
+    if line.startswith("~"):
+        frame = parseFrame(line)
 
-        for value in range(0, maxBrightness, 5):
-            led.fill((value, 0, 0))
+        if frame is None:
+            return
 
-        time.sleep(1)
+        kind, values = frame
 
-        for value in range(maxBrightness, 0, -1):
-            led.fill((value, 0, 0))
+        if kind == "E" and len(values) == 7:
+            color = tuple(values[0:3])
+            envelope = tuple(v * 10 for v in values[3:7])
+            effectStart = nowMs()
+        elif kind == "B" and len(values) == 1:
+            maxBrightness = max(values[0], 10)
+    elif line in Words:
+        color, envelope = Words[line]
+        effectStart = nowMs()
 
-        time.sleep(.25)
-    elif color == "green":
-        ledsOn = True
 
-        for value in range(0, maxBrightness, 5):
-            led.fill((0, value, 0))
-            time.sleep(0.01)
+# .............................................................................
+def readSerial():
+    """
+        Read whatever has arrived, without waiting for a whole line.
+    """
+    global pending
 
-        time.sleep(.5)
+    available = supervisor.runtime.serial_bytes_available
 
-        for value in range(maxBrightness, 0, -1):
-            led.fill((0, value, 0))
-            time.sleep(0.01)
+    if not available:
+        return
 
-        time.sleep(.25)
-    elif color == "blue":
-        ledsOn = True
-        led.fill((0, 0, maxBrightness))
-    elif color == "yellow":
-        ledsOn = True
+    pending += sys.stdin.read(available)
 
-        for value in range(0, maxBrightness, 5):
-            led.fill((value, value, 0))
+    while True:
+        ends = [i for i in (pending.find("\n"), pending.find("\r")) if i >= 0]
+
+        if not ends:
+            break
+
+        end = min(ends)
+        handleLine(pending[:end])
+        pending = pending[end + 1:]
+
+    if len(pending) > 64:
+        # Garbage. Start over.
+        pending = ""
+
+
+# .............................................................................
+def levelAt(t):
+    """
+        Brightness (0 to 1) of the current effect, t ms after it started.
+    """
+    rise, hold, fall, gap = envelope
+    cycle = rise + hold + fall + gap
+
+    if rise == 0 and fall == 0 and gap == 0:
+        return 1
+
+    t %= cycle
+
+    if t < rise:
+        return t / rise
+
+    t -= rise
+
+    if t < hold:
+        return 1
+
+    t -= hold
+
+    if t < fall:
+        return 1 - t / fall
+
+    return 0
+
+
+# .............................................................................
+def render(now):
+    global shown
+
+    # An effect can run for days. Its time wraps around with the ticks, which
+    # is at worst a skip in a fade once every 6 days.
+    scale = levelAt((now - effectStart) & TicksMax) * maxBrightness / 255
+    pixel = tuple(int(c * scale) for c in color)
+
+    if pixel != shown:
+        led.fill(pixel)
+        led.show()
+        shown = pixel
+
+
+# .............................................................................
+led = neopixel.NeoPixel(board.NEOPIXEL, 4, auto_write=False)
+color, envelope = Words["off"]
+effectStart = nowMs()
+maxBrightness = 100
+pending = ""
+shown = None
+
+nextFrame = nowMs()
+
+while True:
+    now = nowMs()
 
-        time.sleep(.25)
+    readSerial()
+    render(now)
 
-        for value in range(255, 0, -1):
-            led.fill((value, value, 0))
+    nextFrame = ticksAdd(nextFrame, FrameMs)
+    delay = ticksDiff(nextFrame, nowMs())
 
-        time.sleep(.25)
+    if delay > 0:
+        time.sleep(delay / 1000)
     else:
-        if ledsOn:
-            led.fill((0, 0, 0))
-            ledsOn = False
+        # Running behind. Don't try to catch up.
+        nextFrame = nowMs()
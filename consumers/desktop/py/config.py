@@ -0,0 +1,67 @@
+"""
+    Settings shared by the desktop app (app.py), the schedule relay
+    (relay.py) and the reminder server (server.py): where the Data API is,
+    what to fetch, and how often. Settings only one of them uses (speech,
+    the USB notifier, the schedule database, ...) stay in that module.
+
+    Importing this puts consumers/shared (the modules shared with the
+    MicroPython consumer) on sys.path, so import it before any of those.
+"""
+
+import os
+import sys
+
+SharedDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'shared')
+
+if SharedDir not in sys.path:
+    sys.path.append(SharedDir)
+
+from eventquery import event_query          # noqa: E402
+
+
+MongoUrl = 'https://data.mongodb-api.com/app/data-pvtrm/endpoint/data/beta/action/'
+MongoApiKey = '<my API key>'
+RefreshIntervalSeconds = 60
+
+# A failed refresh is retried after RefreshIntervalSeconds, then twice as
+# long after every failure in a row, up to FetchRetryMaxSeconds. After
+# FetchFailuresToOpen failures in a row, nothing is fetched for
+# FetchOpenSeconds at a time (see consumers/shared/backoff.py). The current
+# schedule stays in use throughout. Refreshes that would happen at the same
+# moment on every machine (the first one, the ones closing in on a meeting
+# or just before each half hour, and the first one after do-not-disturb) are
+# spread over FleetSpreadSeconds, so a whole office doesn't call the Data API
+# at once.
+FetchRetryMaxSeconds = 10 * 60
+FetchFailuresToOpen = 5
+FetchOpenSeconds = 15 * 60
+FleetSpreadSeconds = 30
+
+# An announcement that is this many seconds past its slot (e.g. because the
+# event was only just fetched) is skipped rather than played out of date.
+AnnouncementGraceSeconds = 15
+
+# An event is dropped from the schedule this many seconds after it starts.
+EventEndSeconds = 60
+
+# Events from several calendars (the publisher's "source") are merged into
+# one timeline. The schedule is fetched in pages of this many events from
+# each source (see schedulewindow.py), as far as ScheduleLookaheadSeconds
+# ahead. Pages after the first are fetched again every
+# ScheduleTailRefreshSeconds.
+EventsPerSource = 10
+ScheduleLookaheadSeconds = 24 * 3600
+ScheduleTailRefreshSeconds = 15 * 60
+SchedulePages = 10
+
+# Metrics (Prometheus text format) and a health check are served on this
+# address (see metrics.py).
+MetricsHost = '127.0.0.1'
+
+# The Data API cluster, and the sources (calendars) to fetch. With the list
+# of sources, each one is fetched with its own index range scan; with None,
+# every source is fetched (see consumers/shared/eventquery.py).
+MongoClusterName = 'ClusterOne'
+EventSources = None
+
+EventQuery = event_query(MongoClusterName, EventsPerSource, EventSources)
@@ -0,0 +1,148 @@
+import asyncio
+import json
+
+
+# -----------------------------------------------------------------------------
+class DataApiError(Exception):
+    """
+        Raised when a Data API call fails, times out, or returns a non-200
+        response.
+    """
+
+
+# -----------------------------------------------------------------------------
+class DataApiClient():
+    """
+        Long-lived client for the MongoDB Atlas Data API.
+
+        A single connection-pooled httpx.AsyncClient is kept open for the life
+        of the application, so the 60-second refresh reuses the same TCP/TLS
+        connection instead of paying for a new handshake on every poll.
+        Request bodies are serialized once up front, and responses are
+        accepted gzip-compressed.
+
+        Every call is bounded by per-phase timeouts plus an overall deadline,
+        so a slow or hung Data API can only ever delay the refresher task,
+        never the rest of the event loop.
+
+        httpx is only imported when the first request is made, so it doesn't
+        slow down startup.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, baseUrl, apiKey, http2=True, maxConnections=4, keepAliveSeconds=300, verify=True,
+                 connectTimeout=5.0, readTimeout=10.0, deadline=15.0):
+        self.baseUrl = baseUrl
+        self.apiKey = apiKey
+        self.http2 = http2
+        self.maxConnections = maxConnections
+        self.keepAliveSeconds = keepAliveSeconds
+        self.headers = {
+            'Content-Type': 'application/json',
+            'Accept-Encoding': 'gzip',
+            'Access-Control-Request-Headers': '*'
+        }
+
+        if apiKey:
+            self.headers['api-key'] = apiKey
+
+        self.connectTimeout = connectTimeout
+        self.readTimeout = readTimeout
+        self.deadline = deadline
+        self.verify = verify
+        self.client = None
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def _http2Available():
+        """
+            httpx only speaks HTTP/2 when the optional "h2" package is
+            installed (pip install httpx[http2]).
+        """
+        try:
+            import h2    # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def serialize(request):
+        """
+            Pre-serialize a Data API request body so it can be sent as-is on
+            every poll.
+        """
+        if isinstance(request, bytes):
+            return request
+
+        if isinstance(request, str):
+            return request.encode('utf-8')
+
+        return json.dumps(request, separators=(',', ':')).encode('utf-8')
+
+    # -------------------------------------------------------------------------
+    def _getClient(self):
+        if self.client is None or self.client.is_closed:
+            import httpx
+
+            self.client = httpx.AsyncClient(
+                base_url=self.baseUrl,
+                headers=self.headers,
+                http2=self.http2 and self._http2Available(),
+                limits=httpx.Limits(
+                    max_connections=self.maxConnections,
+                    max_keepalive_connections=self.maxConnections,
+                    keepalive_expiry=self.keepAliveSeconds
+                ),
+                timeout=httpx.Timeout(self.readTimeout, connect=self.connectTimeout),
+                verify=self.verify
+            )
+
+        return self.client
+
+    # -------------------------------------------------------------------------
+    async def post(self, action, body):
+        """
+            POST a pre-serialized body to a Data API action (e.g. "aggregate")
+            and return the httpx response.
+            Raises DataApiError if the call fails or doesn't complete within
+            the overall deadline. Cancelling the calling task abandons the
+            request and returns its connection to the pool.
+        """
+        return await self._send("POST", action, content=body)
+
+    # -------------------------------------------------------------------------
+    async def get(self, path, params=None, deadline=None):
+        """
+            GET a path relative to the base URL. Used to talk to a schedule
+            relay, whose long-polls need a longer deadline than Data API calls.
+            A 304 (schedule not modified) response is returned as-is.
+        """
+        return await self._send("GET", path, params=params, deadline=deadline)
+
+    # -------------------------------------------------------------------------
+    async def _send(self, method, path, deadline=None, **kwargs):
+        import httpx
+
+        client = self._getClient()
+        deadline = deadline or self.deadline
+        readTimeout = deadline if deadline > self.deadline else self.readTimeout
+        timeout = httpx.Timeout(readTimeout, connect=self.connectTimeout)
+
+        try:
+            resp = await asyncio.wait_for(client.request(method, path, timeout=timeout, **kwargs), deadline)
+        except asyncio.TimeoutError:
+            raise DataApiError(f"{path} did not complete within {deadline} seconds")
+        except httpx.HTTPError as e:
+            raise DataApiError(f"{path} failed: {e!r}") from e
+
+        if resp.status_code not in (200, 304):
+            raise DataApiError(f"{path} returned {resp.status_code}: {resp.text}")
+
+        return resp
+
+    # -------------------------------------------------------------------------
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
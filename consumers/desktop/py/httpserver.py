@@ -0,0 +1,56 @@
+"""
+    The little bit of HTTP/1.1 the local endpoints (relay.py, metrics.py)
+    need: GET requests, whose headers are ignored, and responses that close
+    the connection. Handlers that stream (the relay's /events) write their
+    own headers and keep going.
+"""
+
+import asyncio
+from urllib.parse import urlsplit, parse_qs
+
+
+Reasons = {
+    200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    503: "Service Unavailable"
+}
+
+
+# -----------------------------------------------------------------------------
+async def serveGet(reader, writer, route):
+    """
+        Serve one request on a connection, then close it. route(writer, path,
+        params) writes the response to a GET, and returns False if there's
+        nothing at that path (404). Anything but a GET gets a 405.
+    """
+    try:
+        requestLine = await reader.readline()
+
+        # Skip the headers. We don't need any of them.
+        while (await reader.readline()).strip():
+            pass
+
+        parts = requestLine.decode('latin-1').split()
+
+        if len(parts) < 2 or parts[0] != "GET":
+            await respond(writer, 405, b'')
+            return
+
+        url = urlsplit(parts[1])
+
+        if not await route(writer, url.path, parse_qs(url.query)):
+            await respond(writer, 404, b'')
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+# -----------------------------------------------------------------------------
+async def respond(writer, status, body, contentType="application/json"):
+    writer.write(
+        f"HTTP/1.1 {status} {Reasons[status]}\r\n"
+        f"Content-Type: {contentType}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: close\r\n\r\n".encode('latin-1') + body
+    )
+    await writer.drain()
@@ -0,0 +1,216 @@
+"""
+    Metrics and health endpoint.
+
+    Counters and histograms are plain numbers that are bumped in place, so
+    recording costs next to nothing. Anything that can be read off the app's
+    state (the next event, the schedule age, ...) is only looked at when the
+    metrics are scraped.
+
+    MetricsServer serves them on a tiny local HTTP endpoint:
+
+        GET /metrics
+            Everything, in the Prometheus text exposition format.
+
+        GET /health
+            200 {"status": "ok", ...} while the schedule is fresh, or
+            503 {"status": "stale", ...} if it hasn't been refreshed for a
+            while (see Metrics.healthy). Anything that doesn't belong in a
+            metric (e.g. the next meeting's title, which would be a new
+            series for every meeting) is added here.
+"""
+
+import asyncio
+import json
+import math
+from bisect import bisect_left
+
+from httpserver import respond, serveGet
+
+
+# -----------------------------------------------------------------------------
+class Histogram():
+    """
+        Counts observations into fixed buckets (upper bounds, in seconds).
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)     # The last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    # -------------------------------------------------------------------------
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    # -------------------------------------------------------------------------
+    def render(self, lines):
+        lines.append(f"# HELP {self.name} {self.help}")
+        lines.append(f"# TYPE {self.name} histogram")
+        cumulative = 0
+
+        for bound, count in zip(self.buckets + (math.inf,), self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{formatValue(bound)}"}} {cumulative}')
+
+        lines.append(f"{self.name}_sum {formatValue(self.sum)}")
+        lines.append(f"{self.name}_count {self.count}")
+
+
+# -----------------------------------------------------------------------------
+def formatValue(value):
+    if value == math.inf:
+        return "+Inf"
+
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+
+    return repr(value)
+
+
+# -----------------------------------------------------------------------------
+def formatLabels(labels):
+    if not labels:
+        return ""
+
+    escaped = (
+        (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels.items()
+    )
+
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+# -----------------------------------------------------------------------------
+class Metrics():
+
+    FetchBuckets = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+    LatenessBuckets = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+    # -------------------------------------------------------------------------
+    def __init__(self, prefix="meetingminder", staleSeconds=300):
+        """
+            The schedule counts as stale (unhealthy) if it hasn't been
+            refreshed for staleSeconds.
+        """
+        self.prefix = prefix
+        self.staleSeconds = staleSeconds
+
+        self.fetchDuration = Histogram(
+            f"{prefix}_fetch_duration_seconds", "Time taken by schedule fetches.", self.FetchBuckets
+        )
+        self.lateness = Histogram(
+            f"{prefix}_notification_lateness_seconds",
+            "How long after its scheduled instant each notification went out.", self.LatenessBuckets
+        )
+        self.fetchFailures = 0
+
+        # (name, type, help, function) read at scrape time.
+        self.collectors = []
+
+    # -------------------------------------------------------------------------
+    def observeFetch(self, seconds, failed=False):
+        self.fetchDuration.observe(seconds)
+
+        if failed:
+            self.fetchFailures += 1
+
+    # -------------------------------------------------------------------------
+    def gauge(self, name, help, function):
+        """
+            Register a gauge whose value is function(), called at scrape time.
+            The function can return a number, a (labels, number) tuple, or
+            None to leave the gauge out.
+        """
+        self.collectors.append((f"{self.prefix}_{name}", "gauge", help, function))
+
+    # -------------------------------------------------------------------------
+    def counter(self, name, help, function):
+        self.collectors.append((f"{self.prefix}_{name}_total", "counter", help, function))
+
+    # -------------------------------------------------------------------------
+    def render(self):
+        lines = []
+        self.fetchDuration.render(lines)
+
+        lines.append(f"# HELP {self.prefix}_fetch_failures_total Schedule fetches that failed or timed out.")
+        lines.append(f"# TYPE {self.prefix}_fetch_failures_total counter")
+        lines.append(f"{self.prefix}_fetch_failures_total {self.fetchFailures}")
+
+        self.lateness.render(lines)
+
+        for name, kind, help, function in self.collectors:
+            value = function()
+
+            if value is None:
+                continue
+
+            labels, value = value if isinstance(value, tuple) else (None, value)
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name}{formatLabels(labels)} {formatValue(value)}")
+
+        return "\n".join(lines) + "\n"
+
+    # -------------------------------------------------------------------------
+    def healthy(self, scheduleAge):
+        return scheduleAge is not None and scheduleAge < self.staleSeconds
+
+
+# -----------------------------------------------------------------------------
+class MetricsServer():
+
+    # -------------------------------------------------------------------------
+    def __init__(self, metrics, scheduleAge, details=None):
+        """
+            scheduleAge is a function returning how many seconds ago the
+            schedule was last refreshed (or None if it never was). details,
+            if given, returns a dict of more fields for /health.
+        """
+        self.metrics = metrics
+        self.scheduleAge = scheduleAge
+        self.details = details
+        self.server = None
+
+    # -------------------------------------------------------------------------
+    async def start(self, host, port):
+        self.server = await asyncio.start_server(self.handle, host, port)
+
+    # -------------------------------------------------------------------------
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    # -------------------------------------------------------------------------
+    async def handle(self, reader, writer):
+        await serveGet(reader, writer, self.route)
+
+    # -------------------------------------------------------------------------
+    async def route(self, writer, path, params):
+        if path == "/metrics":
+            body = self.metrics.render().encode('utf-8')
+            await respond(writer, 200, body, "text/plain; version=0.0.4; charset=utf-8")
+        elif path == "/health":
+            age = self.scheduleAge()
+            healthy = self.metrics.healthy(age)
+            health = {
+                "status": "ok" if healthy else "stale",
+                "scheduleAgeSeconds": None if age is None else round(age, 1),
+                "fetchFailures": self.metrics.fetchFailures,
+            }
+
+            if self.details:
+                health.update(self.details())
+
+            await respond(writer, 200 if healthy else 503, json.dumps(health).encode('utf-8'))
+        else:
+            return False
+
+        return True
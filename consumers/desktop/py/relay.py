@@ -0,0 +1,212 @@
+"""
+    MeetingMinder schedule relay.
+
+    Polls the MongoDB Atlas Data API once, and fans the schedule out to any
+    number of MeetingMinder consumers on the local network, so the number of
+    cloud requests stays the same no matter how many devices are running.
+    The schedule is the same rolling window the desktop app keeps (see
+    schedulewindow.py).
+
+    Consumers can either long-poll or subscribe to server-sent events:
+
+        GET /schedule?version=<n>&wait=<seconds>
+            Returns {"version": <n>, "documents": [...]} as soon as the
+            schedule version differs from <n>, or 304 Not Modified if it
+            hasn't changed within <seconds> (max 60).
+
+        GET /events
+            A text/event-stream that sends the current schedule, then every
+            change to it.
+
+    Until the relay has fetched the schedule for the first time (e.g. right
+    after it starts, or while the Data API is down), there's no schedule to
+    serve: /schedule answers 503 Service Unavailable, and /events only sends
+    keep-alives. Consumers treat a 503 as a failed fetch and keep their own
+    schedule, rather than replacing it with an empty one.
+
+    The "documents" are the Data API aggregation's documents (the window's
+    pages, one after the other), so consumers parse relay responses the same
+    way as Data API responses.
+
+    Run with:
+        python relay.py --port 8765
+"""
+
+import argparse
+import asyncio
+import json
+
+from dataapi import DataApiClient, DataApiError
+from httpserver import respond, serveGet
+from schedulewindow import ScheduleWindow, pageQuery
+from config import (
+    MongoUrl, MongoApiKey, EventQuery, RefreshIntervalSeconds, EventsPerSource,
+    ScheduleLookaheadSeconds, ScheduleTailRefreshSeconds, SchedulePages,
+    FetchRetryMaxSeconds, FetchFailuresToOpen, FetchOpenSeconds, FleetSpreadSeconds
+)
+from backoff import Backoff, jitter
+
+
+MaxWaitSeconds = 60
+KeepAliveSeconds = 30
+
+
+# -----------------------------------------------------------------------------
+class ScheduleRelay():
+
+    # -------------------------------------------------------------------------
+    def __init__(self, dataApi, query, refreshSeconds=RefreshIntervalSeconds):
+        self.dataApi = dataApi
+        self.query = DataApiClient.serialize(query)
+        self.refreshSeconds = refreshSeconds
+        self.backoff = Backoff(refreshSeconds, FetchRetryMaxSeconds, FetchFailuresToOpen, FetchOpenSeconds)
+        self.window = ScheduleWindow(
+            self.fetchPage, EventsPerSource, lookaheadSeconds=ScheduleLookaheadSeconds,
+            tailRefreshSeconds=ScheduleTailRefreshSeconds, maxPages=SchedulePages
+        )
+
+        # No schedule (None) until the first successful fetch.
+        self.version = 0
+        self.body = None
+        self.changed = asyncio.Event()
+        self.subscribers = 0
+
+    # -------------------------------------------------------------------------
+    def _encode(self, documents):
+        return json.dumps(
+            {"version": self.version, "documents": documents}, separators=(',', ':')
+        ).encode('utf-8')
+
+    # -------------------------------------------------------------------------
+    async def pollTask(self):
+        """
+            The one and only Data API poller. Subscribers are only woken up
+            when the schedule actually changes. Failed fetches are retried
+            with backoff (see consumers/shared/backoff.py), and the last
+            schedule is served in the meantime.
+        """
+        await asyncio.sleep(jitter(FleetSpreadSeconds))
+
+        while True:
+            try:
+                if await self.window.refresh():
+                    self.update(self.window.documents)
+            except (DataApiError, ValueError) as e:
+                retry = self.backoff.failed()
+                print("Failed to refresh events. Serving the last schedule.", e)
+                print(f"Retrying in {round(retry)} seconds" + (" (circuit open)" if self.backoff.is_open else ""))
+                await asyncio.sleep(retry)
+                continue
+
+            self.backoff.succeeded()
+            await asyncio.sleep(self.refreshSeconds)
+
+    # -------------------------------------------------------------------------
+    async def fetchPage(self, after):
+        resp = await self.dataApi.post("aggregate", pageQuery(self.query, after))
+        return resp.content
+
+    # -------------------------------------------------------------------------
+    def update(self, documents):
+        """
+            Publish a new version of the schedule. Only called when it has
+            changed.
+        """
+        self.version += 1
+        self.body = self._encode(documents)
+        print(f"Schedule version {self.version} ({self.subscribers} streaming subscribers)")
+
+        # Wake everyone who is waiting on the current version, and arm a
+        # fresh event for the next change.
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    # -------------------------------------------------------------------------
+    async def handle(self, reader, writer):
+        await serveGet(reader, writer, self.route)
+
+    # -------------------------------------------------------------------------
+    async def route(self, writer, path, params):
+        if path == "/schedule":
+            await self._longPoll(writer, params)
+        elif path == "/events":
+            await self._stream(writer)
+        else:
+            return False
+
+        return True
+
+    # -------------------------------------------------------------------------
+    async def _longPoll(self, writer, params):
+        try:
+            version = int(params.get("version", ["-1"])[0])
+            wait = min(float(params.get("wait", ["0"])[0]), MaxWaitSeconds)
+        except ValueError:
+            await respond(writer, 400, b'')
+            return
+
+        if (version == self.version or self.body is None) and wait > 0:
+            try:
+                await asyncio.wait_for(self.changed.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+        if self.body is None:
+            await respond(writer, 503, b'')
+        elif version == self.version:
+            await respond(writer, 304, b'')
+        else:
+            await respond(writer, 200, self.body)
+
+    # -------------------------------------------------------------------------
+    async def _stream(self, writer):
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Connection: keep-alive\r\n\r\n"
+        )
+        self.subscribers += 1
+
+        try:
+            version = None
+
+            while True:
+                if version != self.version and self.body is not None:
+                    version = self.version
+                    writer.write(b"event: schedule\r\ndata: " + self.body + b"\r\n\r\n")
+                else:
+                    writer.write(b": keep-alive\r\n\r\n")
+
+                await writer.drain()
+
+                if version != self.version and self.body is not None:
+                    # Changed while we were sending.
+                    continue
+
+                try:
+                    await asyncio.wait_for(self.changed.wait(), KeepAliveSeconds)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.subscribers -= 1
+
+
+# -----------------------------------------------------------------------------
+async def main(host, port):
+    relay = ScheduleRelay(DataApiClient(MongoUrl, MongoApiKey), json.loads(EventQuery))
+    server = await asyncio.start_server(relay.handle, host, port)
+    print(f"Schedule relay listening on http://{host}:{port}/")
+
+    async with server:
+        await asyncio.gather(server.serve_forever(), relay.pollTask())
+
+
+# -----------------------------------------------------------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.host, args.port))
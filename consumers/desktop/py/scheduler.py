@@ -0,0 +1,146 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+
+# -----------------------------------------------------------------------------
+class DeadlineScheduler():
+    """
+        Runs callbacks at exact wall-clock instants.
+
+        All pending deadlines live in one heap, serviced by a single task that
+        sleeps until the earliest deadline (or until an earlier one is added),
+        so the loop only wakes up when something is actually due.
+        Entries can be tagged with a key and cancelled as a group.
+
+        Lateness (actual vs. scheduled instant) of every fired deadline is
+        recorded, so notification jitter can be measured. Pass onLateness to
+        also be handed each one (e.g. for a histogram), except for entries
+        scheduled with measure=False (housekeeping rather than
+        notifications).
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, clock=time.time, onLateness=None):
+        self.clock = clock
+        self.onLateness = onLateness
+        self.heap = []
+        self.entriesByKey = {}
+        self.sequence = itertools.count()
+        self.changed = asyncio.Event()
+
+        self.wakeups = 0
+        self.fired = 0
+        self.totalLateness = 0.0
+        self.maxLateness = 0.0
+        self.lastLateness = 0.0
+
+    # -------------------------------------------------------------------------
+    def schedule(self, when, callback, *args, key=None, measure=True):
+        """
+            Call callback(*args) at the wall-clock time "when" (epoch seconds).
+        """
+        entry = [when, next(self.sequence), key, callback, args, True, measure]
+        heapq.heappush(self.heap, entry)
+
+        if key is not None:
+            self.entriesByKey.setdefault(key, []).append(entry)
+
+        if self.heap[0] is entry:
+            # New earliest deadline. Wake the runner so it can sleep less.
+            self.changed.set()
+
+        return entry
+
+    # -------------------------------------------------------------------------
+    def cancel(self, key):
+        """
+            Cancel every pending entry scheduled with the given key.
+            Cancelled entries are dropped lazily when they reach the top of the
+            heap.
+        """
+        for entry in self.entriesByKey.pop(key, ()):
+            entry[5] = False
+
+    # -------------------------------------------------------------------------
+    def nextDeadline(self):
+        self._dropCancelled()
+        return self.heap[0][0] if self.heap else None
+
+    # -------------------------------------------------------------------------
+    def _dropCancelled(self):
+        while self.heap and not self.heap[0][5]:
+            heapq.heappop(self.heap)
+
+    # -------------------------------------------------------------------------
+    def _pop(self):
+        entry = heapq.heappop(self.heap)
+        key = entry[2]
+
+        if key is not None and entry[5]:
+            entries = self.entriesByKey.get(key)
+
+            if entries:
+                entries.remove(entry)
+
+                if not entries:
+                    del self.entriesByKey[key]
+
+        return entry
+
+    # -------------------------------------------------------------------------
+    def stats(self):
+        return {
+            "pending": sum(1 for e in self.heap if e[5]),
+            "wakeups": self.wakeups,
+            "fired": self.fired,
+            "meanLateness": self.totalLateness / self.fired if self.fired else 0.0,
+            "maxLateness": self.maxLateness,
+            "lastLateness": self.lastLateness,
+        }
+
+    # -------------------------------------------------------------------------
+    async def run(self):
+        while True:
+            self.changed.clear()
+            deadline = self.nextDeadline()
+
+            if deadline is None:
+                await self.changed.wait()
+                self.wakeups += 1
+                continue
+
+            delay = deadline - self.clock()
+
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.changed.wait(), delay)
+                    self.wakeups += 1
+
+                    # Something was scheduled ahead of our deadline.
+                    continue
+                except asyncio.TimeoutError:
+                    self.wakeups += 1
+
+            now = self.clock()
+
+            while self.heap and self.heap[0][0] <= now:
+                when, _, _, callback, args, active, measure = self._pop()
+
+                if not active:
+                    continue
+
+                lateness = self.clock() - when
+                self.fired += 1
+                self.totalLateness += lateness
+                self.maxLateness = max(self.maxLateness, lateness)
+                self.lastLateness = lateness
+
+                if measure and self.onLateness is not None:
+                    self.onLateness(lateness)
+
+                try:
+                    callback(*args)
+                except Exception as e:
+                    print("Scheduled callback failed:", e)
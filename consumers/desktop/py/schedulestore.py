@@ -0,0 +1,87 @@
+import sqlite3
+import time
+
+
+# -----------------------------------------------------------------------------
+class ScheduleStore():
+    """
+        On-disk copy of the last successfully fetched schedule.
+
+        The schedule is loaded synchronously at startup, so notifications are
+        live straight away (and keep working when the Data API can't be
+        reached). It is only rewritten when the fetched schedule actually
+        changes, which is detected by the digest of the Data API response.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS events (
+                title TEXT NOT NULL,
+                start REAL NOT NULL,
+                eventId TEXT
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                digest BLOB,
+                savedAt REAL
+            );
+        ''')
+
+        # Caches written before events had an eventId.
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(events)")]
+
+        if "eventId" not in columns:
+            self.db.execute("ALTER TABLE events ADD COLUMN eventId TEXT")
+
+        self.digest, self.savedAt = self._loadMeta()
+
+    # -------------------------------------------------------------------------
+    def _loadMeta(self):
+        row = self.db.execute("SELECT digest, savedAt FROM meta WHERE id = 1").fetchone()
+        return row if row else (None, None)
+
+    # -------------------------------------------------------------------------
+    def load(self, since=None):
+        """
+            Return the stored (title, start, eventId) rows, ordered by start
+            time. eventId may be None.
+            Pass "since" (epoch seconds) to skip events that started before it.
+        """
+        if since is None:
+            since = 0
+
+        return self.db.execute(
+            "SELECT title, start, eventId FROM events WHERE start > ? ORDER BY start", (since,)
+        ).fetchall()
+
+    # -------------------------------------------------------------------------
+    def save(self, events, digest):
+        """
+            Replace the stored schedule with the given (title, start, eventId)
+            rows.
+            Does nothing if the digest matches what's already stored.
+            Returns True if anything was written.
+        """
+        if digest is not None and digest == self.digest:
+            return False
+
+        savedAt = time.time()
+
+        with self.db:
+            self.db.execute("DELETE FROM events")
+            self.db.executemany("INSERT INTO events (title, start, eventId) VALUES (?, ?, ?)", events)
+            self.db.execute(
+                "INSERT OR REPLACE INTO meta (id, digest, savedAt) VALUES (1, ?, ?)", (digest, savedAt)
+            )
+
+        self.digest = digest
+        self.savedAt = savedAt
+
+        return True
+
+    # -------------------------------------------------------------------------
+    def close(self):
+        self.db.close()
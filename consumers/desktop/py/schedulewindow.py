@@ -0,0 +1,181 @@
+"""
+    Rolling window over the upcoming schedule.
+
+    The schedule is fetched in pages keyed on startTimestamp: a page is the
+    next few events of every source after a given time (see
+    consumers/shared/eventquery.py). The first page, from now on, is fetched
+    on every refresh, so changes to the next meetings show up straight away.
+    Further pages are only fetched while the window reaches less than
+    lookaheadSeconds ahead, i.e. as it drains, and are kept for
+    tailRefreshSeconds before they're fetched again. A day with dozens of
+    meetings, or a lookahead of several days, doesn't mean fetching
+    everything every minute.
+"""
+
+import hashlib
+import json
+import time
+from datetime import datetime
+
+# Stands in for the page's start time in the serialized query. The same as
+# eventquery.AFTER_PLACEHOLDER.
+AfterPlaceholder = '__AFTER__'
+
+
+# -----------------------------------------------------------------------------
+def eventStart(document):
+    """
+        Start time of an event document, in epoch seconds. The aggregation
+        projects it as "startTicks" (plain, or as extended JSON
+        {"$numberLong": ...}); only older documents need startTime parsed.
+    """
+    ticks = document.get("startTicks")
+
+    if isinstance(ticks, dict):
+        ticks = ticks.get("$numberLong")
+
+    if ticks is not None:
+        return int(float(ticks))
+
+    return int(datetime.fromisoformat(document["startTime"].replace("Z", "+00:00")).timestamp())
+
+
+# -----------------------------------------------------------------------------
+def pageQuery(serializedQuery, after):
+    """
+        The serialized query, for the page of events that start after
+        "after" (epoch seconds).
+    """
+    return serializedQuery.replace(b'"' + AfterPlaceholder.encode() + b'"', b'%d' % after)
+
+
+# -----------------------------------------------------------------------------
+class ScheduleWindow():
+
+    # -------------------------------------------------------------------------
+    def __init__(self, fetchPage, pageSize, lookaheadSeconds=24 * 3600, tailRefreshSeconds=15 * 60,
+                 maxPages=10, clock=time.time):
+        """
+            fetchPage(after) is a coroutine that returns the raw response
+            (bytes) for the page of events after "after": up to pageSize
+            events of each source, sorted by source and then start time.
+            At most maxPages pages are kept (and fetched per refresh).
+        """
+        self.fetchPage = fetchPage
+        self.pageSize = pageSize
+        self.lookaheadSeconds = lookaheadSeconds
+        self.tailRefreshSeconds = tailRefreshSeconds
+        self.maxPages = maxPages
+        self.clock = clock
+
+        self.documents = []
+        self.end = None                 # Complete up to here. None: everything
+        self.digest = None
+        self.pages = {}                 # digest -> (documents, next page's "after")
+        self.tail = []                  # Pages after the first: (digest, documents, next)
+        self.tailFrom = None
+        self.tailFetchedAt = None
+        self.requests = 0
+
+    # -------------------------------------------------------------------------
+    async def refresh(self):
+        """
+            Fetch the first page, and as many more as needed to cover the
+            lookahead. Returns True if the window changed.
+            Raises whatever fetchPage raises; the window is left as it was.
+        """
+        now = int(self.clock())
+        pages = {}
+        headDigest, head, end = await self._page(now, pages)
+        tail = []
+        cursor = end
+
+        if end is not None and self.tail and self.tailFrom <= end and \
+                now - self.tailFetchedAt < self.tailRefreshSeconds:
+            # The pages we already have still pick up where this one ends.
+            cursor = self.tail[-1][2]
+
+            if cursor is None or cursor > end:
+                tail = self.tail
+            else:
+                cursor = end
+
+        tailFrom, tailFetchedAt = (self.tailFrom, self.tailFetchedAt) if tail else (end, now)
+
+        for page in tail:
+            pages[page[0]] = page[1:]
+
+        while cursor is not None and cursor < now + self.lookaheadSeconds and len(tail) + 1 < self.maxPages:
+            digest, documents, nextCursor = await self._page(cursor, pages)
+            tail = tail + [(digest, documents, nextCursor)]
+            cursor = nextCursor
+
+        documents = list(head)
+
+        for _, page, _ in tail:
+            documents.extend(d for d in page if eventStart(d) > end)
+
+        digest = hashlib.blake2b(
+            headDigest + b"".join(page[0] for page in tail), digest_size=16
+        ).digest()
+
+        self.pages = pages
+        self.tail = tail
+        self.tailFrom, self.tailFetchedAt = tailFrom, tailFetchedAt
+        self.end = cursor
+        self.documents = documents
+
+        if digest == self.digest:
+            return False
+
+        self.digest = digest
+        return True
+
+    # -------------------------------------------------------------------------
+    async def _page(self, after, pages):
+        """
+            Fetch a page, and return (digest, documents, next page's
+            "after"). A page identical to one we already have isn't parsed
+            again.
+        """
+        content = await self.fetchPage(after)
+        self.requests += 1
+        digest = hashlib.blake2b(content, digest_size=16).digest()
+        page = self.pages.get(digest) or pages.get(digest)
+
+        if page is None:
+            page = self._trim(json.loads(content).get("documents") or [], after)
+
+        pages[digest] = page
+        return (digest,) + page
+
+    # -------------------------------------------------------------------------
+    def _trim(self, documents, after):
+        """
+            A source that filled its page may have more events after its last
+            one, so the page is only complete up to the earliest such "last
+            event". Events from that point on are left for the next page.
+            Returns (documents, next page's "after"), or (documents, None) if
+            no source filled its page, i.e. there is nothing after this page.
+        """
+        counts = {}
+        last = {}
+
+        for d in documents:
+            source = d.get("source")
+            counts[source] = counts.get(source, 0) + 1
+            last[source] = max(last.get(source, after), eventStart(d))
+
+        full = [last[source] for source, count in counts.items() if count >= self.pageSize]
+
+        if not full:
+            return documents, None
+
+        horizon = min(full)
+
+        if horizon - 1 <= after:
+            # A whole page of events all starting at the same instant. Take
+            # them, and carry on after it.
+            return documents, horizon
+
+        return [d for d in documents if eventStart(d) < horizon], horizon - 1
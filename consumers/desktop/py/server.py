@@ -0,0 +1,373 @@
+"""
+    Multi-tenant reminder server.
+
+    Runs the reminders for many users (tenants) from one process, where
+    app.py runs them for the one person at the keyboard. Each tenant has a
+    list of sources (the publisher's calendars). Tenants that share a
+    calendar (e.g. a team calendar) share its events.
+
+    - Every reminder of every tenant is one DeadlineScheduler heap, serviced
+      by a single task. An event only ever has one entry in it: its next cue.
+      When that fires, it notifies the event's tenants and schedules the
+      event's next cue. There is no task or coroutine per event or per
+      tenant, and memory is O(events + tenants).
+    - Every fetch goes through one pooled DataApiClient. Sources are
+      refreshed in batches of BatchSources per "aggregate" request (see
+      eventquery.batch_query), and the batches are spread out over the
+      refresh interval, with at most MaxConcurrentFetches in flight.
+    - A source's events are only diffed against the schedule if they
+      changed since its last refresh.
+
+    Notifications are written to stdout as JSON lines, one per tenant and
+    cue, e.g.
+
+        {"tenant": "alice", "source": "Team Calendar", "eventId": "...",
+         "title": "Standup", "start": 1700000000, "secondsBefore": 300}
+
+    for a delivery process (push, chat, e-mail, ...) to pick up.
+
+    Tenants are read from a JSON file:
+
+        {"tenants": [{"id": "alice", "sources": ["Alice", "Team Calendar"]}]}
+
+    Run with:
+        python server.py tenants.json
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from dataapi import DataApiClient, DataApiError
+from metrics import Metrics, MetricsServer
+from scheduler import DeadlineScheduler
+from schedulewindow import eventStart, pageQuery
+from config import (
+    MongoUrl, MongoApiKey, MongoClusterName, RefreshIntervalSeconds, AnnouncementGraceSeconds,
+    EventEndSeconds, MetricsHost
+)
+from eventquery import UNTIL_PLACEHOLDER, batch_query
+
+
+# Sources per "aggregate" request, and how many of those can be in flight at
+# once (also the size of the connection pool).
+BatchSources = 100
+MaxConcurrentFetches = 4
+
+# Each refresh fetches up to this many events per source, starting in the
+# next ServerLookaheadSeconds.
+ServerEventsPerSource = 50
+ServerLookaheadSeconds = 3600
+
+# Tenants are notified this many seconds before each event (the same
+# instants as the desktop app's announcements).
+CueSeconds = (300, 180, 60, 10)
+
+ServerMetricsPort = 9465
+
+
+# -----------------------------------------------------------------------------
+class ReminderServer():
+
+    # -------------------------------------------------------------------------
+    def __init__(self, tenants, dataApi, notify=None, clock=time.time, refreshSeconds=RefreshIntervalSeconds,
+                 batchSources=BatchSources, maxConcurrentFetches=MaxConcurrentFetches):
+        """
+            tenants is a list of {"id": ..., "sources": [...]}. notify(tenant,
+            event, secondsBefore) is called for each tenant and cue (the
+            default writes a JSON line to stdout).
+        """
+        self.dataApi = dataApi
+        self.notify = notify or self.printNotification
+        self.clock = clock
+        self.refreshSeconds = refreshSeconds
+        self.metrics = Metrics(prefix="meetingminder_server", staleSeconds=5 * refreshSeconds)
+        self.scheduler = DeadlineScheduler(clock=clock, onLateness=self.metrics.lateness.observe)
+        self.fetchSlots = asyncio.Semaphore(maxConcurrentFetches)
+        self.tasks = set()
+        self.notifications = 0
+
+        self.tenants = {}
+        self.sources = {}
+
+        for tenant in tenants:
+            self.tenants[tenant["id"]] = tenant
+
+            for name in tenant["sources"]:
+                source = self.sources.setdefault(name, {"name": name, "tenants": [], "events": {}, "signature": None})
+                source["tenants"].append(tenant["id"])
+
+        # The sources of each batch, and its query, serialized once.
+        names = sorted(self.sources)
+        self.batches = [names[i:i + batchSources] for i in range(0, len(names), batchSources)]
+        self.queries = [
+            DataApiClient.serialize(batch_query(MongoClusterName, batch, ServerEventsPerSource))
+            for batch in self.batches
+        ]
+        self.refreshedAt = [None] * len(self.batches)
+
+        self.registerMetrics()
+
+    # -------------------------------------------------------------------------
+    def registerMetrics(self):
+        self.metrics.gauge("tenants", "Tenants served.", lambda: len(self.tenants))
+        self.metrics.gauge("sources", "Sources (calendars) refreshed.", lambda: len(self.sources))
+        self.metrics.gauge(
+            "events", "Events scheduled.", lambda: sum(len(s["events"]) for s in self.sources.values())
+        )
+        self.metrics.gauge("scheduler_heap_entries", "Entries in the timer heap.", lambda: len(self.scheduler.heap))
+        self.metrics.counter(
+            "scheduler_wakeups", "Times the deadline scheduler woke up.", lambda: self.scheduler.wakeups
+        )
+        self.metrics.counter("notifications", "Notifications sent.", lambda: self.notifications)
+        self.metrics.gauge(
+            "schedule_age_seconds", "Seconds since the least recently refreshed batch was refreshed.",
+            self.scheduleAge
+        )
+
+    # -------------------------------------------------------------------------
+    def scheduleAge(self):
+        if not self.refreshedAt or None in self.refreshedAt:
+            return None
+
+        return self.clock() - min(self.refreshedAt)
+
+    # -------------------------------------------------------------------------
+    async def run(self):
+        self.startTask(self.scheduler.run())
+        self.startTask(self.refresherTask())
+
+    # -------------------------------------------------------------------------
+    def startTask(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+        return task
+
+    # -------------------------------------------------------------------------
+    async def stop(self):
+        for task in list(self.tasks):
+            task.cancel()
+
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        await self.dataApi.close()
+
+    # -------------------------------------------------------------------------
+    async def refresherTask(self):
+        """
+            Refresh every batch once per interval, spread evenly over it, so
+            the Data API sees a steady trickle of requests rather than a
+            burst every minute.
+        """
+        while True:
+            cycle = self.clock()
+
+            for i in range(len(self.batches)):
+                await self.sleepUntil(cycle + i * self.refreshSeconds / len(self.batches))
+                await self.fetchSlots.acquire()
+                self.startTask(self.refreshBatch(i))
+
+            await self.sleepUntil(cycle + self.refreshSeconds)
+
+    # -------------------------------------------------------------------------
+    async def sleepUntil(self, when):
+        delay = when - self.clock()
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    # -------------------------------------------------------------------------
+    async def refreshBatch(self, i):
+        """
+            Fetch one batch of sources and apply the sources that changed.
+            A failed fetch leaves the batch's schedule as it was.
+        """
+        started = time.perf_counter()
+
+        try:
+            now = int(self.clock())
+            body = pageQuery(self.queries[i], now).replace(
+                b'"' + UNTIL_PLACEHOLDER.encode() + b'"', b'%d' % (now + ServerLookaheadSeconds)
+            )
+            resp = await self.dataApi.post("aggregate", body)
+            documents = json.loads(resp.content).get("documents") or []
+        except (DataApiError, ValueError) as e:
+            self.metrics.observeFetch(time.perf_counter() - started, failed=True)
+            print(f"Failed to refresh batch {i}. Keeping its current schedule.", e, file=sys.stderr)
+            return
+        finally:
+            self.fetchSlots.release()
+
+        self.metrics.observeFetch(time.perf_counter() - started)
+        self.refreshedAt[i] = self.clock()
+        bySource = {name: [] for name in self.batches[i]}
+
+        for document in documents:
+            events = bySource.get(document.get("source"))
+
+            if events is not None:
+                events.append(document)
+
+        for name, documents in bySource.items():
+            self.updateSource(self.sources[name], documents)
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def eventKey(document, start):
+        return document.get("eventId") or (document["title"], start)
+
+    # -------------------------------------------------------------------------
+    def updateSource(self, source, documents):
+        """
+            Diff a source's freshly fetched events against its schedule: new
+            events are scheduled, moved or renamed ones rescheduled, and ones
+            that disappeared cancelled. Events that have already started
+            aren't fetched any more, so they're kept until they end.
+        """
+        fresh = {}
+
+        for document in documents:
+            start = eventStart(document)
+            fresh[self.eventKey(document, start)] = (document["title"], start, document.get("eventId"))
+
+        signature = hash(tuple(fresh.items()))
+
+        if signature == source["signature"]:
+            return
+
+        source["signature"] = signature
+        now = self.clock()
+        events = source["events"]
+
+        for key, event in list(events.items()):
+            if event["start"] <= now:
+                fresh.pop(key, None)
+                continue
+
+            update = fresh.pop(key, None)
+
+            if update is None:
+                self.scheduler.cancel((source["name"], key))
+                del events[key]
+            elif update[:2] != (event["title"], event["start"]):
+                self.scheduler.cancel((source["name"], key))
+                event["title"], event["start"] = update[:2]
+                self.scheduleEvent(event, now)
+
+        for key, (title, start, eventId) in fresh.items():
+            if start > now:
+                event = {"source": source["name"], "key": key, "eventId": eventId, "title": title, "start": start}
+                events[key] = event
+                self.scheduleEvent(event, now)
+
+    # -------------------------------------------------------------------------
+    def scheduleEvent(self, event, now):
+        """
+            Schedule the event's first cue that isn't past its grace period
+            (or its end, if they all are).
+        """
+        cue = 0
+
+        while cue < len(CueSeconds) and event["start"] - CueSeconds[cue] < now - AnnouncementGraceSeconds:
+            cue += 1
+
+        self.scheduleCue(event, cue)
+
+    # -------------------------------------------------------------------------
+    def scheduleCue(self, event, cue):
+        if cue < len(CueSeconds):
+            when = event["start"] - CueSeconds[cue]
+        else:
+            when = event["start"] + EventEndSeconds
+
+        event["cue"] = cue
+        self.scheduler.schedule(when, self.fireCue, event, key=(event["source"], event["key"]))
+
+    # -------------------------------------------------------------------------
+    def fireCue(self, event):
+        cue = event["cue"]
+
+        if cue == len(CueSeconds):
+            # The event is over.
+            self.sources[event["source"]]["events"].pop(event["key"], None)
+            return
+
+        self.notifyTenants(event, CueSeconds[cue])
+        self.scheduleCue(event, cue + 1)
+
+    # -------------------------------------------------------------------------
+    def notifyTenants(self, event, secondsBefore):
+        """
+            Notify every tenant of the event's source, except those who have
+            the same event (by eventId) in one of their earlier sources, so a
+            meeting that's on two of a tenant's calendars is only notified
+            once.
+        """
+        name = event["source"]
+
+        for tenantId in self.sources[name]["tenants"]:
+            tenant = self.tenants[tenantId]
+
+            if event["eventId"]:
+                earlier = tenant["sources"][:tenant["sources"].index(name)]
+
+                if any(event["key"] in self.sources[s]["events"] for s in earlier):
+                    continue
+
+            self.notifications += 1
+            self.notify(tenant, event, secondsBefore)
+
+    # -------------------------------------------------------------------------
+    @staticmethod
+    def printNotification(tenant, event, secondsBefore):
+        print(json.dumps({
+            "tenant": tenant["id"],
+            "source": event["source"],
+            "eventId": event["eventId"],
+            "title": event["title"],
+            "start": event["start"],
+            "secondsBefore": secondsBefore,
+        }), flush=True)
+
+
+# -----------------------------------------------------------------------------
+async def main(tenantsPath, metricsPort):
+    with open(tenantsPath, encoding="utf-8") as f:
+        tenants = json.load(f)["tenants"]
+
+    dataApi = DataApiClient(MongoUrl, MongoApiKey, maxConnections=MaxConcurrentFetches)
+    server = ReminderServer(tenants, dataApi)
+    metricsServer = MetricsServer(server.metrics, server.scheduleAge) if metricsPort else None
+    print(
+        f"Serving {len(server.tenants)} tenants, {len(server.sources)} sources in {len(server.batches)} batches",
+        file=sys.stderr
+    )
+
+    await server.run()
+
+    if metricsServer:
+        await metricsServer.start(MetricsHost, metricsPort)
+
+    try:
+        await asyncio.gather(*server.tasks)
+    finally:
+        await server.stop()
+
+        if metricsServer:
+            await metricsServer.stop()
+
+
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="MeetingMinder multi-tenant reminder server")
+    parser.add_argument("tenants", help="JSON file with the tenants and their sources")
+    parser.add_argument("--metrics-port", type=int, default=ServerMetricsPort, help="0 to turn metrics off")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(main(args.tenants, args.metrics_port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,201 @@
+import io
+import os
+import queue
+import threading
+import time
+import wave
+from collections import OrderedDict
+
+
+# -----------------------------------------------------------------------------
+class SapiBackend():
+    """
+        Renders phrases to WAV audio with the Windows SAPI voice, and plays
+        them back from memory.
+        All COM objects are created on the speech worker thread, since SAPI
+        objects belong to the thread (apartment) that created them.
+    """
+
+    # SpAudioFormat type for 22kHz, 16 bit, mono PCM
+    AudioFormat = 22
+    SampleRate = 22050
+
+    # -------------------------------------------------------------------------
+    def __init__(self, rate=0):
+        self.rate = rate
+        self.voice = None
+
+    # -------------------------------------------------------------------------
+    def _getVoice(self):
+        if self.voice is None:
+            import pythoncom
+            from win32com.client import Dispatch as ComDispatch
+
+            pythoncom.CoInitialize()
+            self.voice = ComDispatch("SAPI.SpVoice")
+            self.voice.Rate = self.rate
+
+        return self.voice
+
+    # -------------------------------------------------------------------------
+    def render(self, phrase):
+        from win32com.client import Dispatch as ComDispatch
+
+        voice = self._getVoice()
+        stream = ComDispatch("SAPI.SpMemoryStream")
+        stream.Format.Type = self.AudioFormat
+        voice.AudioOutputStream = stream
+        voice.Speak(phrase)
+        pcm = bytes(stream.GetData())
+
+        clip = io.BytesIO()
+
+        with wave.open(clip, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.SampleRate)
+            wav.writeframes(pcm)
+
+        return clip.getvalue()
+
+    # -------------------------------------------------------------------------
+    def play(self, clip):
+        import winsound
+        winsound.PlaySound(clip, winsound.SND_MEMORY)
+
+
+# -----------------------------------------------------------------------------
+class FileBackend():
+    """
+        Stand-in backend for testing on machines without SAPI (e.g. Linux).
+        "Rendering" writes the phrase to a clip file, and "playing" appends
+        the phrase, with the time it was played, to a log file.
+    """
+
+    # -------------------------------------------------------------------------
+    def __init__(self, directory, renderSeconds=0.0):
+        self.directory = directory
+        self.renderSeconds = renderSeconds
+        self.logPath = os.path.join(directory, 'played.log')
+        os.makedirs(directory, exist_ok=True)
+
+    # -------------------------------------------------------------------------
+    def render(self, phrase):
+        if self.renderSeconds:
+            # Simulate the time a real synthesizer takes.
+            time.sleep(self.renderSeconds)
+
+        clip = phrase.encode('utf-8')
+
+        with open(os.path.join(self.directory, f"{abs(hash(phrase)):x}.clip"), 'wb') as f:
+            f.write(clip)
+
+        return clip
+
+    # -------------------------------------------------------------------------
+    def play(self, clip):
+        with open(self.logPath, 'a', encoding='utf-8') as f:
+            f.write(f"{time.time():.3f}\t{clip.decode('utf-8')}\n")
+
+
+# -----------------------------------------------------------------------------
+class SpeechEngine():
+    """
+        Speaks phrases without blocking the asyncio event loop.
+
+        Phrases are rendered to audio ahead of time (as soon as the events
+        they belong to are known) and kept in an LRU cache keyed by phrase.
+        A single background worker thread does both the rendering and the
+        playback, with playback always taking priority over pre-rendering, so
+        a phrase that's due is played back from the cache as soon as it's
+        asked for.
+    """
+
+    PlayPriority = 0
+    RenderPriority = 1
+
+    # -------------------------------------------------------------------------
+    def __init__(self, backend, cacheSize=64):
+        self.backend = backend
+        self.cacheSize = cacheSize
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.jobs = queue.PriorityQueue()
+        self.sequence = 0
+        self.worker = threading.Thread(target=self._work, name="speech", daemon=True)
+        self.worker.start()
+
+    # -------------------------------------------------------------------------
+    def prepare(self, phrases):
+        """
+            Queue phrases to be rendered into the cache in the background.
+        """
+        for phrase in phrases:
+            if not self.isCached(phrase):
+                self._queue(self.RenderPriority, phrase)
+
+    # -------------------------------------------------------------------------
+    def say(self, phrase):
+        """
+            Queue a phrase for playback. Returns immediately.
+            The phrase can also be a function that returns it, to have it
+            worded on the speech thread, right before it's spoken.
+        """
+        self._queue(self.PlayPriority, phrase)
+
+    # -------------------------------------------------------------------------
+    def isCached(self, phrase):
+        with self.lock:
+            return phrase in self.cache
+
+    # -------------------------------------------------------------------------
+    def close(self):
+        self.jobs.put((-1, 0, None))
+        self.worker.join(timeout=5)
+
+    # -------------------------------------------------------------------------
+    def _queue(self, priority, phrase):
+        # The sequence number keeps jobs of the same priority in FIFO order.
+        with self.lock:
+            self.sequence += 1
+            sequence = self.sequence
+
+        self.jobs.put((priority, sequence, phrase))
+
+    # -------------------------------------------------------------------------
+    def _getClip(self, phrase):
+        with self.lock:
+            clip = self.cache.get(phrase)
+
+            if clip is not None:
+                self.cache.move_to_end(phrase)
+                return clip
+
+        clip = self.backend.render(phrase)
+
+        with self.lock:
+            self.cache[phrase] = clip
+
+            while len(self.cache) > self.cacheSize:
+                self.cache.popitem(last=False)
+
+        return clip
+
+    # -------------------------------------------------------------------------
+    def _work(self):
+        while True:
+            priority, _, phrase = self.jobs.get()
+
+            if phrase is None:
+                break
+
+            try:
+                if callable(phrase):
+                    phrase = phrase()
+
+                clip = self._getClip(phrase)
+
+                if priority == self.PlayPriority:
+                    self.backend.play(clip)
+            except Exception as e:
+                print("Speech error:", e)
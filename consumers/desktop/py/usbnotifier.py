@@ -0,0 +1,219 @@
+import threading
+
+
+# USB VID:PID of the supported CircuitPython notifier boards (the same list
+# the Go client keeps in meetingminder.config.json).
+SupportedDevices = {
+    "239A:8111": "Adafruit Qt Py S2",
+    "303A:4001": "Adafruit Qt Py S2",
+    "239A:80F0": "Adafruit Neo Trinkey",
+}
+
+# What each state looks like on the device: a color, and the (rise, hold,
+# fall, gap) brightness envelope in units of 10 ms. All zero means solid.
+Effects = {
+    "off": ((0, 0, 0), (0, 0, 0, 0)),
+    "red": ((255, 0, 0), (0, 0, 0, 0)),
+    "yellow": ((255, 255, 0), (0, 15, 0, 15)),
+    "green": ((0, 255, 0), (0, 50, 0, 50)),
+    "blue": ((0, 0, 255), (0, 0, 0, 0)),
+}
+
+
+# -----------------------------------------------------------------------------
+def encodeFrame(kind, values):
+    """
+        Encode a framed device command: "~", the command letter, each value
+        as 2 hex digits, and a checksum (the sum of the bytes between "~"
+        and the checksum, mod 256).
+    """
+    body = kind + "".join(f"{v:02X}" for v in values)
+    return f"~{body}{sum(body.encode('ascii')) & 0xff:02X}"
+
+
+# -----------------------------------------------------------------------------
+def encodeState(state):
+    color, envelope = Effects[state]
+    return encodeFrame("E", color + envelope)
+
+
+# -----------------------------------------------------------------------------
+class UsbNotifier():
+    """
+        Drives a CircuitPython notifier (see usb_notifiers/circuitpython) over
+        USB serial.
+
+        show() only records the state we want the device in. A background
+        writer thread sends it, and only the latest state is sent: repeated
+        or superseded states never reach the wire. Between transitions the
+        writer blocks without a timeout, so it costs no CPU and no serial
+        traffic. If the device goes away, the writer reconnects (finding the
+        device again by VID:PID unless a port was given) and re-sends the
+        current state.
+
+        A board that isn't connected is dark, so nothing is looked for until
+        there's something other than "off" to show. Reconnect attempts start
+        reconnectSeconds apart and back off to maxReconnectSeconds, so a
+        missing device costs next to nothing even while a meeting is coming
+        up.
+
+        States are sent as framed effect commands (see the device code.py).
+        Pass framed=False for boards running the Arduino sketch (or the old
+        CircuitPython code), which only understand the plain state words.
+
+        Any serial device works as a stand-in, e.g. one end of a pty:
+            UsbNotifier(port=os.ttyname(slave))
+    """
+
+    States = tuple(Effects)
+
+    # -------------------------------------------------------------------------
+    def __init__(self, port=None, devices=SupportedDevices, baudRate=9600, reconnectSeconds=2.0,
+                 maxReconnectSeconds=60.0, framed=True):
+        self.port = port
+        self.framed = framed
+        self.devices = devices
+        self.baudRate = baudRate
+        self.reconnectSeconds = reconnectSeconds
+        self.maxReconnectSeconds = maxReconnectSeconds
+
+        # What the device shows, as far as we know. One that isn't connected
+        # shows nothing.
+        self.wanted = "off"
+        self.sent = "off"
+        self.serial = None
+        self.closing = False
+        self.changed = threading.Condition()
+
+        # Instrumentation
+        self.writes = 0
+        self.connects = 0
+
+        self.thread = threading.Thread(target=self._writer, name="usb-notifier", daemon=True)
+        self.thread.start()
+
+    # -------------------------------------------------------------------------
+    def show(self, state):
+        """
+            Ask for the device to show a state ("off", "red", ...). Returns
+            straight away.
+        """
+        if state not in self.States:
+            raise ValueError(f"Unknown notifier state: {state}")
+
+        with self.changed:
+            if state != self.wanted:
+                self.wanted = state
+                self.changed.notify()
+
+    # -------------------------------------------------------------------------
+    def close(self):
+        with self.changed:
+            self.closing = True
+            self.changed.notify()
+
+        self.thread.join()
+
+    # -------------------------------------------------------------------------
+    def _writer(self):
+        try:
+            import serial
+        except ImportError:
+            print("pyserial isn't installed. The USB notifier is disabled.")
+            return
+
+        retrySeconds = self.reconnectSeconds
+
+        while True:
+            with self.changed:
+                while not self.closing and self.wanted == self.sent:
+                    self.changed.wait()
+
+                if self.closing:
+                    break
+
+                state = self.wanted
+
+            if self._send(state):
+                retrySeconds = self.reconnectSeconds
+            else:
+                # Not connected. Try again in a bit (or sooner, if closing).
+                with self.changed:
+                    if not self.closing:
+                        self.changed.wait(retrySeconds)
+
+                retrySeconds = min(retrySeconds * 2, self.maxReconnectSeconds)
+
+        self._disconnect()
+
+    # -------------------------------------------------------------------------
+    def _send(self, state):
+        import serial
+
+        try:
+            if self.serial is None:
+                self._connect()
+
+                if self.serial is None:
+                    return False
+
+            command = encodeState(state) if self.framed else state
+            self.serial.write(command.encode('ascii') + b'\r')
+            self.serial.flush()
+            self.sent = state
+            self.writes += 1
+
+            return True
+        except (serial.SerialException, OSError) as e:
+            if self.serial is not None:
+                print("USB notifier disconnected:", e)
+
+            self._disconnect()
+
+            return False
+
+    # -------------------------------------------------------------------------
+    def _connect(self):
+        import serial
+
+        port = self.port or self._discover()
+
+        if port is None:
+            return
+
+        self.serial = serial.Serial(port, self.baudRate, timeout=0, write_timeout=1)
+        self.connects += 1
+
+        # Whatever the device showed before (e.g. it was just plugged back
+        # in), it needs the current state again.
+        self.sent = None
+        print(f"USB notifier connected on {port}")
+
+    # -------------------------------------------------------------------------
+    def _discover(self):
+        """
+            Find the port of the first connected supported device.
+        """
+        from serial.tools import list_ports
+
+        for port in list_ports.comports():
+            if port.vid is None:
+                continue
+
+            if f"{port.vid:04X}:{port.pid:04X}" in self.devices:
+                return port.device
+
+        return None
+
+    # -------------------------------------------------------------------------
+    def _disconnect(self):
+        if self.serial is not None:
+            try:
+                self.serial.close()
+            except Exception:
+                pass
+
+        # Unplugged, it's dark (and it starts up dark when it's plugged back
+        # in).
+        self.serial = None
+        self.sent = "off"
@@ -0,0 +1,191 @@
+"""
+    Non-blocking LED animations.
+
+    Effects (flash, pulse, fade) run as asyncio tasks that compute the
+    brightness for each frame from the time since the effect started, at a
+    fixed frame rate. Nothing here ever sleeps in a blocking way, so
+    fetching and scheduling carry on while the LEDs animate, and starting a
+    new effect cancels the old one straight away (within one frame).
+
+    Output goes through a shadow framebuffer: the hardware is only written
+    when the output actually changes, so repeating the same color (or an
+    animation frame that rounds to the same values) costs nothing and
+    doesn't flicker. Brightness and gamma correction are applied with a
+    lookup table that is computed once, not per frame.
+"""
+
+from array import array
+import asyncio
+import time
+
+FrameRate = 30
+FULL = 255
+Gamma = 2.2
+
+
+# .............................................................................
+class AnimatedLeds():
+    """
+        Base class for the LedFlashers. Colors are (red, green, blue) tuples.
+        Subclasses set output_max (the hardware's full-scale value) and
+        implement write(red, green, blue) to push output values to the
+        hardware right away, without sleeping. They must be ready to write
+        before calling AnimatedLeds.__init__, which turns the LEDs off.
+    """
+
+    Red = (255, 0, 0)
+    Green = (0, 255, 0)
+    Blue = (0, 0, 255)
+    Yellow = (255, 255, 0)
+    Off = (0, 0, 0)
+
+    # .........................................................................
+    def __init__(self, output_max=255, brightness=1.0, gamma=Gamma, frame_rate=FrameRate):
+        self.frame_ms = 1000 // frame_rate
+        self.task = None
+        self.effect = None
+
+        self.output_max = output_max
+        self.gamma = gamma
+        self.lut = array('H', [0] * 256)            # Linear level -> output value
+        self.frame = array('l', [-1, -1, -1])       # What the hardware is showing now
+        self.color = self.Off
+        self.level = 0
+        self.writes = 0
+
+        self.set_brightness(brightness)
+
+    # .........................................................................
+    def write(self, red, green, blue):
+        raise NotImplementedError
+
+    # .........................................................................
+    def set_brightness(self, brightness):
+        """
+            Set the overall brightness (0.0 to 1.0). Takes effect right away.
+        """
+        self.brightness = min(max(brightness, 0.0), 1.0)
+        scale = self.brightness * self.output_max
+
+        for i in range(256):
+            self.lut[i] = int((i / 255) ** self.gamma * scale + 0.5)
+
+        # Force a write with the new table.
+        self.frame[0] = -1
+        self.show(self.color, self.level)
+
+    # .........................................................................
+    def show(self, color, level):
+        """
+            Show a color at a brightness level (0 to 255, 0 is off). The
+            hardware is only written if the output changes.
+        """
+        if color is None or level == 0:
+            color = self.Off
+
+        self.color = color
+        self.level = level
+        lut = self.lut
+        frame = self.frame
+
+        red = lut[color[0] * level // FULL]
+        green = lut[color[1] * level // FULL]
+        blue = lut[color[2] * level // FULL]
+
+        if red == frame[0] and green == frame[1] and blue == frame[2]:
+            return
+
+        frame[0] = red
+        frame[1] = green
+        frame[2] = blue
+        self.writes += 1
+        self.write(red, green, blue)
+
+    # .........................................................................
+    def on(self, color):
+        self._stop()
+        self.show(color, FULL)
+
+    # .........................................................................
+    def off(self):
+        self._stop()
+        self.show(None, 0)
+
+    # .........................................................................
+    def flash(self, color, on_ms, off_ms=None):
+        """
+            Blink: on for on_ms, then off for off_ms (same as on_ms by default).
+        """
+        if off_ms is None:
+            off_ms = on_ms
+
+        period = on_ms + off_ms
+
+        self._play(('flash', color, on_ms, off_ms), color,
+                   lambda t: FULL if t % period < on_ms else 0)
+
+    # .........................................................................
+    def pulse(self, color, period_ms):
+        """
+            Breathe: ramp up to full brightness and back down every period_ms.
+        """
+        half = period_ms // 2
+
+        def level_at(t):
+            t %= period_ms
+            return FULL * t // half if t < half else FULL * (period_ms - t) // half
+
+        self._play(('pulse', color, period_ms), color, level_at)
+
+    # .........................................................................
+    def fade(self, color, duration_ms, fade_in=True):
+        """
+            Fade in (or out) over duration_ms, then stay there.
+        """
+        if fade_in:
+            level_at = lambda t: FULL * t // duration_ms
+        else:
+            level_at = lambda t: FULL - FULL * t // duration_ms
+
+        self._play(('fade', color, duration_ms, fade_in), color, level_at, duration_ms)
+
+    # .........................................................................
+    def _play(self, effect, color, level_at, duration_ms=0):
+        if effect == self.effect:
+            # Already running (or a fade already finished). Restarting it
+            # would glitch the animation.
+            return
+
+        self._stop()
+        self.effect = effect
+        self.task = asyncio.create_task(self._animate(color, level_at, duration_ms))
+
+    # .........................................................................
+    def _stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+        self.effect = None
+
+    # .........................................................................
+    async def _animate(self, color, level_at, duration_ms):
+        start = time.ticks_ms()
+        last_level = -1
+
+        while True:
+            elapsed = time.ticks_diff(time.ticks_ms(), start)
+            finished = duration_ms and elapsed >= duration_ms
+
+            level = level_at(duration_ms if finished else elapsed)
+
+            if level != last_level:
+                self.show(color, level)
+                last_level = level
+
+            if finished:
+                self.task = None
+                return
+
+            # Sleep until the next frame boundary, so frames don't drift.
+            await asyncio.sleep_ms(self.frame_ms - elapsed % self.frame_ms)
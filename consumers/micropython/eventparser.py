@@ -0,0 +1,287 @@
+"""
+    Incremental parser for MongoDB Data API (and schedule relay) responses.
+
+    Instead of reading the whole response into a string and handing it to
+    json.loads (which needs the raw text plus the full document tree in RAM at
+    the same time), the response is fed through this parser a chunk at a time,
+    straight off the socket. It only picks out the "title", "startTicks" and
+    "eventId" (as a hash) of each event, and the relay's "version", so peak
+    memory for a fetch is
+    bounded by the chunk size and the title buffer, no matter how large the
+    response is.
+"""
+
+# What the parser expects next
+_KEY = 0
+_VALUE = 1
+
+# The keys we care about
+_OTHER = 0
+_TITLE = 1
+_TICKS = 2
+_VERSION = 3
+_NUMBER_LONG = 4
+_EVENT_ID = 5
+
+_KEYS = (
+    (_TITLE, b'title'),
+    (_EVENT_ID, b'eventId'),
+    (_TICKS, b'startTicks'),
+    (_VERSION, b'version'),
+    (_NUMBER_LONG, b'$numberLong'),
+)
+
+_ESCAPES = {
+    ord('n'): ord(' '),
+    ord('t'): ord(' '),
+    ord('r'): ord(' '),
+    ord('b'): ord(' '),
+    ord('f'): ord(' '),
+}
+
+
+# .............................................................................
+class EventParser():
+
+    # .........................................................................
+    def __init__(self, on_event, title_size=48, key_size=16):
+        """
+            on_event(title, title_length, ticks, event_id) is called for every
+            event found. "title" is the parser's own buffer and is reused for
+            the next event, so copy out whatever you need. Titles longer than
+            title_size bytes are truncated. event_id is a (non-zero, 31-bit)
+            hash of the event's "eventId", or 0 if it doesn't have one.
+        """
+        self.on_event = on_event
+        self.title = bytearray(title_size)
+        self.key = bytearray(key_size)
+        self.reset()
+
+    # .........................................................................
+    def reset(self):
+        self.depth = 0
+        self.arrays = 0             # Bit n is set if the container at depth n is an array
+        self.expect = _VALUE
+        self.in_string = False
+        self.escape = False
+        self.hex_digits = 0
+        self.in_number = False
+        self.target = _OTHER        # What the current string or number is for
+        self.key_id = _OTHER
+        self.key_length = 0
+        self.title_length = 0
+        self.number = 0
+        self.negative = False
+        self.ticks_depth = 0        # Depth of an {"$numberLong": ...} wrapper around startTicks
+        self.event_depth = 0
+        self.has_title = False
+        self.ticks = 0
+        self.has_ticks = False
+        self.event_id = 0
+        self.version = -1
+        self.checksum = 0
+        self.count = 0
+        self.done = False
+
+    # .........................................................................
+    def feed(self, data):
+        for c in data:
+            self.checksum = (self.checksum * 31 + c) & 0x3fffffff
+
+            if self.in_string:
+                self._string_char(c)
+                continue
+
+            if self.in_number:
+                if 0x30 <= c <= 0x39:
+                    self.number = self.number * 10 + c - 0x30
+                    continue
+
+                self._end_number()
+
+            if c == 0x22:                                       # "
+                self.in_string = True
+                self.key_length = 0
+
+                if self.expect == _KEY:
+                    self.target = _KEY
+                else:
+                    self.target = self._value_target()
+
+                    if self.target == _TITLE:
+                        self.title_length = 0
+                    elif self.target == _EVENT_ID:
+                        self.event_id = 0
+                    elif self.target == _TICKS:
+                        self.number = 0
+            elif c == 0x7b:                                     # {
+                if self.expect == _VALUE and self.key_id == _TICKS:
+                    self.ticks_depth = self.depth + 1
+
+                self.depth += 1
+                self.arrays &= ~(1 << self.depth)
+                self.expect = _KEY
+                self.key_id = _OTHER
+            elif c == 0x7d:                                     # }
+                if self.depth == self.event_depth:
+                    if self.has_title and self.has_ticks:
+                        self.count += 1
+                        self.on_event(self.title, self.title_length, self.ticks, self.event_id)
+
+                    self.event_depth = 0
+                    self.has_title = False
+                    self.has_ticks = False
+                    self.event_id = 0
+
+                if self.depth == self.ticks_depth:
+                    self.ticks_depth = 0
+
+                self.depth -= 1
+                self.key_id = _OTHER
+
+                if self.depth == 0:
+                    self.done = True
+            elif c == 0x5b:                                     # [
+                self.depth += 1
+                self.arrays |= 1 << self.depth
+                self.expect = _VALUE
+                self.key_id = _OTHER
+            elif c == 0x5d:                                     # ]
+                self.depth -= 1
+            elif c == 0x3a:                                     # :
+                self.expect = _VALUE
+            elif c == 0x2c:                                     # ,
+                self.expect = _VALUE if self.arrays & (1 << self.depth) else _KEY
+            elif c == 0x2d or 0x30 <= c <= 0x39:                # - or digit
+                self.in_number = True
+                self.negative = c == 0x2d
+                self.number = 0 if self.negative else c - 0x30
+                self.target = self._value_target()
+
+    # .........................................................................
+    def _value_target(self):
+        if self.key_id == _NUMBER_LONG and self.ticks_depth == self.depth:
+            return _TICKS
+
+        if self.key_id == _VERSION and self.depth == 1:
+            return _VERSION
+
+        if self.key_id in (_TITLE, _TICKS, _EVENT_ID):
+            # Ignore look-alike keys nested inside an event we're already
+            # collecting.
+            if self.event_depth and self.event_depth != self.depth:
+                return _OTHER
+
+            return self.key_id
+
+        return _OTHER
+
+    # .........................................................................
+    def _end_number(self):
+        self.in_number = False
+        value = -self.number if self.negative else self.number
+
+        if self.target == _TICKS:
+            self._set_ticks(value)
+        elif self.target == _VERSION:
+            self.version = value
+
+    # .........................................................................
+    def _set_ticks(self, value):
+        self.ticks = value
+        self.has_ticks = True
+        self.event_depth = self.depth - 1 if self.ticks_depth else self.depth
+
+    # .........................................................................
+    def _string_char(self, c):
+        if self.hex_digits:
+            # Skip the 4 hex digits of a \uXXXX escape. We've already put a
+            # placeholder in the title.
+            self.hex_digits -= 1
+            return
+
+        if self.escape:
+            self.escape = False
+
+            if c == ord('u'):
+                self.hex_digits = 4
+                c = ord('?')
+            else:
+                c = _ESCAPES.get(c, c)
+        elif c == 0x5c:                                         # \
+            self.escape = True
+            return
+        elif c == 0x22:                                         # "
+            self.in_string = False
+            self._end_string()
+            return
+
+        if self.target == _KEY:
+            if self.key_length < len(self.key):
+                self.key[self.key_length] = c
+
+            self.key_length += 1
+        elif self.target == _TITLE:
+            if self.title_length < len(self.title):
+                self.title[self.title_length] = c
+                self.title_length += 1
+        elif self.target == _EVENT_ID:
+            self.event_id = (self.event_id * 31 + c) & 0x3fffffff
+        elif self.target == _TICKS and 0x30 <= c <= 0x39:
+            # Extended JSON sends 64-bit numbers as digit strings.
+            self.number = self.number * 10 + c - 0x30
+
+    # .........................................................................
+    def _end_string(self):
+        if self.target == _KEY:
+            self.key_id = _OTHER
+
+            for key_id, name in _KEYS:
+                if self._key_is(name):
+                    self.key_id = key_id
+                    break
+        elif self.target == _TITLE:
+            self.has_title = True
+            self.event_depth = self.depth
+
+            if self.title_length == len(self.title):
+                self._trim_title()
+        elif self.target == _EVENT_ID:
+            # Set the top bit, so an ID never hashes to 0 ("no ID").
+            self.event_id |= 0x40000000
+        elif self.target == _TICKS:
+            self._set_ticks(self.number)
+
+        self.target = _OTHER
+
+    # .........................................................................
+    def _trim_title(self):
+        """
+            Don't leave half of a multi-byte UTF-8 character at the end of a
+            truncated title.
+        """
+        i = self.title_length - 1
+
+        while i > 0 and self.title[i] & 0xc0 == 0x80:
+            i -= 1
+
+        lead = self.title[i]
+
+        if lead < 0x80:
+            return
+
+        size = 4 if lead >= 0xf0 else 3 if lead >= 0xe0 else 2
+
+        if self.title_length - i < size:
+            self.title_length = i
+
+    # .........................................................................
+    def _key_is(self, name):
+        if self.key_length != len(name):
+            return False
+
+        for i in range(self.key_length):
+            if self.key[i] != name[i]:
+                return False
+
+        return True
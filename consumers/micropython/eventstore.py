@@ -0,0 +1,233 @@
+"""
+    Fixed-capacity, preallocated event store.
+
+    Events are kept in parallel, preallocated buffers (an array('l') of times,
+    a bytearray of statuses, and fixed-size title slots) instead of a list of
+    dicts, and refreshes are staged into a second set of buffers that is
+    swapped in when the update is committed. Once the store has been created,
+    refreshing, reading, and popping events doesn't allocate anything on the
+    heap, which keeps GC pauses and heap fragmentation away on small boards.
+
+    Events from several calendars arrive as one time-ordered run per source.
+    Staging merges them into a single timeline as they stream in (keeping the
+    earliest events when there are more than fit), and drops repeats of the
+    same eventId, e.g. a meeting that's on both the work and team calendars.
+"""
+
+from array import array
+
+PENDING = 0
+SCHEDULED = 1
+NOTIFYING = 2
+
+
+# .............................................................................
+class _Buffers():
+
+    # .........................................................................
+    def __init__(self, capacity, title_size):
+        self.times = array('l', [0] * capacity)
+        self.ids = array('l', [0] * capacity)       # eventId hashes, 0 if none
+        self.status = bytearray(capacity)
+        self.titles = bytearray(capacity * title_size)
+        self.title_lengths = bytearray(capacity)
+        self.count = 0
+
+
+# .............................................................................
+class EventStore():
+
+    # .........................................................................
+    def __init__(self, capacity=16, title_size=32):
+        self.capacity = capacity
+        self.title_size = title_size
+        self.current = _Buffers(capacity, title_size)
+        self.staged = _Buffers(capacity, title_size)
+        self.head = 0
+
+    # .........................................................................
+    def __len__(self):
+        return self.current.count - self.head
+
+    # .........................................................................
+    def time(self, i):
+        return self.current.times[self.head + i]
+
+    # .........................................................................
+    def status(self, i):
+        return self.current.status[self.head + i]
+
+    # .........................................................................
+    def set_status(self, i, status):
+        self.current.status[self.head + i] = status
+
+    # .........................................................................
+    def title(self, i):
+        """
+            The title of an event. This is the only accessor that allocates
+            (a new str), so only call it when you actually need to show it.
+        """
+        slot = (self.head + i) * self.title_size
+        length = self.current.title_lengths[self.head + i]
+
+        return str(self.current.titles[slot:slot + length], 'utf-8')
+
+    # .........................................................................
+    def pop(self):
+        """
+            Drop the first (earliest) event.
+        """
+        if self.head < self.current.count:
+            self.head += 1
+
+    # .........................................................................
+    def begin_update(self):
+        self.staged.count = 0
+
+    # .........................................................................
+    def stage(self, title, title_length, event_time, event_id=0):
+        """
+            Add an event to the pending update, in time order. Once the store
+            is full, the latest events are dropped. Events with the same
+            (non-zero) event_id as one that's already staged are skipped.
+            Returns True if the event was staged.
+        """
+        staged = self.staged
+        count = staged.count
+        times = staged.times
+
+        if event_id:
+            ids = staged.ids
+
+            for j in range(count):
+                if ids[j] == event_id:
+                    return False
+
+        # Each source's events come in time order, so this is usually the
+        # end, or near it.
+        i = count
+
+        while i > 0 and times[i - 1] > event_time:
+            i -= 1
+
+        if i >= self.capacity:
+            return False
+
+        # Make room, dropping the last event if we're full.
+        count = min(count + 1, self.capacity)
+
+        for j in range(count - 1, i, -1):
+            self._copy(staged, j - 1, staged, j)
+
+        title_length = min(title_length, self.title_size)
+        slot = i * self.title_size
+        titles = staged.titles
+
+        for j in range(title_length):
+            titles[slot + j] = title[j]
+
+        staged.title_lengths[i] = title_length
+        staged.times[i] = event_time
+        staged.ids[i] = event_id
+        staged.status[i] = PENDING
+        staged.count = count
+
+        return True
+
+    # .........................................................................
+    def commit_update(self):
+        """
+            Swap the staged events in, carrying state over from the current
+            events:
+            - events being notified about are kept at the head of the list,
+            - unchanged events keep their status, and
+            - moved events (same title, new time) go back to pending.
+        """
+        current = self.current
+        staged = self.staged
+
+        # Carry over events we're in the middle of notifying about, unless
+        # they're in the new list anyway. They're always at the head.
+        keep = 0
+
+        for i in range(self.head, current.count):
+            if current.status[i] != NOTIFYING:
+                break
+
+            if self._find(staged, current, i) < 0:
+                keep += 1
+
+        if keep:
+            # Make room at the head of the staged list.
+            count = min(staged.count + keep, self.capacity)
+
+            for i in range(count - 1, keep - 1, -1):
+                self._copy(staged, i - keep, staged, i)
+
+            staged.count = count
+            j = 0
+
+            for i in range(self.head, current.count):
+                if j == keep or current.status[i] != NOTIFYING:
+                    break
+
+                if self._find(staged, current, i) < 0:
+                    self._copy(current, i, staged, j)
+                    j += 1
+
+        for i in range(keep, staged.count):
+            j = self._find(current, staged, i)
+
+            if j >= self.head:
+                staged.status[i] = current.status[j]
+
+        self.current, self.staged = staged, current
+        self.head = 0
+
+    # .........................................................................
+    def _find(self, buffers, other, i):
+        """
+            Index of the event in "buffers" with the same eventId (or, if
+            either doesn't have one, title) and time as event i of "other",
+            or -1.
+        """
+        start = self.head if buffers is self.current else 0
+        length = other.title_lengths[i]
+        slot = i * self.title_size
+        event_id = other.ids[i]
+
+        for j in range(start, buffers.count):
+            if buffers.times[j] != other.times[i]:
+                continue
+
+            if event_id and buffers.ids[j]:
+                if buffers.ids[j] == event_id:
+                    return j
+
+                continue
+
+            if buffers.title_lengths[j] != length:
+                continue
+
+            base = j * self.title_size
+
+            for k in range(length):
+                if buffers.titles[base + k] != other.titles[slot + k]:
+                    break
+            else:
+                return j
+
+        return -1
+
+    # .........................................................................
+    def _copy(self, source, i, target, j):
+        size = self.title_size
+        length = source.title_lengths[i]
+
+        for k in range(length):
+            target.titles[j * size + k] = source.titles[i * size + k]
+
+        target.title_lengths[j] = length
+        target.times[j] = source.times[i]
+        target.ids[j] = source.ids[i]
+        target.status[j] = source.status[i]
@@ -0,0 +1,266 @@
+"""
+    Minimal persistent HTTP/1.1 client for MicroPython's asyncio.
+
+    aiohttp opens (and TLS-handshakes) a brand new connection for every
+    request, which costs seconds of CPU and a big temporary RAM spike on an
+    ESP8266/ESP32. This keeps one keep-alive connection per host open between
+    requests, and only reconnects (lazily, on the next request) after an error
+    or when the server closes the connection.
+
+    Every step (connecting, sending the request and reading its headers, and
+    each read of the body) has a deadline, so a connection that was dropped
+    without a word (by a NAT or the Wi-Fi) can't hang the caller forever.
+    A connection that has been idle for longer than the server would keep
+    it open is closed, rather than reused, before the next request.
+"""
+
+import asyncio
+import time
+
+try:
+    import ssl
+except ImportError:
+    ssl = None
+
+
+# .............................................................................
+class HttpResponse():
+
+    # .........................................................................
+    def __init__(self, session, status, length, chunked, close):
+        self.session = session
+        self.status = status
+        self.remaining = length         # -1 means "until the connection closes"
+        self.chunked = chunked
+        self.chunk_remaining = 0
+        self.close = close
+        self.finished = length == 0
+
+    # .........................................................................
+    async def read(self, size):
+        """
+            Read up to "size" bytes of the body. Returns b'' at the end.
+            If the read fails or times out, the connection is closed.
+        """
+        if self.finished:
+            return b''
+
+        try:
+            return await asyncio.wait_for(self._read(size), self.session.timeout)
+        except Exception:
+            self.finished = True
+            self.session.close()
+            raise
+
+    # .........................................................................
+    async def _read(self, size):
+        reader = self.session.reader
+
+        if self.chunked:
+            if self.chunk_remaining == 0:
+                line = await reader.readline()
+                self.chunk_remaining = int(line.split(b';', 1)[0], 16)
+
+                if self.chunk_remaining == 0:
+                    # Last chunk. Skip the (empty) trailer.
+                    while (await reader.readline()).strip():
+                        pass
+
+                    self.finished = True
+                    return b''
+
+            data = await reader.read(min(size, self.chunk_remaining))
+            self.chunk_remaining -= len(data)
+
+            if self.chunk_remaining == 0:
+                await reader.readexactly(2)
+
+            return data
+
+        if self.remaining >= 0:
+            size = min(size, self.remaining)
+
+        data = await reader.read(size)
+
+        if not data:
+            self.finished = True
+            self.close = True
+        elif self.remaining > 0:
+            self.remaining -= len(data)
+            self.finished = self.remaining == 0
+
+        return data
+
+    # .........................................................................
+    async def release(self, buffer_size=128):
+        """
+            Finish with the response: drain whatever is left of the body, so
+            the connection can be reused for the next request.
+        """
+        while not self.finished:
+            if not await self.read(buffer_size):
+                break
+
+        if self.close:
+            self.session.close()
+        else:
+            self.session.last_used = time.ticks_ms()
+
+
+# .............................................................................
+class HttpSession():
+
+    # .........................................................................
+    def __init__(self, base_url, verify=False, timeout=15, idle_seconds=60):
+        """
+            timeout is how many seconds each step of a request may take.
+            idle_seconds is how long the server keeps an idle connection
+            open (most close them after a minute or so).
+        """
+        scheme, _, rest = base_url.partition('://')
+        host, _, path = rest.partition('/')
+
+        self.tls = scheme == 'https'
+        self.host, _, port = host.partition(':')
+        self.port = int(port) if port else (443 if self.tls else 80)
+        self.base_path = '/' + path
+        self.verify = verify
+        self.ssl_context = None
+        self.timeout = timeout
+        self.idle_ms = idle_seconds * 1000
+
+        self.reader = None
+        self.writer = None
+        self.last_used = 0
+
+        # Instrumentation
+        self.connects = 0
+        self.requests = 0
+
+    # .........................................................................
+    @property
+    def connected(self):
+        return self.writer is not None
+
+    # .........................................................................
+    async def _connect(self):
+        context = None
+
+        if self.tls:
+            if self.ssl_context is None:
+                # Created once, and reused for every reconnect.
+                self.ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+
+                if not self.verify:
+                    if hasattr(self.ssl_context, 'check_hostname'):
+                        self.ssl_context.check_hostname = False
+
+                    self.ssl_context.verify_mode = ssl.CERT_NONE
+
+            context = self.ssl_context
+
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port, ssl=context)
+        self.connects += 1
+
+    # .........................................................................
+    def close(self):
+        if self.writer is not None:
+            try:
+                self.writer.close()
+            except Exception:
+                pass
+
+        self.reader = None
+        self.writer = None
+
+    # .........................................................................
+    async def request(self, method, path, body=None, headers=None, timeout=None):
+        """
+            Send a request, and return an HttpResponse once the status line and
+            headers are in. The caller must call response.release() when done
+            with the body. The body can be a str, bytes, or a tuple of bytes
+            that are sent one after the other (so a request that's mostly the
+            same every time doesn't have to be put together again).
+            If a reused connection turns out to have been dropped by the
+            server, the request is retried once on a fresh connection.
+            timeout overrides the session's for the request and its headers
+            (e.g. for a long-poll, which takes a while to answer).
+        """
+        timeout = timeout or self.timeout
+
+        if self.connected and time.ticks_diff(time.ticks_ms(), self.last_used) > self.idle_ms:
+            # The server (or a NAT on the way) has most likely dropped it by
+            # now, without telling us.
+            self.close()
+
+        for attempt in range(2):
+            reused = self.connected
+
+            try:
+                if not reused:
+                    await asyncio.wait_for(self._connect(), self.timeout)
+
+                return await asyncio.wait_for(self._send(method, path, body, headers), timeout)
+            except Exception:
+                self.close()
+
+                if not reused or attempt:
+                    raise
+
+    # .........................................................................
+    async def _send(self, method, path, body, headers):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+
+        if isinstance(body, bytes):
+            body = (body,)
+
+        request = '%s %s%s HTTP/1.1\r\nHost: %s\r\n' % (method, self.base_path, path, self.host)
+
+        if headers:
+            for name in headers:
+                request += '%s: %s\r\n' % (name, headers[name])
+
+        if body is not None:
+            request += 'Content-Length: %d\r\n' % sum(len(part) for part in body)
+
+        self.writer.write(request.encode('utf-8') + b'\r\n')
+
+        if body is not None:
+            for part in body:
+                self.writer.write(part)
+
+        await self.writer.drain()
+        self.requests += 1
+
+        status_line = await self.reader.readline()
+
+        if not status_line:
+            raise OSError('connection closed')
+
+        status = int(status_line.split(None, 2)[1])
+        length = -1
+        chunked = False
+        close = False
+
+        while True:
+            line = await self.reader.readline()
+
+            if not line or line == b'\r\n':
+                break
+
+            name, _, value = line.partition(b':')
+            name = name.strip().lower()
+            value = value.strip().lower()
+
+            if name == b'content-length':
+                length = int(value)
+            elif name == b'transfer-encoding':
+                chunked = value == b'chunked'
+            elif name == b'connection':
+                close = value == b'close'
+
+        if status == 304 or status == 204:
+            length = 0
+
+        return HttpResponse(self, status, length, chunked, close)
@@ -1,54 +1,57 @@
-from machine import Pin
-import time
+from machine import Pin, PWM
+from animator import AnimatedLeds
 
 # .............................................................................
-class LedFlasher():
+class SwitchedLed():
+    """
+        An LED on a pin that can't do PWM (e.g. GPIO16 on the ESP8266). It's
+        either on or off: any duty of half or more switches the pin high.
+    """
 
     # .........................................................................
-    def __init__(self, red_pin, green_pin, blue_pin):
-        self.blueLed = Pin(blue_pin, Pin.OUT)
-        self.greenLed = Pin(green_pin, Pin.OUT)
-        self.redLed = Pin(red_pin, Pin.OUT)
+    def __init__(self, pin):
+        self.pin = pin
 
-        self.blueLed.value(True)
-        self.greenLed.value(True)
-        self.redLed.value(True)
-
-        self.Red = [self.redLed]
-        self.Green = [self.greenLed]
-        self.Blue = [self.blueLed]
-        self.Yellow = [self.redLed, self.greenLed]
+    # .........................................................................
+    def duty_u16(self, duty):
+        self.pin.value(1 if duty >= 32768 else 0)
 
-        self.LedOn = False
-        self.LedOff = True
 
-    # .........................................................................
-    def flash(self, color, duration):
-        self.redLed.value(self.LedOff)
-        self.greenLed.value(self.LedOff)
-        self.blueLed.value(self.LedOff)
+# .............................................................................
+def led_output(pin_number):
+    pin = Pin(pin_number, Pin.OUT)
 
-        for led in color:
-            led.value(self.LedOn)
+    try:
+        return PWM(pin, freq=1000)
+    except ValueError:
+        return SwitchedLed(pin)
 
-        time.sleep(duration)
 
-        for led in color:
-            led.value(self.LedOff)
+# .............................................................................
+class LedFlasher(AnimatedLeds):
 
-        time.sleep(duration)
+    # .........................................................................
+    def __init__(self, red_pin, green_pin, blue_pin, active_low=True, brightness=1.0):
+        """
+            The LEDs are driven with PWM so they can be dimmed. An LED on a
+            pin without PWM is just switched on and off (see SwitchedLed).
+            By default they're wired active low (a pin outputs 0 to light
+            its LED).
+        """
+        self.redLed = led_output(red_pin)
+        self.greenLed = led_output(green_pin)
+        self.blueLed = led_output(blue_pin)
+        self.active_low = active_low
+
+        super().__init__(output_max=65535, brightness=brightness)
 
     # .........................................................................
-    def on(self, color):
-        self._off()
-
-        for led in color:
-            led.value(self.LedOn)
-            time.sleep_ms(1)
-
-    # .............................................................................
-    async def off(self):
-        self.redLed.value(self.LedOff)
-        self.greenLed.value(self.LedOff)
-        self.blueLed.value(self.LedOff)
-        time.sleep_ms(1)
\ No newline at end of file
+    def write(self, red, green, blue):
+        if self.active_low:
+            red = 65535 - red
+            green = 65535 - green
+            blue = 65535 - blue
+
+        self.redLed.duty_u16(red)
+        self.greenLed.duty_u16(green)
+        self.blueLed.duty_u16(blue)
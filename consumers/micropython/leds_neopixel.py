@@ -1,50 +1,22 @@
 from machine import Pin
-import time
-import machine, neopixel
-from machine import Pin
+import neopixel
+from animator import AnimatedLeds
 
 # .............................................................................
-class LedFlasher():
+class LedFlasher(AnimatedLeds):
 
     # .........................................................................
-    def __init__(self, neopixel_pin):
+    def __init__(self, neopixel_pin, brightness=1.0):
         self.pixels = neopixel.NeoPixel(Pin(neopixel_pin), 1)
         self.numberOfPixels = self.pixels.n
-        
-        self.Red = (255, 0, 0)
-        self.Green = (0, 255, 0)
-        self.Blue = (0, 0, 255)
-        self.Yellow = (255, 255, 0)
-        self.Off = (0, 0, 0)
-        
-        self.off()
-        
-    # .........................................................................
-    def set_color(self, color):
-        for p in range(self.numberOfPixels):
-            self.pixels[p] = color
 
-    # .........................................................................
-    def flash(self, color, duration):
-        self.on(color)
-        time.sleep(duration)
-        self.on(self.Off)
-        time.sleep(duration)
+        super().__init__(output_max=255, brightness=brightness)
 
     # .........................................................................
-    def on(self, color):
-        self.off()
-        
-        for p in range(self.numberOfPixels):
-            self.pixels[p] = color
-            time.sleep_ms(1)
-        
-        self.pixels.write()
+    def write(self, red, green, blue):
+        pixel = (red, green, blue)
 
-    # .............................................................................
-    def off(self):
         for p in range(self.numberOfPixels):
-            self.pixels[p] = self.Off
-            time.sleep_ms(1)
-        
-        self.pixels.write()
\ No newline at end of file
+            self.pixels[p] = pixel
+
+        self.pixels.write()
@@ -1,6 +1,5 @@
 from network import WLAN, STA_IF, AP_IF
 import sys
-from time import sleep
 import asyncio
 import secrets
 from meetingminder import MeetingMinder
@@ -12,7 +11,7 @@ if sys.platform != 'rp2':
 
 
 # .............................................................................
-def connect(leds):
+async def connect(leds):
     leds.on(leds.Blue)
 
     # Ensure that the Access Point mode is disabled
@@ -22,16 +21,21 @@ def connect(leds):
     # Fire up the station mode and connect to the network
     wifi = WLAN(STA_IF)
     wifi.active(True)
-    sleep(2)
+    await asyncio.sleep(2)
     
     if wifi.isconnected():
-        leds.flash(leds.Green, 0.5)
+        leds.flash(leds.Green, 500)
+        await asyncio.sleep(1)
+        leds.off()
         return
     
     wifi.connect(secrets.wifi_network, secrets.wifi_password)
+    leds.flash(leds.Blue, 500)
 
     while not wifi.isconnected():
-        leds.flash(leds.Blue, 0.5)
+        await asyncio.sleep(0.1)
+
+    leds.off()
 
     # We're connected to WiFi! Let's go!
     #leds.flash(leds.Blue, 0.1)
@@ -72,14 +76,36 @@ async def sync_time():
                 await asyncio.sleep(5)
 
 
+# .............................................................................
+async def set_time(leds):
+    if sys.platform == 'rp2':
+        return
+
+    # print("Syncing time from NTP server...")
+    leds.flash(leds.Yellow, 200)
+
+    while True:
+        try:
+            ntptime.settime()
+            break
+        except:
+            await asyncio.sleep(0.4)
+
+    leds.off()
+
+
 # .............................................................................
 async def main(leds):
     """
-        Initialize application state by fetching events from MongoDB, then
-        start background tasks.
+        Connect, set the clock, and initialize application state by fetching
+        events from MongoDB, then start background tasks.
     """
     set_global_exception()
 
+    # print("Connecting to network...")
+    await connect(leds)
+    await set_time(leds)
+
     meetingMinder = MeetingMinder(leds)
     asyncio.create_task(sync_time())
     asyncio.create_task(meetingMinder.run())
@@ -94,21 +120,6 @@ if __name__ == "__main__":
     # leds = LedFlasher(red_pin=23, green_pin=22, blue_pin=21)   # <-- ESP32
     # leds = LedFlasher(red_pin=18, green_pin=19, blue_pin=20)   # <-- RPi Pico W
 
-    # print("Connecting to network...")
-    connect(leds)
-
-    if sys.platform != 'rp2':
-        # print("Syncing time from NTP server...")
-        leds.on(leds.Blue)
-
-        while True:
-            try:
-                leds.flash(leds.Yellow, 0.2)
-                ntptime.settime()
-                break
-            except:
-                ...
-
     try:
         asyncio.run(main(leds))
     except:
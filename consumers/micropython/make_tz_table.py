@@ -0,0 +1,92 @@
+"""
+    Build the UTC offset transition table (tz.bin) that tztable.py reads on
+    the board. Run this on your computer (CPython 3.9+), not on the board:
+
+        python make_tz_table.py America/New_York --first-year 2024 --last-year 2037
+
+    then copy tz.bin to the board next to meetingminder.py.
+
+    File format (big-endian):
+        4 bytes     magic b'TZT1'
+        2 bytes     number of entries (n)
+        n * 8 bytes (transition, offset) pairs of signed 32-bit ints: from
+                    "transition" (UTC Unix epoch seconds) on, local time is
+                    UTC + "offset" seconds. The first entry's transition is
+                    the smallest 32-bit int, i.e. "since forever".
+"""
+
+import argparse
+import struct
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+Magic = b'TZT1'
+Forever = -2 ** 31
+
+
+# .............................................................................
+def offset_at(zone, ts):
+    return int(datetime.fromtimestamp(ts, zone).utcoffset().total_seconds())
+
+
+# .............................................................................
+def transitions(zone_name, first_year, last_year):
+    """
+        (transition, offset) pairs for the zone, found by checking the offset
+        every day and narrowing each change down to the second.
+    """
+    zone = ZoneInfo(zone_name)
+    start = int(datetime(first_year, 1, 1, tzinfo=timezone.utc).timestamp())
+    end = int(datetime(last_year + 1, 1, 1, tzinfo=timezone.utc).timestamp())
+
+    table = [(Forever, offset_at(zone, start))]
+    day = 24 * 3600
+    ts = start
+
+    while ts < end:
+        before = offset_at(zone, ts)
+        after = offset_at(zone, ts + day)
+
+        if before != after:
+            low, high = ts, ts + day
+
+            while high - low > 1:
+                middle = (low + high) // 2
+
+                if offset_at(zone, middle) == before:
+                    low = middle
+                else:
+                    high = middle
+
+            table.append((high, after))
+
+        ts += day
+
+    return table
+
+
+# .............................................................................
+def write_table(path, table):
+    with open(path, 'wb') as f:
+        f.write(Magic + struct.pack('>H', len(table)))
+
+        for transition, offset in table:
+            f.write(struct.pack('>ii', transition, offset))
+
+
+# .............................................................................
+if __name__ == '__main__':
+    this_year = datetime.now().year
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('zone', nargs='?', default='America/New_York', help='IANA time zone name')
+    parser.add_argument('--first-year', type=int, default=this_year)
+    parser.add_argument('--last-year', type=int, default=2037, help='32-bit timestamps run out in 2038')
+    parser.add_argument('--output', default='tz.bin')
+    args = parser.parse_args()
+
+    table = transitions(args.zone, args.first_year, args.last_year)
+    write_table(args.output, table)
+
+    print('%s: %d transitions, %d bytes written to %s' % (
+        args.zone, len(table) - 1, 6 + 8 * len(table), args.output))
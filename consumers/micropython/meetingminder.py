@@ -1,15 +1,91 @@
 from sys import platform
-import aiohttp
 import asyncio
-import json as json
+import gc
 import time
 import secrets
-
-# MicroPython's time module works on like Unix epoch time (Jan 1, 1970), except
-# that it starts at Jan 1, 2000 instead. We need to adjust timestamps we receive
-# from MongoDB to be compatible with the time module by deducting the MicroPython
-# epoch from the incoming timestamps.
-MPEpochOffset = 0 if platform == 'rp2' else 946702800
+from backoff import Backoff, jitter
+from eventparser import EventParser
+from eventquery import event_query, page_body, query_parts
+from eventstore import EventStore, PENDING, SCHEDULED, NOTIFYING
+from httpsession import HttpSession
+from power import PowerManager
+from refreshpolicy import RefreshPolicy
+from tztable import TimeZone
+
+# All times are kept as UTC Unix epoch seconds, which is what MongoDB sends.
+# Some MicroPython ports count from Jan 1, 2000 instead of Jan 1, 1970, so
+# their clock needs this added to get Unix time.
+EpochOffset = 946684800 if time.gmtime(0)[0] == 2000 else 0
+
+# The Pico W's clock is set to local time (by Thonny/mpremote), not synced to
+# UTC with NTP like the ESP boards. The time zone table (tz.bin, see
+# make_tz_table.py) converts it to UTC, DST included.
+ClockIsLocal = platform == 'rp2'
+TimeZoneFile = 'tz.bin'
+
+# How long a relay long-poll waits for the schedule to change (see the
+# desktop relay.py). Only used when secrets.relay_url is set.
+RelayWaitSeconds = 50
+
+# Each step of a fetch (connecting, the request, every read of the response)
+# has to finish within FetchTimeoutSeconds, or the fetch fails (and is backed
+# off). The connection is only reused if it has been idle for less than
+# KeepAliveSeconds, after which most servers have closed it.
+FetchTimeoutSeconds = 15
+KeepAliveSeconds = 60
+
+# Responses are read and parsed this many bytes at a time.
+ReadChunkSize = 256
+
+# The event store is preallocated for this many events, with titles truncated
+# to this many bytes.
+EventCapacity = 16
+EventTitleSize = 32
+
+# Events from several calendars (the publisher's "source") are merged into
+# one timeline. This many upcoming events are fetched from each source.
+# Listing the sources (e.g. ['Work Calendar', 'Team Calendar']) lets each one
+# be fetched with its own index range scan; None fetches every source.
+EventsPerSource = 5
+EventSources = None
+
+# Set this to True to print how much heap each refresh allocates.
+HeapReport = False
+
+# How often the schedule is refreshed: every MinRefreshSeconds once
+# notifications for the next meeting have started, every MaxRefreshSeconds
+# when it's far off (or there's none), and in between as it gets closer (see
+# refreshpolicy.py). Nothing is fetched during the DoNotDisturb windows:
+# (weekdays, start hour, end hour) in local time, with Monday as 0. A window
+# that ends before it starts runs overnight, e.g.
+# DoNotDisturb = (((0, 1, 2, 3, 4), 19, 7), ((5, 6), 0, 24)) for nights and
+# weekends.
+MinRefreshSeconds = 60
+MaxRefreshSeconds = 15 * 60
+DoNotDisturb = ()
+
+# A failed refresh is retried after MinRefreshSeconds, then twice as long
+# after every failure in a row, up to FetchRetryMaxSeconds. After
+# FetchFailuresToOpen failures in a row, nothing is fetched for
+# FetchOpenSeconds at a time (see backoff.py). The current schedule stays in
+# use throughout. Refreshes that would happen at the same moment on every
+# board (the first one after power up, the ones closing in on a meeting or
+# just before each half hour, and the first one after do-not-disturb) are
+# spread over FleetSpreadSeconds, so boards that are switched on together
+# don't all call the Data API at once.
+FetchRetryMaxSeconds = 10 * 60
+FetchFailuresToOpen = 5
+FetchOpenSeconds = 15 * 60
+FleetSpreadSeconds = 30
+
+# Notifications start this long before a meeting.
+NotifyAheadSeconds = 300
+
+# Set this to True to light-sleep between refreshes and notifications (for
+# battery or power bank setups). PowerReport prints the duty cycle and the
+# estimated current draw after every refresh.
+LowPower = False
+PowerReport = False
 
 
 # .............................................................................
@@ -18,63 +94,61 @@ class MeetingMinder():
     # .........................................................................
     def __init__(self, ledFlasher):
         self.leds = ledFlasher
-        self.events = []
+        self.events = EventStore(EventCapacity, EventTitleSize)
+        self.schedule_hash = None
+        self.fetch_failed = False
+
+        # If a schedule relay is running on the local network, long-poll it
+        # instead of calling the Data API directly.
+        self.relay_url = getattr(secrets, 'relay_url', None)
+        self.relay_version = -1
+
+        # One persistent (keep-alive) connection, instead of a new TLS
+        # handshake on every poll. It reconnects on the next poll after errors.
+        self.session = HttpSession(
+            self.relay_url or secrets.mongo_url, timeout=FetchTimeoutSeconds, idle_seconds=KeepAliveSeconds)
+
+        # Responses are parsed as they stream in, straight into the event
+        # store's staging buffers.
+        self.parser = EventParser(self.on_fetched_event, title_size=EventTitleSize)
+        self.fetch_time = 0
+        self.fetching = False
+        self.next_refresh = 0
+        self.schedule_changed = asyncio.Event()
 
         # self.leds.on(self.leds.Green)
-        self.get_timezone_offset()
-
-        # print("Epoch Offset:", MPEpochOffset)
-
-        self.Query = '''{
-            "dataSource": "''' + secrets.mongo_cluster_name + '''",
-            "database": "notifications",
-            "collection": "events",
-            "pipeline": [
-                {
-                    "$addFields": {
-                        "timeDiff": {
-                            "$dateDiff": {
-                                "startDate": "$$NOW",
-                                "endDate": "$startTime",
-                                "unit": "second"
-                            }
-                        }
-                    }
-                },
-                {
-                    "$match": { "$expr": { "$gt": [ "$timeDiff", 0 ] } }
-                },
-                {
-                    "$sort": { "startTime": 1 }
-                },
-                {
-                    "$limit": 5
-                },
-                {
-                    "$project": {
-                        "_id": 0,
-                        "title": 1,
-                        "startTime": 1,
-                        "startTicks": "$startTimestamp"
-                    }
-                }
-            ]
-        }'''
+        self.tz = TimeZone(TimeZoneFile)
+
+        self.power = PowerManager(clock=lambda: self.now) if LowPower else None
+        self.refresh_policy = RefreshPolicy(
+            MinRefreshSeconds, MaxRefreshSeconds, NotifyAheadSeconds, DoNotDisturb, spread_seconds=FleetSpreadSeconds)
+        self.backoff = Backoff(MinRefreshSeconds, FetchRetryMaxSeconds, FetchFailuresToOpen, FetchOpenSeconds)
+
+        # print("Epoch Offset:", EpochOffset)
+
+        # The query is sent in parts, with the start of the page (only events
+        # after this time) in between. The parts are only encoded once.
+        self.query_parts = query_parts(
+            event_query(secrets.mongo_cluster_name, EventsPerSource, EventSources))
 
         self.QueryHeaders = {
             'Content-Type': 'application/json',
             'Access-Control-Request-Headers': '*',
-            'api-key': secrets.mongo_api_key,
-            'Connection': 'close'
+            'api-key': secrets.mongo_api_key
         }
 
     # .........................................................................
     @property
     def now(self):
-        if platform == 'rp2':
-            return time.mktime(time.localtime())
-        else:
-            return time.mktime(time.localtime()) + self.utc_offset_seconds
+        """
+            The current time, in UTC Unix epoch seconds.
+        """
+        clock = time.time() + EpochOffset
+
+        if ClockIsLocal:
+            return self.tz.to_utc(clock)
+
+        return clock
 
     # .........................................................................
     async def run(self):
@@ -86,29 +160,111 @@ class MeetingMinder():
         asyncio.create_task(self.event_scheduler_task())
         asyncio.create_task(self.event_notifier_task())
 
+        if self.power:
+            asyncio.create_task(self.power.idle_task(self.next_wake))
+
+    # .........................................................................
+    def next_wake(self):
+        """
+            When the board next has to be awake: for the next refresh, or when
+            notifications for the next meeting start, whichever comes first.
+        """
+        if self.fetching:
+            return self.now
+
+        wake = self.next_refresh
+
+        if self.events:
+            wake = min(wake, self.events.time(0) - NotifyAheadSeconds)
+
+        return wake
+
+    # .........................................................................
+    async def wait_for_change(self, seconds):
+        """
+            Sleep for the given number of seconds, or until the schedule
+            changes.
+        """
+        try:
+            await asyncio.wait_for(self.schedule_changed.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
     # .........................................................................
     async def event_refresher_task(self):
         """
             Periodically fetch the list of events from the MongoDB Atlas Data API.
             This method will be run as a background task, so needs to run
-            forever, sleeping for a bit between fetches.
+            forever, sleeping for a bit between fetches (see refreshpolicy.py),
+            or backing off while they fail (see backoff.py).
         """
 
+        start = jitter(FleetSpreadSeconds)
+        self.next_refresh = self.now + start
+        await asyncio.sleep(start)
+
         while True:
-            events = await self.fetch_events()
-            events_in_progress = [
-                e for e in self.events if e['status'] == 'notifying']
+            quiet = self.refresh_policy.quiet_for(self.tz.to_local(self.now))
+
+            if quiet:
+                # Do not disturb.
+                self.next_refresh = self.now + quiet
+                await asyncio.sleep(quiet)
+                continue
+
+            if HeapReport:
+                gc.collect()
+                heap_before = gc.mem_alloc()
+
+            self.fetching = True
 
-            if events_in_progress:
-                in_progress = events_in_progress[0]
-                events = events_in_progress + \
-                    [e for e in events if e['time'] != in_progress['time']]
+            # False means the fetch failed, or the schedule hasn't changed.
+            if await self.fetch_events():
+                self.events.commit_update()
 
-            self.events = events
+                # Wake up anyone waiting on the old schedule.
+                changed, self.schedule_changed = self.schedule_changed, asyncio.Event()
+                changed.set()
 
-            # Wait for 1 minute before fetching events. We can make this longer if
-            # our meeting schedule doesn't change very often.
-            await asyncio.sleep(60)
+            self.fetching = False
+
+            if not self.fetch_failed:
+                self.backoff.succeeded()
+
+            if HeapReport:
+                print("Heap: refresh allocated", gc.mem_alloc() - heap_before,
+                      "bytes,", gc.mem_free(), "free,", len(self.events), "events")
+
+            if PowerReport and self.power:
+                self.power.report()
+
+            if self.relay_url and not self.fetch_failed and not LowPower:
+                # The relay long-poll already waited for a change.
+                await asyncio.sleep(1)
+                continue
+
+            now = self.now
+
+            if self.fetch_failed:
+                # Keep the current schedule, and try again later.
+                delay = self.backoff.failed()
+            else:
+                # Wait longer the further off the next meeting is.
+                delay = self.refresh_policy.delay(now, self.next_start(now), self.tz.to_local(now))
+
+            self.next_refresh = now + delay
+            await asyncio.sleep(delay)
+
+    # .........................................................................
+    def next_start(self, now):
+        """
+            When the next meeting that hasn't started yet starts, or None.
+        """
+        for i in range(len(self.events)):
+            if self.events.time(i) > now:
+                return self.events.time(i)
+
+        return None
 
     # .........................................................................
     async def event_scheduler_task(self):
@@ -126,14 +282,12 @@ class MeetingMinder():
 
             # The list of events should be sorted by time, so the first one
             # is the next meeting.
-            next_event = self.events[0]
-
-            if next_event['status'] == 'pending':
+            if self.events.status(0) == PENDING:
                 # Make sure our next meeting gets managed by our notification
                 # agent. We'll just fire up a new task to do that.
-                next_event['status'] = 'scheduled'
+                self.events.set_status(0, SCHEDULED)
 
-                # print(f"Scheduled {next_event['title']}")
+                # print(f"Scheduled {self.events.title(0)}")
 
             await asyncio.sleep(10)
 
@@ -149,14 +303,12 @@ class MeetingMinder():
 
         while True:
             if not self.events:
-                # We have no meetings! Woohoo! We'll just sleep for a bit,
-                # then check again until we have some.
-                await asyncio.sleep(10)
+                # We have no meetings! Woohoo! Sleep until we have some.
+                await self.wait_for_change(MaxRefreshSeconds)
                 continue
 
-            event = self.events[0]
-            event_time = event["time"]
-            # event_title = event["title"]   <-- You can use this to display the title of the event
+            event_time = self.events.time(0)
+            # event_title = self.events.title(0)   <-- You can use this to display the title of the event
             wait_time = 1
 
             now = self.now
@@ -166,110 +318,95 @@ class MeetingMinder():
 
             if time_until_event <= -120:
                 self.leds.off()
-                self.events.pop(0)
+                self.events.pop()
             elif time_until_event <= 10:          # 10 seconds before the event
-                event['status'] = 'notifying'
-                self.leds.off()
+                self.events.set_status(0, NOTIFYING)
                 self.leds.on(self.leds.Red)
             elif time_until_event <= 60:          # 1 minute before the event
-                event['status'] = 'notifying'
-                self.leds.on(self.leds.Yellow)
-            elif time_until_event <= 180:         # 3 minutes before the event
-                self.leds.on(self.leds.Green)
+                self.events.set_status(0, NOTIFYING)
+                self.leds.flash(self.leds.Yellow, 150)
             elif time_until_event <= 300:         # 5 minutes before the event
-                self.leds.on(self.leds.Green)
-            elif time_until_event > 330:
-                wait_time = 10
+                # The LEDs animate on their own. Asking for the same effect
+                # again just leaves it running.
+                self.leds.flash(self.leds.Green, 500)
+            elif time_until_event > NotifyAheadSeconds:
+                # Nothing to do until notifications start, unless the
+                # schedule changes before then.
+                await self.wait_for_change(time_until_event - NotifyAheadSeconds)
+                continue
 
             await asyncio.sleep(wait_time)
 
     # .........................................................................
     async def fetch_events(self):
-        event_list = []
-        
+        """
+            Fetch upcoming events into the event store's staging buffers.
+            Returns True if there's a new schedule to commit, or False if the
+            fetch failed or the schedule is identical to the last one.
+        """
+        self.fetch_failed = True
+
         try:
-            async with aiohttp.ClientSession(version=aiohttp.HttpVersion11) as session:
-                async with session.post(secrets.mongo_url + "aggregate", data=self.Query, headers=self.QueryHeaders) as response:
-                    if response.status == 200:
-                        responseText = await response.text()
-                        
-                        if len(responseText) > 0:
-                            doc = json.loads(responseText)
-
-                            if doc.get("documents"):
-                                events = doc["documents"]
-
-                                if len(events):
-                                    for event in events:
-                                        if platform == 'rp2':
-                                            event_time = int(
-                                                event["startTicks"]) + self.utc_offset_seconds
-                                        elif platform == 'esp32':
-                                            event_time = int(
-                                                event["startTicks"]) - MPEpochOffset + self.dst_offset_seconds
-                                        else:
-                                            event_time = int(
-                                                event["startTicks"]) - MPEpochOffset + self.dst_offset_seconds
-
-                                        event_list.append({
-                                            "title": event["title"],
-                                            "time": event_time,
-                                            "status": "pending"
-                                        })
-                            elif doc.get("document"):
-                                event = doc["document"]
-
-                                if platform == 'rp2':
-                                    event_time = int(
-                                        event["startTicks"]) - MPEpochOffset + self.utc_offset_seconds
-                                else:
-                                    event_time = int(event["startTicks"]) - MPEpochOffset
-
-                                event_list.append({
-                                    "title": event["title"],
-                                    "time": event_time,
-                                    "status": "pending"
-                                })
-                    else:
-                        event_list = self.events
+            if self.relay_url:
+                wait = 0 if LowPower else RelayWaitSeconds
+                response = await self.session.request(
+                    'GET', 'schedule?version=%d&wait=%d' % (self.relay_version, wait),
+                    timeout=wait + FetchTimeoutSeconds)
+            else:
+                # The next few events of each source from now on, so the
+                # window moves along as meetings pass.
+                response = await self.session.request(
+                    'POST', 'aggregate', body=page_body(self.query_parts, int(self.now)),
+                    headers=self.QueryHeaders)
+
+            try:
+                # Anything else (e.g. a 503 from a relay that has no schedule
+                # yet) is a failed fetch, and the current schedule is kept.
+                if response.status == 304:
+                    # Relay: no change to the schedule.
+                    self.fetch_failed = False
+                    return False
+
+                if response.status == 200:
+                    self.fetch_time = self.now
+                    self.events.begin_update()
+                    parser = self.parser
+                    parser.reset()
+
+                    while not parser.done:
+                        chunk = await response.read(ReadChunkSize)
+
+                        if not chunk:
+                            break
+
+                        parser.feed(chunk)
+
+                    self.fetch_failed = not parser.done
+
+                    if not parser.done or parser.checksum == self.schedule_hash:
+                        return False
+
+                    self.schedule_hash = parser.checksum
+                    self.relay_version = parser.version
+
+                    return True
+            finally:
+                # Drain the rest of the response, so the connection can be
+                # reused for the next poll.
+                await response.release()
         except Exception as e:
-            # Failed. No biggie. We'll pull the events on the next go-around.
+            # Failed. No biggie. The current schedule stays as it is, and the
+            # refresher tries again after backing off.
             # print("Failed to fetch. ", e)
-            return self.events
+            self.session.close()
 
-        # print("Fetched", event_list)
-
-        timeNow = self.now
-        # print(timeNow)
-
-        return [e for e in event_list if e["time"] > timeNow]
+        return False
 
     # .........................................................................
-    def get_timezone_offset(self):
+    def on_fetched_event(self, title, title_length, ticks, event_id):
         """
-            WorldTimeAPI is a cool service that provides local timezone info
-            for a given location (based on our IP address).
-            We'll use this info to convert from UTC to local time.
+            Called by the response parser for each event as it streams in.
+            The event store merges the sources and drops duplicates.
         """
-        try:
-            worldTimeUrl = 'http://worldtimeapi.org/api/ip'
-            resp = requests.get(worldTimeUrl)
-
-            if resp.status_code != 200:
-                # Failed to fetch the local timezone info. Default to Eastern time.
-                self.utc_offset_seconds = -4 * 3600
-                self.dst_offset_seconds = 0
-                return
-
-            tzInfo = json.loads(resp.text)
-
-            self.dst_offset_seconds = int(tzInfo['dst_offset'])
-            hours, minutes = [int(t) for t in tzInfo['utc_offset'].split(':')]
-            self.utc_offset_seconds = (
-                hours * 3600) + (minutes * 60 if hours > 0 else minutes * -60)
-        except:
-            # Failed to fetch the local timezone info. Default to Eastern time.
-            self.utc_offset_seconds = -4 * 3600
-            self.dst_offset_seconds = 0
-
-        # print("TZ Info:", self.utc_offset_seconds / 60 / 60, self.dst_offset_seconds)
+        if ticks > self.fetch_time:
+            self.events.stage(title, title_length, ticks, event_id)
@@ -0,0 +1,114 @@
+"""
+    Schedule-driven low-power idling.
+
+    When there's nothing to do until the next refresh or notification, the
+    board is put into machine.lightsleep (with the Wi-Fi radio in power-save)
+    until then, instead of spinning the asyncio loop. LEDs keep their state
+    through light sleep. Awake and asleep time are tracked, so the duty cycle
+    and a rough estimate of the current draw can be reported.
+"""
+
+from sys import platform
+import asyncio
+import time
+import machine
+
+try:
+    import network
+except ImportError:
+    network = None
+
+# Only bother sleeping if we can sleep at least this long.
+MinSleepSeconds = 5
+
+# Wake up this much earlier than needed, to give Wi-Fi time to come back.
+WakeMarginSeconds = 2
+
+# Rough supply current (mA) awake with Wi-Fi associated, and in light sleep
+# with Wi-Fi in power-save. These are ballpark figures for the bare modules;
+# dev boards with USB/serial chips and regulators draw more, so measure your
+# own board and adjust.
+CurrentEstimates = {
+    'esp32': (80.0, 1.0),
+    'esp8266': (70.0, 1.0),
+    'rp2': (45.0, 1.5),
+}
+
+
+# .............................................................................
+class PowerManager():
+
+    # .........................................................................
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.started = clock()
+        self.asleep_seconds = 0
+        self.sleeps = 0
+        self.can_sleep = hasattr(machine, 'lightsleep')
+        self.active_ma, self.sleep_ma = CurrentEstimates.get(platform, (80.0, 1.5))
+        self.wlan = network.WLAN(network.STA_IF) if network else None
+
+    # .........................................................................
+    async def idle_task(self, next_wake):
+        """
+            Run forever alongside the other tasks. "next_wake()" returns the
+            time (same clock as ours) by which the board must be awake. Until
+            then, sleep; afterwards, give the other tasks a second to pick up
+            whatever woke us.
+        """
+        while True:
+            delay = next_wake() - self.clock() - WakeMarginSeconds
+
+            if delay >= MinSleepSeconds and self.can_sleep:
+                self.sleep(delay)
+
+            await asyncio.sleep(1)
+
+    # .........................................................................
+    def sleep(self, seconds):
+        self._wifi_power_save(True)
+
+        try:
+            machine.lightsleep(int(seconds * 1000))
+            self.asleep_seconds += seconds
+            self.sleeps += 1
+        except Exception:
+            # No (working) light sleep on this port. Stay awake from now on.
+            self.can_sleep = False
+
+        self._wifi_power_save(False)
+
+    # .........................................................................
+    def _wifi_power_save(self, enabled):
+        wlan = self.wlan
+
+        try:
+            if hasattr(wlan, 'PM_POWERSAVE'):
+                wlan.config(pm=wlan.PM_POWERSAVE if enabled else wlan.PM_PERFORMANCE)
+            else:
+                import esp
+                esp.sleep_type(esp.SLEEP_MODEM if enabled else esp.SLEEP_NONE)
+        except Exception:
+            pass
+
+    # .........................................................................
+    def duty_cycle(self):
+        """
+            Fraction of the time spent awake since startup.
+        """
+        elapsed = self.clock() - self.started
+
+        if elapsed <= 0:
+            return 1.0
+
+        return max(0.0, 1.0 - self.asleep_seconds / elapsed)
+
+    # .........................................................................
+    def estimated_current_ma(self):
+        duty = self.duty_cycle()
+        return duty * self.active_ma + (1 - duty) * self.sleep_ma
+
+    # .........................................................................
+    def report(self):
+        print("Power: awake %.1f%% of the time, %d sleeps, ~%.1f mA average" % (
+            self.duty_cycle() * 100, self.sleeps, self.estimated_current_ma()))
@@ -13,3 +13,8 @@ mongo_cluster_name = '<mongo_cluster_name>'
 
 # This is the URL to the MongoDB Atlas Data API endpoint.
 mongo_url = 'https://data.mongodb-api.com/app/<your Atlas app ID>/endpoint/data/v1/action/'
+
+# Optional: the URL of a MeetingMinder schedule relay on your network (see
+# consumers/desktop/py/relay.py). When set, the board gets its schedule from
+# the relay instead of polling the Data API itself.
+# relay_url = 'http://192.168.1.10:8765/'
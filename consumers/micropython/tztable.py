@@ -0,0 +1,76 @@
+"""
+    Offline UTC offset lookups.
+
+    Reads the transition table built by make_tz_table.py (tz.bin) from flash
+    once, and finds the offset for any moment with a binary search, so local
+    time stays right across DST changes without asking a web service.
+"""
+
+from array import array
+import struct
+
+Magic = b'TZT1'
+
+
+# .............................................................................
+class TimeZone():
+
+    # .........................................................................
+    def __init__(self, path='tz.bin', default_offset=0):
+        """
+            If the table can't be read, every lookup returns default_offset.
+        """
+        self.transitions = array('l')
+        self.offsets = array('l')
+
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(6)
+
+                if header[:4] != Magic:
+                    raise ValueError('not a time zone table')
+
+                count = struct.unpack('>H', header[4:])[0]
+                data = f.read(count * 8)
+
+            for i in range(count):
+                transition, offset = struct.unpack_from('>ii', data, i * 8)
+                self.transitions.append(transition)
+                self.offsets.append(offset)
+        except Exception as e:
+            # print("No time zone table:", e)
+            self.transitions = array('l', [-2 ** 31])
+            self.offsets = array('l', [default_offset])
+
+    # .........................................................................
+    def offset(self, utc):
+        """
+            UTC offset in seconds at the given UTC Unix epoch time.
+        """
+        transitions = self.transitions
+        low = 0
+        high = len(transitions)
+
+        # Find the last transition at or before "utc".
+        while high - low > 1:
+            middle = (low + high) // 2
+
+            if transitions[middle] <= utc:
+                low = middle
+            else:
+                high = middle
+
+        return self.offsets[low]
+
+    # .........................................................................
+    def to_local(self, utc):
+        return utc + self.offset(utc)
+
+    # .........................................................................
+    def to_utc(self, local):
+        """
+            Local time to UTC. In the hour that repeats when clocks go back,
+            this picks the first (daylight time) one.
+        """
+        utc = local - self.offset(local)
+        return local - self.offset(utc)
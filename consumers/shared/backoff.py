@@ -0,0 +1,84 @@
+"""
+    When to retry after a failed fetch, shared by the desktop app and relay
+    (consumers/desktop/py) and the MicroPython board (consumers/micropython).
+    Runs under CPython and MicroPython alike.
+
+    A fleet of consumers that was switched on together (or that all lost the
+    Data API at once) shouldn't fetch in lockstep, and shouldn't keep
+    hammering the Data API while it's down:
+
+        jitter()    A random delay, e.g. before the first fetch after start
+                    up, so consumers that start together don't fetch
+                    together.
+
+        Backoff     After a failed fetch, wait base_seconds, then twice as
+                    long after each failure in a row, up to max_seconds.
+                    Half of each wait is fixed and half is random ("equal
+                    jitter"), so retries never come straight away and don't
+                    line up across the fleet.
+
+                    After trip_after failures in a row the circuit opens:
+                    nothing is fetched for open_seconds (jittered the same
+                    way), then one trial fetch is made. If it succeeds the
+                    circuit closes and refreshes go back to normal; if not,
+                    it stays open for another open_seconds.
+
+    The consumers keep using their last good schedule while fetches fail, so
+    notifications carry on through an outage.
+
+    MicroPython seeds random from the chip's hardware random number generator
+    where there is one, so every board gets different delays.
+"""
+
+import random
+
+
+# .............................................................................
+def jitter(seconds):
+    """
+        A random number of seconds in [0, seconds).
+    """
+    # getrandbits() is the one random function every MicroPython port has.
+    return seconds * random.getrandbits(24) / (1 << 24)
+
+
+# .............................................................................
+class Backoff():
+
+    # .........................................................................
+    def __init__(self, base_seconds=60, max_seconds=10 * 60, trip_after=5, open_seconds=15 * 60):
+        self.base_seconds = base_seconds
+        self.max_seconds = max_seconds
+        self.trip_after = trip_after
+        self.open_seconds = open_seconds
+        self.failures = 0
+
+    # .........................................................................
+    @property
+    def is_open(self):
+        """
+            True while fetches keep failing and the circuit is open.
+        """
+        return self.failures >= self.trip_after
+
+    # .........................................................................
+    def failed(self):
+        """
+            Record a failed fetch. Returns the seconds to wait before the
+            next one.
+        """
+        self.failures += 1
+
+        if self.is_open:
+            wait = self.open_seconds
+        else:
+            wait = min(self.max_seconds, self.base_seconds * 2 ** (self.failures - 1))
+
+        return wait / 2 + jitter(wait / 2)
+
+    # .........................................................................
+    def succeeded(self):
+        """
+            Record a successful fetch, which closes the circuit.
+        """
+        self.failures = 0
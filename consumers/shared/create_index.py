@@ -0,0 +1,63 @@
+"""
+    Create the index the consumers' event query is built around (see
+    eventquery.py). Run this once on your computer, against the cluster the
+    publisher writes to:
+
+        python create_index.py "mongodb+srv://<user>:<password>@<cluster host>/"
+
+    The Data API can't create indexes, so this connects with pymongo
+    (pip install pymongo). Without pymongo, or with --print, it prints the
+    equivalent mongosh command instead, to paste into the Atlas shell.
+    Creating an index that already exists does nothing, so it's safe to run
+    again.
+"""
+
+import argparse
+import json
+import sys
+
+from eventquery import COLLECTION, DATABASE, INDEX_KEYS, INDEX_NAME
+
+
+# .............................................................................
+def mongosh_command(database, collection):
+    keys = ', '.join('%s: %d' % (field, order) for field, order in INDEX_KEYS)
+
+    return 'db.getSiblingDB(%s).%s.createIndex({ %s }, { name: %s })' % (
+        json.dumps(database), collection, keys, json.dumps(INDEX_NAME)
+    )
+
+
+# .............................................................................
+def create_index(uri, database, collection):
+    import pymongo
+
+    client = pymongo.MongoClient(uri)
+
+    try:
+        return client[database][collection].create_index(list(INDEX_KEYS), name=INDEX_NAME)
+    finally:
+        client.close()
+
+
+# .............................................................................
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('uri', nargs='?', help='MongoDB connection string')
+    parser.add_argument('--database', default=DATABASE)
+    parser.add_argument('--collection', default=COLLECTION)
+    parser.add_argument('--print', action='store_true', help='only print the mongosh command')
+    args = parser.parse_args()
+
+    if args.print or not args.uri:
+        print(mongosh_command(args.database, args.collection))
+        sys.exit(0)
+
+    try:
+        name = create_index(args.uri, args.database, args.collection)
+    except ImportError:
+        print('pymongo is not installed (pip install pymongo). Run this in mongosh instead:')
+        print(mongosh_command(args.database, args.collection))
+        sys.exit(1)
+
+    print('Index %s is in place on %s.%s' % (name, args.database, args.collection))
@@ -0,0 +1,149 @@
+"""
+    The Data API aggregation that fetches a page of upcoming events, shared by
+    the Python consumers: the desktop app, relay and reminder server
+    (consumers/desktop/py), and the MicroPython board (consumers/micropython).
+    Runs under CPython and MicroPython alike; copy it to the board with the
+    rest of the consumer.
+
+    Every pipeline starts with a range $match on startTimestamp (and source),
+    so MongoDB reads the page off the { source: 1, startTimestamp: 1 } index
+    (see create_index.py) instead of working something out for every
+    document in the collection first. The cost follows the number of events
+    returned, not the size of the collection.
+
+    There are two shapes:
+
+        With a list of sources, each source is one index range scan with
+        its own $sort/$limit, and the scans are joined with $unionWith.
+        Only the events that are returned are read.
+
+        Without one, a single range scan covers every source, and
+        $setWindowFields keeps the first few events of each. Every upcoming
+        event is read, but none of the past ones.
+
+    Either way the result is up to per_source events of each source that
+    start after the page's start time, one run per source, each sorted by
+    start time.
+
+    The query is built as a JSON string rather than a dict, because the
+    order of the keys in a $sort matters and MicroPython's dicts don't keep
+    it. The page's start time is a placeholder; see query_parts().
+"""
+
+import json
+
+DATABASE = 'notifications'
+COLLECTION = 'events'
+
+# Stand in for the page's start and end times in the query.
+AFTER_PLACEHOLDER = '__AFTER__'
+UNTIL_PLACEHOLDER = '__UNTIL__'
+
+# The index every pipeline here is built around.
+INDEX_KEYS = (('source', 1), ('startTimestamp', 1))
+INDEX_NAME = 'source_1_startTimestamp_1'
+
+_PROJECTION = (
+    '{"$project":{"_id":0,"eventId":1,"source":1,"title":1,"startTime":1,'
+    '"startTicks":"$startTimestamp"}}'
+)
+
+
+# .............................................................................
+def _range_match(after, source=None):
+    if source is None:
+        return '{"$match":{"startTimestamp":{"$gt":%s}}}' % after
+
+    return '{"$match":{"source":%s,"startTimestamp":{"$gt":%s}}}' % (json.dumps(source), after)
+
+
+# .............................................................................
+def pipeline(per_source, sources=None, after=None, collection=COLLECTION):
+    """
+        The pipeline (a JSON array) for the page of events that start after
+        "after" (epoch seconds, or the placeholder if None).
+    """
+    after = '"%s"' % AFTER_PLACEHOLDER if after is None else '%d' % after
+
+    if sources:
+        stages = []
+
+        for source in sources:
+            scan = '%s,{"$sort":{"startTimestamp":1}},{"$limit":%d}' % (_range_match(after, source), per_source)
+
+            if stages:
+                scan = '{"$unionWith":{"coll":%s,"pipeline":[%s]}}' % (json.dumps(collection), scan)
+
+            stages.append(scan)
+    else:
+        stages = [
+            _range_match(after),
+            '{"$sort":{"source":1,"startTimestamp":1}}',
+            '{"$setWindowFields":{"partitionBy":"$source","sortBy":{"startTimestamp":1},'
+            '"output":{"rank":{"$documentNumber":{}}}}}',
+            '{"$match":{"rank":{"$lte":%d}}}' % per_source,
+        ]
+
+    stages.append(_PROJECTION)
+    return '[' + ','.join(stages) + ']'
+
+
+# .............................................................................
+def event_query(cluster, per_source, sources=None, after=None, database=DATABASE, collection=COLLECTION):
+    """
+        The whole "aggregate" request body, as a JSON string.
+    """
+    return '{"dataSource":%s,"database":%s,"collection":%s,"pipeline":%s}' % (
+        json.dumps(cluster), json.dumps(database), json.dumps(collection),
+        pipeline(per_source, sources, after, collection)
+    )
+
+
+# .............................................................................
+def batch_query(cluster, sources, per_source, database=DATABASE, collection=COLLECTION):
+    """
+        The "aggregate" request body for many sources at once (e.g. a server
+        refreshing a batch of users' calendars): up to per_source events of
+        each of the sources that start after the AFTER placeholder and
+        before the UNTIL one. The source $in and the start time range are
+        both index bounds, so this is one index scan over just those
+        events.
+    """
+    stages = [
+        '{"$match":{"source":{"$in":%s},"startTimestamp":{"$gt":"%s","$lt":"%s"}}}' % (
+            json.dumps(list(sources)), AFTER_PLACEHOLDER, UNTIL_PLACEHOLDER),
+        '{"$sort":{"source":1,"startTimestamp":1}}',
+        '{"$setWindowFields":{"partitionBy":"$source","sortBy":{"startTimestamp":1},'
+        '"output":{"rank":{"$documentNumber":{}}}}}',
+        '{"$match":{"rank":{"$lte":%d}}}' % per_source,
+        _PROJECTION,
+    ]
+
+    return '{"dataSource":%s,"database":%s,"collection":%s,"pipeline":[%s]}' % (
+        json.dumps(cluster), json.dumps(database), json.dumps(collection), ','.join(stages)
+    )
+
+
+# .............................................................................
+def query_parts(query):
+    """
+        The query, encoded and split around the placeholder, so a page can
+        be sent without building the whole body again (see page_body()).
+    """
+    return tuple(part.encode('utf-8') for part in query.split('"%s"' % AFTER_PLACEHOLDER))
+
+
+# .............................................................................
+def page_body(parts, after):
+    """
+        The request body for the page after "after" (epoch seconds), as a
+        tuple of bytes to send one after the other.
+    """
+    after = b'%d' % after
+    body = [parts[0]]
+
+    for part in parts[1:]:
+        body.append(after)
+        body.append(part)
+
+    return tuple(body)
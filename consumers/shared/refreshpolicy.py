@@ -0,0 +1,132 @@
+"""
+    When to refresh the schedule next, shared by the desktop app
+    (consumers/desktop/py) and the MicroPython board (consumers/micropython).
+    Runs under CPython and MicroPython alike.
+
+    Rather than polling every minute around the clock, the interval follows
+    how soon the next meeting is:
+
+        No meetings, or the next one far off: every max_seconds, so a
+        meeting that's added at short notice still shows up in time.
+
+        As the next meeting gets closer: half the time that's left until its
+        notifications start (notify_ahead before it), so the polls close in
+        on it.
+
+        From then until it starts: every min_seconds, so last minute changes
+        (it moved, it was cancelled) show up straight away.
+
+    Meetings mostly start on the hour or half hour (every slot_seconds), so
+    there is always a refresh just before notifications for the next slot
+    would start. A meeting that's added there at short notice is still
+    notified on time, even when the schedule is otherwise only polled every
+    max_seconds.
+
+    Nothing is fetched during do-not-disturb windows; the first refresh after
+    one is as soon as it ends (plus the offset, see below). A window is
+    (days, start hour, end hour) in local time, with days as weekday numbers
+    (Monday is 0). A window that ends before it starts runs overnight into
+    the next day:
+
+        ((0, 1, 2, 3, 4), 19, 7)    weeknights, 7 PM to 7 AM
+        ((5, 6), 0, 24)             all weekend
+
+    The slot refreshes, the ones closing in on a meeting, and the first one
+    after a do-not-disturb window would otherwise happen at the same instant
+    on every consumer. They're made up to spread_seconds earlier (slots,
+    closing in) or later (do not disturb) at random, so a fleet's refreshes
+    are spread out.
+"""
+
+from backoff import jitter
+
+DAY = 24 * 3600
+
+
+# .............................................................................
+class RefreshPolicy():
+
+    # .........................................................................
+    def __init__(self, min_seconds=60, max_seconds=15 * 60, notify_ahead=300, do_not_disturb=(),
+                 slot_seconds=30 * 60, spread_seconds=0):
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+        self.notify_ahead = notify_ahead
+        self.slot_seconds = slot_seconds
+        self.spread_seconds = spread_seconds
+        self.offset = int(jitter(spread_seconds))
+
+        # (weekdays, start, end) in seconds since local midnight.
+        self.windows = [(days, int(start * 3600), int(end * 3600)) for days, start, end in do_not_disturb]
+
+    # .........................................................................
+    def delay(self, now, next_start, local):
+        """
+            Seconds until the next refresh. now is the current time (epoch
+            seconds), next_start when the next meeting starts (None if
+            there's none), and local the current time in local time (epoch
+            seconds plus the UTC offset).
+        """
+        quiet = self.quiet_for(local)
+
+        if quiet:
+            return quiet
+
+        # Halving the lead brings every consumer's refreshes together on the
+        # same instant, however spread out they were. Aiming at a random
+        # instant up to spread_seconds earlier each time keeps them apart.
+        notify_at = None if next_start is None else next_start - self.notify_ahead - jitter(self.spread_seconds)
+
+        if notify_at is None:
+            delay = self.max_seconds
+        elif notify_at <= now:
+            delay = self.min_seconds
+        else:
+            delay = max(self.min_seconds, min(self.max_seconds, (notify_at - now) // 2))
+
+        if self.slot_seconds:
+            # Refresh a minute (min_seconds) before the next slot's
+            # notifications start, plus the offset.
+            lead = self.notify_ahead + self.min_seconds + self.offset
+            slot = ((now + lead) // self.slot_seconds + 1) * self.slot_seconds
+            delay = min(delay, slot - lead - now)
+
+        return delay
+
+    # .........................................................................
+    def quiet_for(self, local):
+        """
+            Seconds until the do-not-disturb window we're in ends (through
+            any windows that follow on straight after it) plus the offset,
+            or 0 outside of them.
+        """
+        local = int(local)
+        quiet = 0
+
+        # Windows can follow on from each other, e.g. Friday night into the
+        # weekend.
+        for _ in range(8):
+            left = self._window_left(local + quiet)
+
+            if not left:
+                break
+
+            quiet += left
+
+        return quiet + self.offset if quiet else 0
+
+    # .........................................................................
+    def _window_left(self, local):
+        days, seconds = divmod(local, DAY)
+        weekday = (days + 3) % 7        # 1 January 1970 was a Thursday
+
+        for window_days, start, end in self.windows:
+            if start < end:
+                if weekday in window_days and start <= seconds < end:
+                    return end - seconds
+            elif weekday in window_days and seconds >= start:
+                return DAY - seconds + end
+            elif (weekday - 1) % 7 in window_days and seconds < end:
+                return end - seconds
+
+        return 0
@@ -27,6 +27,11 @@ const mongoDbApiKey = "<Your MongoDB API Key>"
 // Change this to the name of your calendar - e.g. "Work Calendar", "Home Calendar"
 const eventSource = "Work Calendar"
 
+// How far ahead to publish events, and at most how many. The clients page
+// through these by start time, so a busy day or several days ahead is fine.
+const lookaheadDays = 7
+const maxEvents = 500
+
 
 // ------------------------------------------------------------------------------------------
 function getMeetings() {
@@ -34,10 +39,10 @@ function getMeetings() {
     Logger.log("Deleting existing data...")
     deleteExistingEvents()
 
-    // Get events for the next day
+    // Get events for the next few days
     var now = new Date()
     var to = new Date()
-    to.setHours(to.getHours() + 24)
+    to.setHours(to.getHours() + 24 * lookaheadDays)
     var events = CalendarApp.getEvents(now, to)
 
     if (events.length == 0) {
@@ -48,14 +53,13 @@ function getMeetings() {
     // Insert new data
     Logger.log("Inserting new list of events...")
 
-    var events = CalendarApp.getEvents(now, to)
     var eventList = []
     var eventCount = 0
 
     events.forEach(e => {
         eventCount++
 
-        if (eventCount <= 5) {
+        if (eventCount <= maxEvents) {
             var id = e.getId()
             var eventTime = e.getStartTime()
             id = id.substring(0, id.indexOf("@"))